@@ -0,0 +1,387 @@
+# benchmark.py - 排程、休息日與 Webhook 熱路徑的效能基準測試
+"""
+執行方式:
+    python benchmark.py                      # 完整測試，結果寫入 benchmark_results/
+    python benchmark.py --quick              # 縮短迭代次數
+    python benchmark.py --only calendar      # 只執行名稱包含 calendar 的項目
+    python benchmark.py --only burst         # 只執行同一分鐘大量打卡的情境 (沒有錯過才算通過)
+    python benchmark.py --output result.json
+
+不需要顯示器，所有測試都在暫存目錄中執行，不會影響現有的設定檔、帳本與日誌。
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, date, timedelta, time as dt_time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+from punch_clock import SystemClock  # noqa: E402
+from punch_holidays import HolidayIndex, HolidayEntry, KIND_HOLIDAY, KIND_WORKDAY  # noqa: E402
+from punch_plan import DayPlan, PunchSpec, PUNCH_IN  # noqa: E402
+from punch_ledger import EVENT_FIRED, EVENT_MISSED, EVENT_SUCCESS, EVENT_FAILED, EVENT_ERROR  # noqa: E402
+from punch_planner import plan_range  # noqa: E402
+from punch_profiles import intern_spec  # noqa: E402
+from punch_standin import start_stand_in_server  # noqa: E402
+
+
+class OffsetClock(SystemClock):
+    """比系統時鐘快 offset 秒的時鐘：讓指定的打卡時間在幾秒後到來，時間仍以真實速度前進"""
+
+    def __init__(self, offset=0.0):
+        self.offset = offset
+
+    def time(self):
+        return time.time() + self.offset
+
+    def now(self):
+        return datetime.fromtimestamp(self.time())
+
+    def today(self):
+        return self.now().date()
+
+
+def create_headless_app():
+    """建立不含使用者介面的打卡核心"""
+    from punch_engine import PunchEngine
+
+    app = PunchEngine()
+    app.start()
+    # 避免日誌 I/O 影響量測結果
+    app.logger.setLevel(logging.WARNING)
+    return app
+
+
+def measure(name, func, iterations, repeat=3):
+    """執行 func(iterations) repeat 次，取最快的一次"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(iterations)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    result = {
+        "iterations": iterations,
+        "best_total_s": round(best, 6),
+        "per_op_us": round(best / iterations * 1e6, 3),
+        "ops_per_s": round(iterations / best, 1) if best > 0 else None,
+    }
+    print(f"{name:<40} {result['per_op_us']:>12.3f} µs/op {result['ops_per_s']:>14,.0f} ops/s")
+    return result
+
+
+def bench_check_punch_time(app, scale):
+    def run(n):
+        for _ in range(n):
+            app.check_punch_time()
+    return measure("check_punch_time", run, 2000 * scale)
+
+
+def bench_plan_is_due(app, scale):
+    plan = app.day_plan
+    now = int(time.time())
+
+    def run(n):
+        for _ in range(n):
+            plan.is_due(PUNCH_IN, now)
+    return measure("day_plan.is_due", run, 200000 * scale)
+
+
+def bench_is_rest_day(app, scale):
+    days = [date.today() + timedelta(days=i) for i in range(365)]
+
+    def run(n):
+        for i in range(n):
+            app.is_rest_day(days[i % 365])
+    return measure("is_rest_day", run, 100000 * scale)
+
+
+def bench_weekend_type(app, scale):
+    def run(n):
+        for _ in range(n):
+            app.get_current_weekend_type()
+    return measure("get_current_weekend_type", run, 100000 * scale)
+
+
+def bench_calendar_rebuild(app, scale):
+    def run(n):
+        for i in range(n):
+            app.rest_calendar = None
+            app.get_rest_calendar()
+    return measure("rest_calendar rebuild", run, 50 * scale)
+
+
+def bench_holiday_lookup(app, scale, calendars=50, entries_per_calendar=40):
+    # 多份互相重疊的地區行事曆，每份約 40 個假日與補班區間
+    rng = random.Random(0)
+    base = date.today().toordinal() - 365
+    entries = []
+    for priority in range(calendars):
+        for _ in range(entries_per_calendar):
+            start = base + rng.randrange(6 * 365)
+            kind = KIND_WORKDAY if rng.random() < 0.2 else KIND_HOLIDAY
+            entries.append(HolidayEntry(start, start + rng.randrange(5), kind, "bench", priority))
+    index = HolidayIndex(entries)
+    days = [date.fromordinal(base + i) for i in range(6 * 365)]
+
+    def run(n):
+        for i in range(n):
+            index.lookup(days[i % len(days)])
+
+    result = measure(f"holiday_index.lookup ({len(entries)} intervals)", run, 200000 * scale)
+    result["intervals"] = len(entries)
+    return result
+
+
+def bench_generate_random_times(app, scale, profiles=1000):
+    specs = []
+    for i in range(profiles):
+        specs.append((
+            PunchSpec("random", "09:00", "09:00", f"09:{10 + i % 40:02d}"),
+            PunchSpec("random", "18:00", "18:00", f"18:{10 + i % 40:02d}"),
+        ))
+    today = date.today()
+
+    def run(n):
+        for _ in range(n):
+            for profile_specs in specs:
+                DayPlan.compile(today, profile_specs)
+
+    result = measure(f"generate_random_times x{profiles} profiles", run, max(1, scale))
+    result["profiles"] = profiles
+    result["per_profile_us"] = round(result["per_op_us"] / profiles, 3)
+    return result
+
+
+def bench_plan_range(app, scale, profiles=10000, days=30):
+    # 與引擎相同，設定相同的設定檔共用 PunchSpec
+    specs = []
+    for i in range(profiles):
+        specs.append((
+            intern_spec("random", "09:00", "09:00", f"09:{10 + i % 40:02d}"),
+            intern_spec("random", "18:00", "18:00", f"18:{10 + i % 40:02d}"),
+        ))
+    profile_ids = [f"bench-{i}" for i in range(profiles)]
+    today = date.today()
+
+    def run(n):
+        for _ in range(n):
+            plan_range(profile_ids, specs, today, days)
+
+    result = measure(f"plan_range {profiles} profiles x {days} days", run, max(1, scale))
+    result["profiles"] = profiles
+    result["days"] = days
+    result["nbytes"] = plan_range(profile_ids, specs, today, days).nbytes
+    return result
+
+
+def bench_send_webhook(app, scale, url, threads=8):
+    app.webhook_url = url
+    total = 500 * scale
+
+    def run(n):
+        counter = iter(range(n))
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if next(counter, None) is None:
+                        return
+                response = app.send_webhook("benchmark")
+                if response is None or response.status_code != 200:
+                    raise RuntimeError("Webhook 發送失敗")
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+    result = measure(f"send_webhook ({threads} threads)", run, total, repeat=1)
+    result["threads"] = threads
+    return result
+
+
+def bench_async_webhook(app, scale, url):
+    total = 2000 * scale
+
+    def run(n):
+        futures = [app.async_dispatcher.submit(url, {"text": "benchmark"}) for _ in range(n)]
+        for future in futures:
+            if future.result().status_code != 200:
+                raise RuntimeError("Webhook 發送失敗")
+
+    result = measure("async dispatcher POST", run, total, repeat=1)
+    result["concurrency"] = app.async_dispatcher.concurrency
+    return result
+
+
+def bench_same_minute_burst(scale, url, profiles=400, lead=3):
+    """所有設定檔在同一分鐘精確打卡
+
+    以真實的排程器、帳本與發送池送到替身伺服器，時鐘撥到下一個工作日上班打卡前 lead 秒。
+    每個設定檔都需在容許範圍內觸發，且由自動打卡 (而不是重試佇列) 送達；
+    有任何打卡錯過、記錄為失敗 (例如發送佇列已滿) 或未送達時拋出 RuntimeError。
+    """
+    from punch_engine import PunchEngine
+
+    profiles *= scale
+    workdir = tempfile.mkdtemp(prefix="burst_")
+    try:
+        config_file = os.path.join(workdir, 'punch_config.json')
+        with open(config_file, 'w', encoding='utf-8') as f:
+            json.dump({"webhook_url": url, "punch_in_time": "09:00", "punch_out_time": "18:30",
+                       "profiles_file": "", "ledger_file": os.path.join(workdir, 'punch_ledger.db')}, f)
+
+        clock = OffsetClock()
+        engine = PunchEngine(config_file, clock=clock)
+        engine.logger.setLevel(logging.WARNING)
+        day = date.today() + timedelta(days=1)
+        while engine.is_rest_day(day)[0]:
+            day += timedelta(days=1)
+        target = datetime.combine(day, dt_time(9, 0)).timestamp()
+        clock.offset = target - lead - time.time()
+
+        for i in range(profiles):
+            engine.add_profile({"profile_id": f"burst-{i:05d}"})
+        total = len(engine.profiles)
+
+        started = time.perf_counter()
+        engine.start()
+        try:
+            # 等到每個設定檔都有自動打卡結果，或超過容許範圍後仍有未觸發的打卡
+            timeout = lead + engine.day_plan.deadlines[0] - target + 30
+            while time.perf_counter() - started < timeout:
+                time.sleep(0.2)
+                events = engine.ledger.events_for_day(day)
+                results = {row[1] for row in events
+                           if row[4] == "auto" and row[3] in (EVENT_SUCCESS, EVENT_FAILED, EVENT_ERROR)}
+                if len(results) >= total:
+                    break
+        finally:
+            engine.stop()
+        events = engine.ledger.events_for_day(day)
+        elapsed = time.perf_counter() - started - lead
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    fired = [row[0] for row in events if row[3] == EVENT_FIRED]
+    missed = sum(1 for row in events if row[3] == EVENT_MISSED)
+    failed = [row for row in events if row[3] in (EVENT_FAILED, EVENT_ERROR)]
+    queue_full = sum(1 for row in failed if row[6] == "發送佇列已滿")
+    # 送達延遲：每個設定檔第一筆自動打卡成功的時間與計畫時間的差距 (重試佇列送達不算)
+    delivered = {}
+    for ts, profile_id, _, event, source, *_ in events:
+        if event == EVENT_SUCCESS and source == "auto":
+            delivered.setdefault(profile_id, ts)
+    delivery_lags = sorted(ts - target for ts in delivered.values())
+    result = {
+        "profiles": total,
+        "fired": len(fired),
+        "missed": missed,
+        "failed": len(failed),
+        "queue_full": queue_full,
+        "delivered": len(delivered),
+        "max_fire_lag_s": round(max(fired) - target, 3) if fired else None,
+        "p99_delivery_lag_s": round(_percentile(delivery_lags, 0.99), 3) if delivery_lags else None,
+        "max_delivery_lag_s": round(delivery_lags[-1], 3) if delivery_lags else None,
+        "elapsed_s": round(elapsed, 3),
+    }
+    print(f"{'same-minute burst ' + str(total) + ' profiles':<40} fired {len(fired)}/{total}, missed {missed}, "
+          f"failed {len(failed)} (queue full {queue_full}), delivered {len(delivered)}/{total}, "
+          f"delivery lag p99 {result['p99_delivery_lag_s']} s, max {result['max_delivery_lag_s']} s")
+    if len(fired) != total or missed or failed or len(delivered) != total:
+        raise RuntimeError(f"同一分鐘打卡: {total - len(fired)} 筆未觸發、{missed} 筆錯過、{len(failed)} 筆失敗 "
+                           f"(發送佇列已滿 {queue_full} 筆)、{total - len(delivered)} 筆未由自動打卡送達")
+    return result
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自動打卡系統效能基準測試")
+    parser.add_argument('--quick', action='store_true', help="縮短迭代次數")
+    parser.add_argument('--only', help="只執行名稱包含此字串的項目")
+    parser.add_argument('--output', help="結果 JSON 檔案路徑 (預設寫入 benchmark_results/)")
+    args = parser.parse_args()
+
+    scale = 1 if args.quick else 5
+    random.seed(0)
+
+    output = args.output
+    if output is None:
+        output = os.path.join(SCRIPT_DIR, 'benchmark_results',
+                              f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output = os.path.abspath(output)
+
+    # 在暫存目錄中執行，避免影響使用者的設定檔、帳本與日誌
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="punch_bench_")
+    os.chdir(workdir)
+
+    app = create_headless_app()
+    server, url = start_stand_in_server()
+
+    benchmarks = [
+        ("check_punch_time", lambda: bench_check_punch_time(app, scale)),
+        ("day_plan_is_due", lambda: bench_plan_is_due(app, scale)),
+        ("is_rest_day", lambda: bench_is_rest_day(app, scale)),
+        ("get_current_weekend_type", lambda: bench_weekend_type(app, scale)),
+        ("calendar_rebuild", lambda: bench_calendar_rebuild(app, scale)),
+        ("holiday_lookup", lambda: bench_holiday_lookup(app, scale)),
+        ("generate_random_times", lambda: bench_generate_random_times(app, scale)),
+        ("plan_range", lambda: bench_plan_range(app, scale)),
+        ("send_webhook", lambda: bench_send_webhook(app, scale, url)),
+        ("async_webhook", lambda: bench_async_webhook(app, scale, url)),
+        ("same_minute_burst", lambda: bench_same_minute_burst(scale, url)),
+    ]
+
+    results = {}
+    try:
+        for name, run in benchmarks:
+            if args.only and args.only not in name:
+                continue
+            results[name] = run()
+    finally:
+        app.stop()
+        server.shutdown()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n結果已寫入 {output}")
+
+
+if __name__ == "__main__":
+    main()
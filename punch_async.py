@@ -0,0 +1,211 @@
+# punch_async.py - 以 asyncio 在單一事件迴圈上並行發送 Webhook
+import asyncio
+import json
+import logging
+import ssl
+import threading
+from urllib.parse import urlsplit
+
+DEFAULT_ASYNC_CONCURRENCY = 100
+
+
+class AsyncResponse:
+    """Webhook 回應 (與 requests.Response 相同的 status_code 介面)"""
+    __slots__ = ('status_code', 'headers', 'content')
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def __repr__(self):
+        return f"<AsyncResponse [{self.status_code}]>"
+
+
+class AsyncWebhookDispatcher:
+    """asyncio Webhook 發送器
+
+    所有 POST 在同一個背景事件迴圈上執行，以 Semaphore 限制同時連線數，
+    每個請求各自有逾時，關閉時會取消所有進行中的請求。
+    HTTP/1.1 keep-alive 連線會依主機保留重用。
+    """
+
+    def __init__(self, concurrency=DEFAULT_ASYNC_CONCURRENCY, timeout=10, logger=None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger('PunchCardApp')
+
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._idle = {}  # (scheme, host, port) -> 閒置連線 [(reader, writer), ...]
+        self._tasks = set()
+        self._ssl_context = None
+
+    def start(self):
+        """在背景執行緒啟動事件迴圈"""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="AsyncWebhookDispatcher", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def submit(self, url, payload, timeout=None):
+        """從任意執行緒排入一筆 POST，回傳 concurrent.futures.Future"""
+        if self._loop is None:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(self._tracked_post(url, payload, timeout), self._loop)
+
+    async def post(self, url, payload, timeout=None):
+        """在事件迴圈中發送 JSON POST (受並行上限與逾時控制)"""
+        async with self._semaphore:
+            return await asyncio.wait_for(self._request(url, payload), timeout or self.timeout)
+
+    def shutdown(self, timeout=2):
+        """取消所有進行中的請求並停止事件迴圈"""
+        if self._loop is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._close(), self._loop)
+        try:
+            future.result(timeout)
+        except Exception as e:
+            self.logger.error(f"關閉 asyncio 發送器失敗: {e!r}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+
+    def in_flight(self):
+        """進行中的請求數"""
+        return len(self._tasks)
+
+    async def _tracked_post(self, url, payload, timeout):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            return await self.post(url, payload, timeout)
+        finally:
+            self._tasks.discard(task)
+
+    async def _close(self):
+        current = asyncio.current_task()
+        tasks = [t for t in self._tasks if t is not current]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+    async def _request(self, url, payload):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"不支援的網址: {url}")
+        secure = parts.scheme == 'https'
+        host = parts.hostname
+        port = parts.port or (443 if secure else 80)
+        key = (parts.scheme, host, port)
+
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {parts.netloc}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n"
+            "\r\n"
+        ).encode('latin-1')
+
+        # 重用的閒置連線可能已被伺服器關閉，失敗時改用新連線重試一次
+        while True:
+            reader, writer, reused = await self._acquire(key, host, port, secure)
+            try:
+                writer.write(head + body)
+                await writer.drain()
+                response, keep_alive = await self._read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if reused:
+                    continue
+                raise ConnectionError(f"連線中斷: {e!r}") from e
+            except BaseException:
+                writer.close()
+                raise
+
+            if keep_alive:
+                self._idle.setdefault(key, []).append((reader, writer))
+            else:
+                writer.close()
+            return response
+
+    async def _acquire(self, key, host, port, secure):
+        connections = self._idle.get(key)
+        while connections:
+            reader, writer = connections.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+
+        ssl_context = None
+        if secure:
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            ssl_context = self._ssl_context
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context)
+        return reader, writer, False
+
+    @staticmethod
+    async def _read_response(reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("伺服器已關閉連線")
+        version, status, *_ = status_line.decode('latin-1').split(' ', 2)
+        status_code = int(status)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        if 'content-length' in headers:
+            content = await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            content = b''.join(chunks)
+        elif status_code in (204, 304) or 100 <= status_code < 200:
+            content = b''
+        else:
+            content = await reader.read()
+            keep_alive = False
+
+        return AsyncResponse(status_code, headers, content), keep_alive
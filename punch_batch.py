@@ -0,0 +1,174 @@
+# punch_batch.py - 合併發送：同一 Webhook 在短時間內的多筆打卡合併為一次 POST
+import logging
+import threading
+import time
+
+# 0 表示不合併 (每筆打卡各自發送)
+DEFAULT_BATCH_WINDOW_MS = 0
+DEFAULT_BATCH_MAX_SIZE = 100
+
+# 合併批次大小直方圖區間
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class BatchItemResponse:
+    """批次中單筆打卡的結果 (與 requests.Response 一樣提供 status_code)"""
+    __slots__ = ('status_code', 'detail')
+
+    def __init__(self, status_code, detail=None):
+        self.status_code = status_code
+        self.detail = detail
+
+    def __repr__(self):
+        return f"BatchItemResponse({self.status_code})"
+
+
+def _item_status(result, batch_status):
+    if isinstance(result, bool):
+        return batch_status if result else 500
+    if isinstance(result, int):
+        return result
+    if isinstance(result, dict):
+        for key in ('status_code', 'status'):
+            if isinstance(result.get(key), int):
+                return result[key]
+        if result.get('ok') is False:
+            return 500
+    return batch_status
+
+
+def split_batch_response(response, count):
+    """將批次回應拆成每筆打卡的結果
+
+    回應本文為與請求等長的 JSON 陣列時，依序對應每一筆
+    (元素可為狀態碼、true/false 或含 status_code/status/ok 的物件)；
+    否則整批共用 HTTP 狀態碼。沒有回應時每筆皆為 None。
+    """
+    if response is None:
+        return [None] * count
+
+    batch_status = response.status_code
+    results = None
+    if 200 <= batch_status < 300:
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            body = body.get('results')
+        if isinstance(body, list) and len(body) == count:
+            results = body
+
+    if results is None:
+        return [BatchItemResponse(batch_status)] * count
+    return [BatchItemResponse(_item_status(result, batch_status), result) for result in results]
+
+
+class _PendingBatch:
+    __slots__ = ('deadline', 'items')
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.items = []
+
+
+class WebhookBatcher:
+    """依 Webhook URL 收集短時間內的打卡，時間窗結束或達上限時呼叫 on_flush(url, items)
+
+    同一秒內大量設定檔打卡時，同一端點的請求數由 N 筆降為 N / batch_max_size 筆。
+    on_flush 在背景執行緒 (或達上限時在呼叫 add 的執行緒) 中呼叫，應盡快交給發送池。
+    """
+
+    def __init__(self, on_flush, window=DEFAULT_BATCH_WINDOW_MS / 1000, max_size=DEFAULT_BATCH_MAX_SIZE,
+                 logger=None):
+        self.on_flush = on_flush
+        self.window = window
+        self.max_size = max(1, max_size)
+        self.logger = logger or logging.getLogger('PunchCardApp')
+
+        self._pending = {}  # url -> _PendingBatch
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="WebhookBatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        """停止背景執行緒並送出所有尚未送出的批次"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._flush(self._take(None))
+
+    def add(self, url, item):
+        """加入一筆打卡"""
+        full = None
+        with self._cond:
+            batch = self._pending.get(url)
+            if batch is None:
+                batch = self._pending[url] = _PendingBatch(time.monotonic() + self.window)
+                self._cond.notify()
+            batch.items.append(item)
+            if len(batch.items) >= self.max_size:
+                full = self._split(url, self._pending.pop(url).items)
+        if full is not None:
+            self._flush(full)
+
+    @property
+    def running(self):
+        return self._running
+
+    def requeue(self, url, items):
+        """發送池已滿時放回未送出的打卡，下一個時間窗再送 (不會立即送出，可在 on_flush 中呼叫)"""
+        with self._cond:
+            batch = self._pending.get(url)
+            if batch is None:
+                batch = self._pending[url] = _PendingBatch(time.monotonic() + self.window)
+                self._cond.notify()
+            batch.items[:0] = items
+
+    def pending_count(self):
+        """等待合併中的打卡數"""
+        with self._cond:
+            return sum(len(batch.items) for batch in self._pending.values())
+
+    def _take(self, now):
+        """取出已到期的批次 (now 為 None 時取出全部)"""
+        with self._cond:
+            due = [url for url, batch in self._pending.items() if now is None or batch.deadline <= now]
+            return [batch for url in due for batch in self._split(url, self._pending.pop(url).items)]
+
+    def _split(self, url, items):
+        """依 max_size 切成多批 (放回的打卡可能讓一批超過上限)"""
+        return [(url, items[i:i + self.max_size]) for i in range(0, len(items), self.max_size)]
+
+    def _flush(self, batches):
+        for url, items in batches:
+            try:
+                self.on_flush(url, items)
+            except Exception as e:
+                self.logger.error(f"送出合併批次失敗: {url}, 錯誤: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    if self._pending:
+                        timeout = min(batch.deadline for batch in self._pending.values()) - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+            self._flush(self._take(time.monotonic()))
@@ -0,0 +1,177 @@
+# punch_breaker.py - 依 Webhook URL 的斷路器：端點故障時快速失敗並改由重試佇列補送
+import threading
+import time
+
+from punch_ratelimit import host_key
+
+# 連續失敗幾次後開啟斷路器 (0 表示停用)
+DEFAULT_BREAKER_FAILURE_THRESHOLD = 5
+# 開啟後經過多少秒進入半開狀態並送出試探請求
+DEFAULT_BREAKER_RESET_SECONDS = 30
+# 半開時同時允許的試探請求數
+DEFAULT_BREAKER_HALF_OPEN_PROBES = 1
+# 半開且試探請求尚未回應時，重試佇列延後的秒數
+PROBE_WAIT_SECONDS = 1
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+STATE_LABELS = {
+    STATE_CLOSED: "關閉",
+    STATE_OPEN: "開啟",
+    STATE_HALF_OPEN: "半開",
+}
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，請求未送出"""
+
+    def __init__(self, url):
+        super().__init__(f"斷路器開啟: {host_key(url)}")
+        self.url = url
+
+
+def is_breaker_failure(response):
+    """沒有回應或 5xx 視為端點故障；429 交由限流處理，4xx 代表端點仍可連線"""
+    return response is None or response.status_code >= 500
+
+
+class CircuitBreaker:
+    """單一 Webhook URL 的斷路器狀態"""
+    __slots__ = ('state', 'failures', 'opened_at', 'probes', 'trips', 'rejected')
+
+    def __init__(self):
+        self.state = STATE_CLOSED
+        self.failures = 0  # 連續失敗次數
+        self.opened_at = 0.0
+        self.probes = 0  # 半開時進行中的試探請求數
+        self.trips = 0  # 累計開啟次數
+        self.rejected = 0  # 累計被擋下的請求數
+
+
+class CircuitBreakers:
+    """依 Webhook URL 分開的斷路器
+
+    關閉：正常發送，連續失敗達 failure_threshold 次即開啟。
+    開啟：請求立即以 CircuitOpenError 失敗 (不等待逾時)，經過 reset_seconds 後進入半開。
+    半開：只放行 half_open_probes 個試探請求，成功即關閉，失敗則重新開啟。
+    狀態變更時呼叫 on_state_change(url, 舊狀態, 新狀態, breaker)。
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds=DEFAULT_BREAKER_RESET_SECONDS, half_open_probes=DEFAULT_BREAKER_HALF_OPEN_PROBES,
+                 clock=time.time, on_state_change=None):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self.clock = clock
+        self.on_state_change = on_state_change
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.failure_threshold > 0
+
+    def _transition(self, url, breaker, state):
+        """變更狀態 (需持有鎖)，回傳要在鎖外執行的通知"""
+        previous = breaker.state
+        breaker.state = state
+        if state == STATE_OPEN:
+            breaker.opened_at = self.clock()
+            breaker.trips += 1
+        breaker.probes = 0
+        return url, previous, state, breaker
+
+    def _notify(self, change):
+        if change is not None and self.on_state_change is not None:
+            self.on_state_change(*change)
+
+    def allow(self, url):
+        """是否可發送到 url (半開時會佔用一個試探名額，之後必須呼叫 record)"""
+        if not self.enabled:
+            return True
+        change = None
+        with self._lock:
+            breaker = self._breakers.get(url)
+            if breaker is None or breaker.state == STATE_CLOSED:
+                return True
+            if breaker.state == STATE_OPEN:
+                if self.clock() - breaker.opened_at < self.reset_seconds:
+                    breaker.rejected += 1
+                    return False
+                change = self._transition(url, breaker, STATE_HALF_OPEN)
+            allowed = breaker.probes < self.half_open_probes
+            if allowed:
+                breaker.probes += 1
+            else:
+                breaker.rejected += 1
+        self._notify(change)
+        return allowed
+
+    def record(self, url, response):
+        """回報發送結果 (response 為 None 表示沒有回應或發生例外)"""
+        if not self.enabled:
+            return
+        failed = is_breaker_failure(response)
+        change = None
+        with self._lock:
+            breaker = self._breakers.get(url)
+            if breaker is None:
+                if not failed:
+                    return
+                breaker = self._breakers[url] = CircuitBreaker()
+
+            if breaker.state == STATE_HALF_OPEN:
+                if failed:
+                    change = self._transition(url, breaker, STATE_OPEN)
+                else:
+                    breaker.failures = 0
+                    change = self._transition(url, breaker, STATE_CLOSED)
+            elif failed:
+                breaker.failures += 1
+                if breaker.state == STATE_CLOSED and breaker.failures >= self.failure_threshold:
+                    change = self._transition(url, breaker, STATE_OPEN)
+            else:
+                breaker.failures = 0
+        self._notify(change)
+
+    def retry_delay(self, url):
+        """重試佇列應延後的秒數 (開啟中為距離半開的時間)"""
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            breaker = self._breakers.get(url)
+            if breaker is None or breaker.state == STATE_CLOSED:
+                return 0.0
+            if breaker.state == STATE_OPEN:
+                return max(0.0, breaker.opened_at + self.reset_seconds - self.clock())
+            return 0.0 if breaker.probes < self.half_open_probes else PROBE_WAIT_SECONDS
+
+    def is_open(self, url):
+        """斷路器是否未關閉 (開啟或半開)"""
+        with self._lock:
+            breaker = self._breakers.get(url)
+            return breaker is not None and breaker.state != STATE_CLOSED
+
+    def open_count(self):
+        """未關閉的斷路器數"""
+        with self._lock:
+            return sum(1 for breaker in self._breakers.values() if breaker.state != STATE_CLOSED)
+
+    def status(self):
+        """未關閉的斷路器，回傳 [(主機, 狀態, 連續失敗次數, 距離試探秒數, 被擋下筆數), ...]
+
+        URL 可能含有權杖，顯示時只使用主機名稱。
+        """
+        now = self.clock()
+        with self._lock:
+            return [(host_key(url), breaker.state, breaker.failures,
+                     max(0.0, breaker.opened_at + self.reset_seconds - now) if breaker.state == STATE_OPEN else 0.0,
+                     breaker.rejected)
+                    for url, breaker in sorted(self._breakers.items()) if breaker.state != STATE_CLOSED]
+
+    def __repr__(self):
+        return (f"CircuitBreakers(threshold={self.failure_threshold}, reset={self.reset_seconds}, "
+                f"open={self.open_count()})")
@@ -0,0 +1,176 @@
+# punch_calendar.py - 預先計算的大小周休息日索引
+import sys
+from datetime import datetime, date, timedelta
+
+# 休息原因代碼 (與 REST_REASONS 對應)
+REASON_WORKDAY = 0
+REASON_MONDAY = 1
+REASON_BIG_WEEKEND_TUESDAY = 2
+
+REST_REASONS = ("", "星期一休息日", "大周末星期二休息日")
+
+# 預設索引範圍：今天往前 1 年、往後 5 年
+DEFAULT_YEARS_BEFORE = 1
+DEFAULT_YEARS_AFTER = 5
+
+# 超過此天數才載入 numpy 向量化計算 (載入 numpy 本身約需數十毫秒，預設 6 年範圍用純 Python 即可)
+VECTORIZE_MIN_DAYS = 20000
+
+_numpy = None
+
+
+def load_numpy():
+    """第一次需要時才載入 numpy，未安裝時回傳 None"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:  # 未安裝 numpy 時改用純 Python 計算
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+
+def weekend_type_for(weekend_mode, start_date, target_date):
+    """計算單一日期的週末類型 (big/small)"""
+    weeks_passed = (target_date - start_date).days // 7
+    if weekend_mode == 'big':
+        # 如果起始是大周末，奇數週為小周末，偶數週為大周末
+        return 'small' if weeks_passed % 2 == 1 else 'big'
+    # 如果起始是小周末，奇數週為大周末，偶數週為小周末
+    return 'big' if weeks_passed % 2 == 1 else 'small'
+
+
+def rest_reason_code(weekday, is_big):
+    """依星期與週末類型取得休息原因代碼"""
+    # 星期一永遠是休息日
+    if weekday == 0:
+        return REASON_MONDAY
+    # 星期二只在大周末時是休息日
+    if weekday == 1 and is_big:
+        return REASON_BIG_WEEKEND_TUESDAY
+    return REASON_WORKDAY
+
+
+class RestDayCalendar:
+    """休息日索引
+
+    在設定變更時一次算出整段日期範圍的大小周與休息原因，
+    以緊湊陣列儲存，單日查詢為 O(1)，區間查詢只是陣列切片。
+    """
+
+    def __init__(self, weekend_mode, weekend_start_date, first_date=None, last_date=None):
+        # 保留原始設定值作為快取鍵
+        self.key = (weekend_mode, weekend_start_date)
+        if isinstance(weekend_start_date, str):
+            weekend_start_date = datetime.strptime(weekend_start_date, '%Y-%m-%d').date()
+
+        today = date.today()
+        if first_date is None:
+            first_date = today.replace(year=today.year - DEFAULT_YEARS_BEFORE, day=1)
+        if last_date is None:
+            last_date = today.replace(year=today.year + DEFAULT_YEARS_AFTER, day=1)
+        if last_date < first_date:
+            raise ValueError("結束日期不可早於開始日期")
+
+        self.weekend_mode = weekend_mode
+        self.start_date = weekend_start_date
+        self.first_date = first_date
+        self.last_date = last_date
+        self._first_ordinal = first_date.toordinal()
+
+        # 範圍夠大或 numpy 已載入時才使用向量化計算
+        days = last_date.toordinal() - self._first_ordinal + 1
+        self._np = None
+        if days >= VECTORIZE_MIN_DAYS or 'numpy' in sys.modules:
+            self._np = load_numpy()
+
+        if self._np is not None:
+            self.big, self.reasons = self._build_vectorized()
+        else:
+            self.big, self.reasons = self._build_python()
+
+    def __len__(self):
+        return len(self.reasons)
+
+    def _build_vectorized(self):
+        np = self._np
+        ordinals = np.arange(self._first_ordinal, self.last_date.toordinal() + 1, dtype=np.int64)
+        # date.toordinal() 中 1 為星期一
+        weekdays = (ordinals - 1) % 7
+        weeks_passed = (ordinals - self.start_date.toordinal()) // 7
+        odd_week = (weeks_passed % 2) == 1
+        big = ~odd_week if self.weekend_mode == 'big' else odd_week
+
+        reasons = np.zeros(len(ordinals), dtype=np.uint8)
+        reasons[(weekdays == 1) & big] = REASON_BIG_WEEKEND_TUESDAY
+        reasons[weekdays == 0] = REASON_MONDAY
+        return big, reasons
+
+    def _build_python(self):
+        days = self.last_date.toordinal() - self._first_ordinal + 1
+        big = bytearray(days)
+        reasons = bytearray(days)
+        current = self.first_date
+        for i in range(days):
+            is_big = weekend_type_for(self.weekend_mode, self.start_date, current) == 'big'
+            big[i] = is_big
+            reasons[i] = rest_reason_code(current.weekday(), is_big)
+            current += timedelta(days=1)
+        return big, reasons
+
+    def _index(self, target_date):
+        index = target_date.toordinal() - self._first_ordinal
+        if 0 <= index < len(self.reasons):
+            return index
+        return None
+
+    def weekend_type(self, target_date):
+        """取得指定日期的週末類型"""
+        index = self._index(target_date)
+        if index is None:
+            return weekend_type_for(self.weekend_mode, self.start_date, target_date)
+        return 'big' if self.big[index] else 'small'
+
+    def lookup(self, target_date):
+        """取得指定日期是否休息與原因，回傳 (is_rest, reason)"""
+        index = self._index(target_date)
+        if index is None:
+            is_big = weekend_type_for(self.weekend_mode, self.start_date, target_date) == 'big'
+            code = rest_reason_code(target_date.weekday(), is_big)
+        else:
+            code = self.reasons[index]
+        return code != REASON_WORKDAY, REST_REASONS[code]
+
+    def range_slice(self, start_date, end_date):
+        """取得區間 (含頭尾) 在索引中的 slice，超出範圍時拋出 ValueError"""
+        start = self._index(start_date)
+        end = self._index(end_date)
+        if start is None or end is None:
+            raise ValueError(f"日期超出索引範圍: {self.first_date} ~ {self.last_date}")
+        return slice(start, end + 1)
+
+    def covering(self, start_date, end_date):
+        """取得涵蓋指定區間的索引，超出範圍時另外建立一份"""
+        if self._index(start_date) is not None and self._index(end_date) is not None:
+            return self
+        return RestDayCalendar(self.weekend_mode, self.start_date, start_date, end_date)
+
+    def rest_days(self, start_date, end_date):
+        """列出區間內所有休息日"""
+        calendar = self.covering(start_date, end_date)
+        reasons = calendar.reasons[calendar.range_slice(start_date, end_date)]
+        if calendar._np is not None:
+            offsets = calendar._np.flatnonzero(reasons).tolist()
+        else:
+            offsets = [i for i, code in enumerate(reasons) if code]
+        base = start_date.toordinal()
+        return [date.fromordinal(base + i) for i in offsets]
+
+    def count_rest_days(self, start_date, end_date):
+        """計算區間內的休息日數"""
+        calendar = self.covering(start_date, end_date)
+        reasons = calendar.reasons[calendar.range_slice(start_date, end_date)]
+        if calendar._np is not None:
+            return int(calendar._np.count_nonzero(reasons))
+        return sum(1 for code in reasons if code)
@@ -0,0 +1,65 @@
+# punch_card.py - 程式入口：預設開啟圖形介面，--headless 以常駐模式執行 (不載入 tkinter)
+"""
+執行方式:
+    python -m punch_card               # 開啟圖形介面
+    python -m punch_card --headless    # 常駐模式，適合伺服器或開機自動執行
+"""
+import argparse
+import signal
+import threading
+import time
+
+
+def run_headless(config_file):
+    """以常駐模式執行打卡核心，收到 SIGINT/SIGTERM 時結束"""
+    started = time.perf_counter()
+    from punch_engine import PunchEngine
+
+    engine = PunchEngine(config_file)
+    engine.start()
+    engine.logger.info(f"常駐模式啟動完成，耗時 {(time.perf_counter() - started) * 1000:.1f} 毫秒")
+
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        engine.logger.info(f"收到結束訊號 ({signum})，正在關閉")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    try:
+        # 以逾時等待讓主執行緒能定期處理訊號 (Windows 上 Event.wait 無法被訊號中斷)
+        while not stop_event.wait(1):
+            pass
+    finally:
+        engine.logger.info("常駐模式正在結束")
+        engine.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自動打卡系統")
+    parser.add_argument('--headless', action='store_true', help="不開啟圖形介面，以常駐模式執行")
+    parser.add_argument('--config', default="punch_config.json", help="設定檔路徑")
+    args = parser.parse_args()
+
+    if args.headless:
+        run_headless(args.config)
+        return
+
+    # 只有圖形介面需要載入 tkinter
+    import tkinter as tk
+    from punch_card_app import PunchCardApp
+    from punch_engine import PunchEngine
+
+    root = tk.Tk()
+    app = PunchCardApp(root, PunchEngine(args.config))
+    root.protocol("WM_DELETE_WINDOW", app.on_closing)
+    try:
+        root.mainloop()
+    except KeyboardInterrupt:
+        print("程式被使用者中斷")
+
+
+if __name__ == "__main__":
+    main()
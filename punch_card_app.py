@@ -1,384 +1,47 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-import requests
-import json
-import threading
-import time
-from datetime import datetime, timedelta
-import os
+from tkinter import ttk, messagebox
 import logging
-from logging.handlers import RotatingFileHandler
-import random
+import queue
+
+from punch_engine import PunchEngine
+from punch_plan import PUNCH_TYPES, PUNCH_IN, PUNCH_OUT
+from punch_state import ALL_FIELDS, FIELD_SCHEDULE, FIELD_DELIVERY, FIELD_RECORDS, FIELD_WEEKEND
+
+# 記錄區最多顯示的記錄筆數
+RECORDS_DISPLAY_LIMIT = 10
+# 檢查狀態變更事件的間隔 (毫秒)，沒有事件時只是一次空佇列檢查
+STATE_POLL_MS = 100
+# 時鐘標籤更新間隔 (毫秒)
+CLOCK_UPDATE_MS = 1000
 
 
 class PunchCardApp:
-    def __init__(self, root):
+    """Tk 介面：排程、發送與設定都交由 PunchEngine 處理"""
+
+    def __init__(self, root, engine=None):
         self.root = root
         self.root.title("自動打卡系統")
         self.root.geometry("800x800")
 
-        # 設定日誌系統
-        self.setup_logging()
-
-        # 設定檔案
-        self.config_file = "punch_config.json"
-        self.load_config()
+        # 打卡核心 (背景執行緒只發布變更事件到 engine.state_changes，由主執行緒取出後更新畫面)
+        self.engine = engine or PunchEngine()
+        self.logger = self.engine.logger
 
-        # 打卡記錄
-        self.punch_records = []
-
-        # 隨機時間控制
-        self.punch_in_random_time = None
-        self.punch_out_random_time = None
-        self.punch_in_executed = False
-        self.punch_out_executed = False
+        # 記錄區已顯示到的記錄序號
+        self.records_seq_shown = 0
 
-        # 日期追蹤和自動打卡控制
-        self.last_check_date = None
-        self.auto_punch_enabled = True
-        self.scheduler_running = False
+        # 工作執行緒要顯示的對話框 (在主執行緒中取出顯示)
+        self.dialogs = queue.SimpleQueue()
 
         self.setup_ui()
-        self.start_scheduler()
+        self.engine.start()
 
         self.logger.info("應用程式啟動成功")
 
-    def start_scheduler(self):
-        """啟動排程器"""
-        if not self.scheduler_running:
-            self.scheduler_running = True
-            self.schedule_check()
-            self.logger.info("排程器已啟動")
-
-    def schedule_check(self):
-        """定期檢查打卡時間"""
-        if self.scheduler_running:
-            self.check_punch_time()
-            # 每10秒檢查一次
-            self.root.after(10000, self.schedule_check)
-
-    def check_punch_time(self):
-        """檢查是否到了打卡時間"""
-        if not self.auto_punch_enabled:
-            return
-
-        current_time = datetime.now()
-        current_date = current_time.date()
-
-        # 檢查是否為休息日
-        is_rest, rest_reason = self.is_rest_day(current_date)
-        if is_rest:
-            # 如果是休息日，記錄當前日期並跳過今日所有檢查
-            if not hasattr(self, 'last_rest_date') or self.last_rest_date != current_date:
-                self.last_rest_date = current_date
-                self.logger.info(f"今日為休息日，跳過所有打卡檢查: {rest_reason}")
-            return
-
-        # 檢查是否需要重置每日執行狀態
-        if not hasattr(self, 'last_check_date') or self.last_check_date != current_date:
-            self.punch_in_executed = False
-            self.punch_out_executed = False
-            self.last_check_date = current_date
-            self.logger.info(f"新的一天開始，重置打卡狀態: {current_date}")
-
-            # 重新產生隨機時間
-            self.generate_random_times()
-
-        # 檢查上班打卡
-        if not self.punch_in_executed:
-            should_punch_in = False
-
-            if self.punch_in_mode == "exact":
-                target_time_str = self.punch_in_time
-                try:
-                    target_time = datetime.strptime(f"{current_date} {target_time_str}", '%Y-%m-%d %H:%M')
-
-                    time_diff = abs((current_time - target_time).total_seconds())
-                    if time_diff <= 15:
-                        should_punch_in = True
-                        self.logger.info(f"觸發上班精確打卡時間: {current_time.strftime('%H:%M:%S')}")
-                except ValueError as e:
-                    self.logger.error(f"上班精確時間格式錯誤: {e}")
-
-            elif self.punch_in_mode == "random":
-                if self.punch_in_random_time:
-                    time_diff = (current_time - self.punch_in_random_time).total_seconds()
-                    if 0 <= time_diff <= 30:
-                        should_punch_in = True
-                        self.logger.info(
-                            f"觸發上班隨機打卡時間: {current_time.strftime('%H:%M:%S')}, 目標時間: {self.punch_in_random_time.strftime('%H:%M:%S')}")
-
-            if should_punch_in:
-                self.punch_in_executed = True
-                self.schedule_punch("上班打卡")
-
-        # 檢查下班打卡
-        if not self.punch_out_executed:
-            should_punch_out = False
-
-            if self.punch_out_mode == "exact":
-                target_time_str = self.punch_out_time
-                try:
-                    target_time = datetime.strptime(f"{current_date} {target_time_str}", '%Y-%m-%d %H:%M')
-
-                    time_diff = abs((current_time - target_time).total_seconds())
-                    if time_diff <= 15:
-                        should_punch_out = True
-                        self.logger.info(f"觸發下班精確打卡時間: {current_time.strftime('%H:%M:%S')}")
-                except ValueError as e:
-                    self.logger.error(f"下班精確時間格式錯誤: {e}")
-
-            elif self.punch_out_mode == "random":
-                if self.punch_out_random_time:
-                    time_diff = (current_time - self.punch_out_random_time).total_seconds()
-                    if 0 <= time_diff <= 30:
-                        should_punch_out = True
-                        self.logger.info(
-                            f"觸發下班隨機打卡時間: {current_time.strftime('%H:%M:%S')}, 目標時間: {self.punch_out_random_time.strftime('%H:%M:%S')}")
-
-            if should_punch_out:
-                self.punch_out_executed = True
-                self.schedule_punch("下班打卡")
-
-    def schedule_punch(self, punch_type):
-        """排程打卡執行"""
-
-        def punch_task():
-            try:
-                current_time = datetime.now()
-                self.logger.info(f"開始執行自動打卡: {punch_type}")
-
-                response = self.send_webhook(punch_type)
-
-                # 檢查回應狀態
-                if response and 200 <= response.status_code < 300:
-                    record = f"{current_time.strftime('%H:%M:%S')} - {punch_type}成功 (狀態碼: {response.status_code})"
-                    self.punch_records.append(record)
-                    self.logger.info(f"自動打卡成功: {punch_type}, 狀態碼: {response.status_code}")
-                else:
-                    status_code = response.status_code if response else "無回應"
-                    record = f"{current_time.strftime('%H:%M:%S')} - {punch_type}失敗 (狀態碼: {status_code})"
-                    self.punch_records.append(record)
-                    self.logger.error(f"自動打卡失敗: {punch_type}, 狀態碼: {status_code}")
-
-                # 更新 UI (需要在主執行緒中執行)
-                self.root.after(0, self.update_status_display)
-
-            except Exception as e:
-                current_time = datetime.now()
-                record = f"{current_time.strftime('%H:%M:%S')} - {punch_type}錯誤: {e}"
-                self.punch_records.append(record)
-                self.logger.error(f"自動打卡時發生異常: {punch_type}, 錯誤: {e}")
-                self.root.after(0, self.update_status_display)
-
-        # 在新執行緒中執行打卡
-        threading.Thread(target=punch_task, daemon=True).start()
-
-    def setup_logging(self):
-        """設定日誌系統"""
-        # 建立 logs 資料夾
-        if not os.path.exists('logs'):
-            os.makedirs('logs')
-
-        # 設定日誌格式
-        log_format = '%(asctime)s - %(levelname)s - %(message)s'
-
-        # 設定主要 logger
-        self.logger = logging.getLogger('PunchCardApp')
-        self.logger.setLevel(logging.DEBUG)
-
-        # 清除現有的 handlers
-        self.logger.handlers.clear()
-
-        # 檔案處理器 - 輪轉日誌檔案
-        file_handler = RotatingFileHandler(
-            'logs/punch_card.log',
-            maxBytes=5 * 1024 * 1024,  # 5MB
-            backupCount=5,
-            encoding='utf-8'
-        )
-        file_handler.setLevel(logging.DEBUG)
-        file_formatter = logging.Formatter(log_format)
-        file_handler.setFormatter(file_formatter)
-
-        # 控制台處理器
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        console_formatter = logging.Formatter(log_format)
-        console_handler.setFormatter(console_formatter)
-
-        # 加入處理器
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
-
-    def load_config(self):
-        """載入設定檔"""
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    self.webhook_url = config.get('webhook_url', '')
-
-                    # 原有設定
-                    self.punch_in_time = config.get('punch_in_time', '09:00')
-                    self.punch_out_time = config.get('punch_out_time', '18:00')
-                    self.punch_in_start = config.get('punch_in_start', '09:00')
-                    self.punch_in_end = config.get('punch_in_end', '09:20')
-                    self.punch_out_start = config.get('punch_out_start', '18:00')
-                    self.punch_out_end = config.get('punch_out_end', '18:20')
-                    self.punch_in_mode = config.get('punch_in_mode', 'exact')
-                    self.punch_out_mode = config.get('punch_out_mode', 'exact')
-
-                    # 新增：週末設定
-                    self.weekend_mode = config.get('weekend_mode', 'small')  # 'big' 或 'small'
-                    self.weekend_start_date = config.get('weekend_start_date', None)  # 週末循環起始日期
-
-                    self.logger.info(f"設定檔載入成功: {self.config_file}")
-            else:
-                self.set_default_config()
-                self.logger.info("使用預設設定")
-        except Exception as e:
-            self.logger.error(f"載入設定失敗: {e}")
-            self.set_default_config()
-
-    def set_default_config(self):
-        """設定預設值"""
-        self.webhook_url = ''
-        self.punch_in_time = '09:00'
-        self.punch_out_time = '18:30'
-        self.punch_in_start = '09:00'
-        self.punch_in_end = '09:10'
-        self.punch_out_start = '18:30'
-        self.punch_out_end = '18:35'
-        self.punch_in_mode = 'exact'
-        self.punch_out_mode = 'exact'
-
-        # 新增：週末預設設定
-        self.weekend_mode = 'small'  # 預設為小周末
-        self.weekend_start_date = None
-
-    def save_config(self):
-        """儲存設定檔"""
-        config = {
-            'webhook_url': self.webhook_url,
-            'punch_in_time': self.punch_in_time,
-            'punch_out_time': self.punch_out_time,
-            'punch_in_start': self.punch_in_start,
-            'punch_in_end': self.punch_in_end,
-            'punch_out_start': self.punch_out_start,
-            'punch_out_end': self.punch_out_end,
-            'punch_in_mode': self.punch_in_mode,
-            'punch_out_mode': self.punch_out_mode,
-            # 新增：週末設定
-            'weekend_mode': self.weekend_mode,
-            'weekend_start_date': self.weekend_start_date
-        }
-        try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
-            self.logger.info("設定檔儲存成功")
-        except Exception as e:
-            self.logger.error(f"儲存設定失敗: {e}")
-            messagebox.showerror("錯誤", f"儲存設定失敗: {e}")
-
-    def get_current_weekend_type(self):
-        """取得當前週末類型"""
-        if not self.weekend_start_date:
-            # 如果沒有設定起始日期，使用當前日期作為起始點
-            self.weekend_start_date = datetime.now().strftime('%Y-%m-%d')
-            self.save_config()
-
-        try:
-            start_date = datetime.strptime(self.weekend_start_date, '%Y-%m-%d').date()
-            current_date = datetime.now().date()
-
-            # 計算從起始日期到現在經過了多少週
-            days_diff = (current_date - start_date).days
-            weeks_passed = days_diff // 7
-
-            # 根據起始週末模式和經過的週數判斷當前週末類型
-            if self.weekend_mode == 'big':
-                # 如果起始是大周末，奇數週為小周末，偶數週為大周末
-                current_type = 'small' if weeks_passed % 2 == 1 else 'big'
-            else:
-                # 如果起始是小周末，奇數週為大周末，偶數週為小周末
-                current_type = 'big' if weeks_passed % 2 == 1 else 'small'
-
-            return current_type
-        except Exception as e:
-            self.logger.error(f"計算週末類型失敗: {e}")
-            return 'small'  # 預設返回小周末
-
-    def is_rest_day(self, date=None):
-        """判斷是否為休息日"""
-        if date is None:
-            date = datetime.now().date()
-
-        weekday = date.weekday()  # 0=Monday, 1=Tuesday, ..., 6=Sunday
-
-        # 星期一永遠是休息日
-        if weekday == 0:  # Monday
-            return True, "星期一休息日"
-
-        # 星期二只在大周末時是休息日
-        if weekday == 1:  # Tuesday
-            current_weekend_type = self.get_current_weekend_type()
-            if current_weekend_type == 'big':
-                return True, "大周末星期二休息日"
-
-        # 其他日子不是休息日
-        return False, ""
-
-    def get_weekend_status_text(self):
-        """取得週末狀態文字"""
-        current_type = self.get_current_weekend_type()
-        if current_type == 'big':
-            return "目前為大週末週期（週一、二休息）"
-        else:
-            return "目前為小週末週期（週一休息）"
-
-    def generate_random_times(self):
-        """產生隨機打卡時間"""
-        current_date = datetime.now().date()
-
-        try:
-            # 上班隨機時間
-            start_time = datetime.strptime(f"{current_date} {self.punch_in_start}", '%Y-%m-%d %H:%M')
-            end_time = datetime.strptime(f"{current_date} {self.punch_in_end}", '%Y-%m-%d %H:%M')
-
-            time_diff = int((end_time - start_time).total_seconds())
-            random_seconds = random.randint(0, time_diff)
-            self.punch_in_random_time = start_time + timedelta(seconds=random_seconds)
-
-            # 下班隨機時間
-            start_time = datetime.strptime(f"{current_date} {self.punch_out_start}", '%Y-%m-%d %H:%M')
-            end_time = datetime.strptime(f"{current_date} {self.punch_out_end}", '%Y-%m-%d %H:%M')
-
-            time_diff = int((end_time - start_time).total_seconds())
-            random_seconds = random.randint(0, time_diff)
-            self.punch_out_random_time = start_time + timedelta(seconds=random_seconds)
-
-            self.logger.info(
-                f"產生隨機時間 - 上班: {self.punch_in_random_time.strftime('%H:%M:%S')}, 下班: {self.punch_out_random_time.strftime('%H:%M:%S')}")
-
-        except Exception as e:
-            self.logger.error(f"產生隨機時間失敗: {e}")
-
-    def send_webhook(self, message):
-        """發送 Webhook"""
-        try:
-            if not self.webhook_url:
-                raise Exception("Webhook URL 未設定")
-
-            payload = {"text": message}
-            response = requests.post(self.webhook_url, json=payload, timeout=10)
-            return response
-        except Exception as e:
-            self.logger.error(f"發送 Webhook 失敗: {e}")
-            return None
-
     def setup_ui(self):
         """設置使用者介面"""
+        engine = self.engine
+
         # 主框架
         main_frame = ttk.Frame(self.root, padding="10")
         main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -390,7 +53,7 @@ class PunchCardApp:
 
         # Webhook URL 設定
         ttk.Label(main_frame, text="Webhook URL:").grid(row=0, column=0, sticky=tk.W, pady=5)
-        self.url_var = tk.StringVar(value=self.webhook_url)
+        self.url_var = tk.StringVar(value=engine.webhook_url)
         url_entry = ttk.Entry(main_frame, textvariable=self.url_var, width=60)
         url_entry.grid(row=0, column=1, columnspan=4, sticky=(tk.W, tk.E), pady=5)
 
@@ -398,7 +61,7 @@ class PunchCardApp:
         punch_in_frame = ttk.LabelFrame(main_frame, text="上班打卡設定", padding="10")
         punch_in_frame.grid(row=1, column=0, columnspan=5, sticky=(tk.W, tk.E), pady=10)
 
-        self.punch_in_mode_var = tk.StringVar(value=self.punch_in_mode)
+        self.punch_in_mode_var = tk.StringVar(value=engine.punch_in_mode)
         ttk.Radiobutton(punch_in_frame, text="精確時間", variable=self.punch_in_mode_var,
                         value="exact", command=self.update_punch_in_mode).grid(row=0, column=0, sticky=tk.W, padx=5)
         ttk.Radiobutton(punch_in_frame, text="隨機區間", variable=self.punch_in_mode_var,
@@ -406,7 +69,7 @@ class PunchCardApp:
 
         # 精確時間設定
         ttk.Label(punch_in_frame, text="精確時間:").grid(row=1, column=0, sticky=tk.W, pady=5)
-        self.punch_in_time_var = tk.StringVar(value=self.punch_in_time)
+        self.punch_in_time_var = tk.StringVar(value=engine.punch_in_time)
         ttk.Entry(punch_in_frame, textvariable=self.punch_in_time_var, width=10).grid(row=1, column=1, sticky=tk.W,
                                                                                       pady=5)
 
@@ -415,8 +78,8 @@ class PunchCardApp:
         time_frame1 = ttk.Frame(punch_in_frame)
         time_frame1.grid(row=2, column=1, columnspan=3, sticky=tk.W, pady=5)
 
-        self.punch_in_start_var = tk.StringVar(value=self.punch_in_start)
-        self.punch_in_end_var = tk.StringVar(value=self.punch_in_end)
+        self.punch_in_start_var = tk.StringVar(value=engine.punch_in_start)
+        self.punch_in_end_var = tk.StringVar(value=engine.punch_in_end)
         ttk.Entry(time_frame1, textvariable=self.punch_in_start_var, width=8).pack(side=tk.LEFT, padx=2)
         ttk.Label(time_frame1, text="到").pack(side=tk.LEFT, padx=5)
         ttk.Entry(time_frame1, textvariable=self.punch_in_end_var, width=8).pack(side=tk.LEFT, padx=2)
@@ -425,7 +88,7 @@ class PunchCardApp:
         punch_out_frame = ttk.LabelFrame(main_frame, text="下班打卡設定", padding="10")
         punch_out_frame.grid(row=2, column=0, columnspan=5, sticky=(tk.W, tk.E), pady=10)
 
-        self.punch_out_mode_var = tk.StringVar(value=self.punch_out_mode)
+        self.punch_out_mode_var = tk.StringVar(value=engine.punch_out_mode)
         ttk.Radiobutton(punch_out_frame, text="精確時間", variable=self.punch_out_mode_var,
                         value="exact", command=self.update_punch_out_mode).grid(row=0, column=0, sticky=tk.W, padx=5)
         ttk.Radiobutton(punch_out_frame, text="隨機區間", variable=self.punch_out_mode_var,
@@ -433,7 +96,7 @@ class PunchCardApp:
 
         # 精確時間設定
         ttk.Label(punch_out_frame, text="精確時間:").grid(row=1, column=0, sticky=tk.W, pady=5)
-        self.punch_out_time_var = tk.StringVar(value=self.punch_out_time)
+        self.punch_out_time_var = tk.StringVar(value=engine.punch_out_time)
         ttk.Entry(punch_out_frame, textvariable=self.punch_out_time_var, width=10).grid(row=1, column=1, sticky=tk.W,
                                                                                         pady=5)
 
@@ -442,8 +105,8 @@ class PunchCardApp:
         time_frame2 = ttk.Frame(punch_out_frame)
         time_frame2.grid(row=2, column=1, columnspan=3, sticky=tk.W, pady=5)
 
-        self.punch_out_start_var = tk.StringVar(value=self.punch_out_start)
-        self.punch_out_end_var = tk.StringVar(value=self.punch_out_end)
+        self.punch_out_start_var = tk.StringVar(value=engine.punch_out_start)
+        self.punch_out_end_var = tk.StringVar(value=engine.punch_out_end)
         ttk.Entry(time_frame2, textvariable=self.punch_out_start_var, width=8).pack(side=tk.LEFT, padx=2)
         ttk.Label(time_frame2, text="到").pack(side=tk.LEFT, padx=5)
         ttk.Entry(time_frame2, textvariable=self.punch_out_end_var, width=8).pack(side=tk.LEFT, padx=2)
@@ -491,7 +154,7 @@ class PunchCardApp:
         ttk.Button(control_frame, text="手動下班打卡", command=lambda: self.manual_punch("下班打卡")).pack(side=tk.LEFT,
                                                                                                            padx=10)
 
-        self.auto_punch_var = tk.BooleanVar(value=self.auto_punch_enabled)
+        self.auto_punch_var = tk.BooleanVar(value=engine.auto_punch_enabled)
         ttk.Checkbutton(control_frame, text="啟用自動打卡", variable=self.auto_punch_var,
                         command=self.toggle_auto_punch).pack(side=tk.LEFT, padx=10)
 
@@ -499,9 +162,14 @@ class PunchCardApp:
         status_frame = ttk.LabelFrame(main_frame, text="系統狀態", padding="10")
         status_frame.grid(row=5, column=0, columnspan=5, sticky=(tk.W, tk.E, tk.N, tk.S), pady=10)
 
-        self.status_var = tk.StringVar()
-        status_label = ttk.Label(status_frame, textvariable=self.status_var, font=('Courier', 10))
-        status_label.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        # 時鐘、排程與發送狀態分成獨立的標籤，只更新有變更的部分
+        self.clock_var = tk.StringVar()
+        self.schedule_var = tk.StringVar()
+        self.delivery_var = tk.StringVar()
+        self.delivery_countdown = False  # 發送狀態有倒數時，時鐘計時器每秒一併更新
+        for row, var in enumerate((self.clock_var, self.schedule_var, self.delivery_var)):
+            ttk.Label(status_frame, textvariable=var, font=('Courier', 10),
+                      justify=tk.LEFT).grid(row=row, column=0, sticky=(tk.W, tk.E, tk.N))
 
         # 打卡記錄
         records_frame = ttk.LabelFrame(main_frame, text="打卡記錄", padding="10")
@@ -510,7 +178,7 @@ class PunchCardApp:
         # 配置網格權重
         main_frame.rowconfigure(5, weight=1)
         main_frame.rowconfigure(6, weight=1)
-        status_frame.rowconfigure(0, weight=1)
+        status_frame.rowconfigure(2, weight=1)
         records_frame.rowconfigure(0, weight=1)
 
         self.records_text = tk.Text(records_frame, height=8, width=80)
@@ -523,190 +191,139 @@ class PunchCardApp:
         records_frame.columnconfigure(0, weight=1)
 
         # 初始化狀態顯示
-        self.update_weekend_status()
-        self.update_status_display()
+        self.apply_state_changes(ALL_FIELDS)
 
-        # 定期更新狀態顯示
-        self.update_display_timer()
+        # 時鐘標籤與狀態變更事件各自以計時器更新
+        self.update_clock_timer()
+        self.poll_state_changes()
 
     def update_punch_in_mode(self):
         """更新上班打卡模式"""
-        self.punch_in_mode = self.punch_in_mode_var.get()
+        self.engine.set_punch_mode(PUNCH_TYPES[PUNCH_IN], self.punch_in_mode_var.get())
 
     def update_punch_out_mode(self):
         """更新下班打卡模式"""
-        self.punch_out_mode = self.punch_out_mode_var.get()
+        self.engine.set_punch_mode(PUNCH_TYPES[PUNCH_OUT], self.punch_out_mode_var.get())
 
     def set_big_weekend_start(self):
         """設定大週末起始點"""
-        self.weekend_mode = 'big'
-        self.weekend_start_date = datetime.now().strftime('%Y-%m-%d')
-        self.save_config()
-        self.update_weekend_status()
-        self.logger.info(f"設定大週末起始點: {self.weekend_start_date}")
+        self.engine.set_big_weekend_start()
         messagebox.showinfo("成功", "已設定為大週末週期起點")
 
     def reset_weekend_settings(self):
         """重置週末設置"""
-        self.weekend_mode = 'small'
-        self.weekend_start_date = datetime.now().strftime('%Y-%m-%d')
-        self.save_config()
-        self.update_weekend_status()
-        self.logger.info("重置週末設置為小週末")
+        self.engine.reset_weekend_settings()
         messagebox.showinfo("成功", "週末設置已重置")
 
     def update_weekend_status(self):
         """更新週末狀態顯示"""
-        status_text = self.get_weekend_status_text()
-        self.weekend_status_var.set(status_text)
+        self.set_if_changed(self.weekend_status_var, self.engine.get_weekend_status_text())
 
     def save_settings(self):
         """儲存所有設定"""
         try:
-            # 更新設定值
-            self.webhook_url = self.url_var.get()
-            self.punch_in_time = self.punch_in_time_var.get()
-            self.punch_out_time = self.punch_out_time_var.get()
-            self.punch_in_start = self.punch_in_start_var.get()
-            self.punch_in_end = self.punch_in_end_var.get()
-            self.punch_out_start = self.punch_out_start_var.get()
-            self.punch_out_end = self.punch_out_end_var.get()
-            self.punch_in_mode = self.punch_in_mode_var.get()
-            self.punch_out_mode = self.punch_out_mode_var.get()
-
-            # 驗證時間格式
-            self.validate_time_format()
-
-            # 儲存設定
-            self.save_config()
-
-            # 重新產生隨機時間
-            self.generate_random_times()
-
+            self.engine.update_settings({
+                'webhook_url': self.url_var.get(),
+                'punch_in_time': self.punch_in_time_var.get(),
+                'punch_out_time': self.punch_out_time_var.get(),
+                'punch_in_start': self.punch_in_start_var.get(),
+                'punch_in_end': self.punch_in_end_var.get(),
+                'punch_out_start': self.punch_out_start_var.get(),
+                'punch_out_end': self.punch_out_end_var.get(),
+                'punch_in_mode': self.punch_in_mode_var.get(),
+                'punch_out_mode': self.punch_out_mode_var.get(),
+            })
             messagebox.showinfo("成功", "設定已儲存")
-            self.logger.info("使用者設定已儲存")
 
         except Exception as e:
             error_msg = f"儲存設定時發生錯誤: {e}"
             messagebox.showerror("錯誤", error_msg)
             self.logger.error(error_msg)
 
-    def validate_time_format(self):
-        """驗證時間格式"""
-        time_fields = [
-            (self.punch_in_time, "上班精確時間"),
-            (self.punch_out_time, "下班精確時間"),
-            (self.punch_in_start, "上班隨機開始時間"),
-            (self.punch_in_end, "上班隨機結束時間"),
-            (self.punch_out_start, "下班隨機開始時間"),
-            (self.punch_out_end, "下班隨機結束時間")
-        ]
-
-        for time_str, field_name in time_fields:
-            try:
-                datetime.strptime(time_str, '%H:%M')
-            except ValueError:
-                raise ValueError(f"{field_name} 格式錯誤，請使用 HH:MM 格式")
-
     def manual_punch(self, punch_type):
-        """手動打卡"""
+        """手動打卡 (結果以對話框顯示)"""
 
-        def punch_task():
-            try:
-                current_time = datetime.now()
-                self.logger.info(f"開始執行手動打卡: {punch_type}")
-
-                response = self.send_webhook(punch_type)
-
-                if response and 200 <= response.status_code < 300:
-                    record = f"{current_time.strftime('%H:%M:%S')} - {punch_type}成功 (手動, 狀態碼: {response.status_code})"
-                    self.punch_records.append(record)
-                    self.logger.info(f"手動打卡成功: {punch_type}")
-                    self.root.after(0, lambda: messagebox.showinfo("成功", f"{punch_type}成功"))
-                else:
-                    status_code = response.status_code if response else "無回應"
-                    record = f"{current_time.strftime('%H:%M:%S')} - {punch_type}失敗 (手動, 狀態碼: {status_code})"
-                    self.punch_records.append(record)
-                    self.logger.error(f"手動打卡失敗: {punch_type}")
-                    self.root.after(0, lambda: messagebox.showerror("失敗", f"{punch_type}失敗"))
-
-                self.root.after(0, self.update_status_display)
-
-            except Exception as e:
-                current_time = datetime.now()
-                record = f"{current_time.strftime('%H:%M:%S')} - {punch_type}錯誤 (手動): {e}"
-                self.punch_records.append(record)
-                self.logger.error(f"手動打卡時發生異常: {e}")
-                self.root.after(0, lambda: messagebox.showerror("錯誤", f"打卡時發生錯誤: {e}"))
-                self.root.after(0, self.update_status_display)
-
-        threading.Thread(target=punch_task, daemon=True).start()
+        def on_done(ok, title, message):
+            # 在工作執行緒中呼叫，交由主執行緒的計時器顯示
+            self.dialogs.put((ok, title, message))
+
+        self.engine.manual_punch(punch_type, on_done)
 
     def toggle_auto_punch(self):
         """切換自動打卡狀態"""
-        self.auto_punch_enabled = self.auto_punch_var.get()
-        status = "啟用" if self.auto_punch_enabled else "停用"
-        self.logger.info(f"自動打卡已{status}")
+        status = self.engine.set_auto_punch(self.auto_punch_var.get())
         messagebox.showinfo("狀態更新", f"自動打卡已{status}")
 
-    def update_status_display(self):
-        """更新狀態顯示"""
-        current_time = datetime.now()
-
-        # 檢查是否為休息日
-        is_rest, rest_reason = self.is_rest_day()
-
-        if is_rest:
-            status_text = f"目前時間: {current_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            status_text += f"狀態: 休息日 ({rest_reason})\n"
-            status_text += "自動打卡: 暫停\n"
-        else:
-            status_text = f"目前時間: {current_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            status_text += f"自動打卡: {'啟用' if self.auto_punch_enabled else '停用'}\n"
-
-            # 顯示今日打卡狀態
-            if self.punch_in_executed:
-                status_text += "上班打卡: 已完成\n"
-            else:
-                if self.punch_in_mode == "exact":
-                    status_text += f"上班打卡: 等待 ({self.punch_in_time})\n"
-                else:
-                    if self.punch_in_random_time:
-                        status_text += f"上班打卡: 等待 ({self.punch_in_random_time.strftime('%H:%M:%S')})\n"
-                    else:
-                        status_text += "上班打卡: 等待\n"
-
-            if self.punch_out_executed:
-                status_text += "下班打卡: 已完成\n"
-            else:
-                if self.punch_out_mode == "exact":
-                    status_text += f"下班打卡: 等待 ({self.punch_out_time})\n"
-                else:
-                    if self.punch_out_random_time:
-                        status_text += f"下班打卡: 等待 ({self.punch_out_random_time.strftime('%H:%M:%S')})\n"
-                    else:
-                        status_text += "下班打卡: 等待\n"
-
-        self.status_var.set(status_text)
-
-        # 更新打卡記錄
-        if hasattr(self, 'records_text'):
-            records_display = "\n".join(self.punch_records[-10:])  # 只顯示最近10筆記錄
-            self.records_text.delete(1.0, tk.END)
-            self.records_text.insert(1.0, records_display)
-            # 自動滾動到最底部
-            self.records_text.see(tk.END)
-
-    def update_display_timer(self):
-        """定期更新顯示"""
-        self.update_status_display()
-        # 每秒更新一次顯示
-        self.root.after(1000, self.update_display_timer)
+    @staticmethod
+    def set_if_changed(var, text):
+        """內容相同時不重設，避免重新排版標籤"""
+        if var.get() != text:
+            var.set(text)
+
+    def apply_state_changes(self, fields):
+        """依變更的欄位重繪對應的部分"""
+        if FIELD_SCHEDULE in fields:
+            self.set_if_changed(self.schedule_var, self.engine.get_schedule_text())
+        if FIELD_DELIVERY in fields:
+            self.refresh_delivery()
+        if FIELD_RECORDS in fields:
+            self.refresh_records_view()
+        if FIELD_WEEKEND in fields:
+            self.update_weekend_status()
+
+    def refresh_delivery(self):
+        """重繪發送狀態，並記錄是否有限流或斷路器倒數需要每秒更新"""
+        self.set_if_changed(self.delivery_var, self.engine.get_delivery_text())
+        self.delivery_countdown = self.engine.delivery_countdown_active()
+
+    def poll_state_changes(self):
+        """取出背景執行緒發布的變更事件與對話框"""
+        fields = self.engine.state_changes.drain()
+        if fields:
+            self.apply_state_changes(fields)
+
+        while True:
+            try:
+                ok, title, message = self.dialogs.get_nowait()
+            except queue.Empty:
+                break
+            (messagebox.showinfo if ok else messagebox.showerror)(title, message)
+
+        self.root.after(STATE_POLL_MS, self.poll_state_changes)
+
+    def refresh_records_view(self):
+        """只將新增的打卡記錄附加到記錄區，沒有新記錄時不動作"""
+        if not hasattr(self, 'records_text'):
+            return
+
+        seq, new_records = self.engine.punch_records.since(self.records_seq_shown)
+        if not new_records:
+            return
+        self.records_seq_shown = seq
+
+        for record in new_records:
+            self.records_text.insert(tk.END, record + "\n")
+
+        # 只保留最近的記錄行數
+        line_count = int(self.records_text.index('end-1c').split('.')[0]) - 1
+        if line_count > RECORDS_DISPLAY_LIMIT:
+            self.records_text.delete('1.0', f'{line_count - RECORDS_DISPLAY_LIMIT + 1}.0')
+
+        # 自動滾動到最底部
+        self.records_text.see(tk.END)
+
+    def update_clock_timer(self):
+        """每秒只更新時鐘標籤；發送狀態有限流或斷路器倒數時一併更新"""
+        self.clock_var.set(self.engine.get_clock_text())
+        if self.delivery_countdown:
+            # 倒數結束後再更新一次，清除限流或斷路器的顯示
+            self.refresh_delivery()
+        self.root.after(CLOCK_UPDATE_MS, self.update_clock_timer)
 
     def on_closing(self):
         """程式關閉時的處理"""
-        self.scheduler_running = False
         self.logger.info("應用程式正在關閉")
+        self.engine.stop()
         self.root.destroy()
 
 
@@ -729,4 +346,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,79 @@
+# punch_clock.py - 可注入的時鐘 (正式執行使用系統時鐘，模擬時使用虛擬時鐘)
+import threading
+import time
+from datetime import datetime
+
+
+class SystemClock:
+    """系統時鐘"""
+
+    def time(self):
+        """牆上時鐘 (epoch 秒)"""
+        return time.time()
+
+    def monotonic(self):
+        """單調時鐘 (秒)，用於偵測牆上時鐘跳動"""
+        return time.monotonic()
+
+    def now(self):
+        """目前的本地時間 (datetime)"""
+        return datetime.now()
+
+    def today(self):
+        """今天的日期"""
+        return datetime.now().date()
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class VirtualClock(SystemClock):
+    """虛擬時鐘：時間只在呼叫 advance/set 時前進，可在數秒內模擬數月的排程
+
+    jump() 只移動牆上時鐘而不移動單調時鐘，用於模擬休眠喚醒或手動調整時間。
+    """
+
+    def __init__(self, start=None):
+        if isinstance(start, datetime):
+            start = start.timestamp()
+        self._wall = float(start if start is not None else time.time())
+        self._mono = 0.0
+        self._lock = threading.Lock()
+
+    def time(self):
+        return self._wall
+
+    def monotonic(self):
+        return self._mono
+
+    def now(self):
+        return datetime.fromtimestamp(self._wall)
+
+    def today(self):
+        return datetime.fromtimestamp(self._wall).date()
+
+    def advance(self, seconds):
+        """時間前進 seconds 秒"""
+        if seconds < 0:
+            raise ValueError("虛擬時鐘不可倒退，請使用 jump()")
+        with self._lock:
+            self._wall += seconds
+            self._mono += seconds
+            return self._wall
+
+    def set(self, timestamp):
+        """前進到指定的 epoch 秒 (早於目前時間時不動)"""
+        with self._lock:
+            if timestamp > self._wall:
+                self._mono += timestamp - self._wall
+                self._wall = float(timestamp)
+            return self._wall
+
+    def jump(self, seconds):
+        """牆上時鐘跳動 seconds 秒 (單調時鐘不變)"""
+        with self._lock:
+            self._wall += seconds
+            return self._wall
+
+    def __repr__(self):
+        return f"VirtualClock({self.now().isoformat(timespec='seconds')})"
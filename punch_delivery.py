@@ -0,0 +1,119 @@
+# punch_delivery.py - Webhook 發送：共用連線池與有上限的工作執行緒池
+import logging
+import queue
+import threading
+from urllib.parse import urlsplit
+
+# 預設值 (可由 punch_config.json 覆寫)
+DEFAULT_DELIVERY_WORKERS = 4
+DEFAULT_DELIVERY_QUEUE_SIZE = 256
+DEFAULT_HTTP_POOL_MAXSIZE = 4
+
+
+class WebhookClient:
+    """依主機共用 keep-alive 連線的 HTTP 用戶端
+
+    每個 Webhook 主機各有一個 Session 與連線池，
+    同一主機的打卡不必每次重新建立 TCP 連線與 TLS 交握。
+    """
+
+    def __init__(self, pool_maxsize=DEFAULT_HTTP_POOL_MAXSIZE):
+        self.pool_maxsize = pool_maxsize
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _session_for(self, url):
+        parts = urlsplit(url)
+        host_key = (parts.scheme, parts.netloc)
+        with self._lock:
+            session = self._sessions.get(host_key)
+            if session is None:
+                # requests 載入較慢，第一次發送時才載入
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount(f"{parts.scheme}://", adapter)
+                self._sessions[host_key] = session
+            return session
+
+    def post(self, url, payload, timeout=10):
+        """以共用連線池發送 JSON POST"""
+        return self._session_for(url).post(url, json=payload, timeout=timeout)
+
+    def close(self):
+        """關閉所有連線"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+class DeliveryPool:
+    """固定數量工作執行緒與有上限佇列的發送池
+
+    大量設定檔同時打卡時只會排入佇列，不會為每筆打卡建立新執行緒。
+    排隊上限由號誌控制，佇列本身不設上限，關閉時的結束標記不需要等待空位。
+    """
+
+    def __init__(self, workers=DEFAULT_DELIVERY_WORKERS, queue_size=DEFAULT_DELIVERY_QUEUE_SIZE, logger=None):
+        self.logger = logger or logging.getLogger('PunchCardApp')
+        self.queue_size = max(1, queue_size)
+        self._queue = queue.SimpleQueue()
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._threads = []
+        self._closed = False
+
+        for i in range(max(1, workers)):
+            thread = threading.Thread(target=self._worker, name=f"DeliveryWorker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, task, *args, timeout=None):
+        """排入一個工作，佇列已滿且逾時後拋出 queue.Full"""
+        if self._closed:
+            raise RuntimeError("發送池已關閉")
+        if not self._slots.acquire(timeout=timeout):
+            raise queue.Full
+        self._queue.put((task, args))
+
+    def submit_nowait(self, task, *args):
+        """排入一個工作，佇列已滿時立即拋出 queue.Full (排程執行緒使用，不會被阻塞)"""
+        if self._closed:
+            raise RuntimeError("發送池已關閉")
+        if not self._slots.acquire(blocking=False):
+            raise queue.Full
+        self._queue.put((task, args))
+
+    def queue_depth(self):
+        """目前排隊中的工作數"""
+        return self._queue.qsize()
+
+    def full(self):
+        """佇列是否已滿 (排程執行緒據此延後到期的打卡，而不是被拒絕)"""
+        return self._queue.qsize() >= self.queue_size
+
+    def shutdown(self, wait=False, timeout=2):
+        """停止所有工作執行緒 (已排入的工作仍會先執行完)"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join(timeout)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._slots.release()
+            task, args = item
+            try:
+                task(*args)
+            except Exception as e:
+                self.logger.error(f"發送工作執行失敗: {e}")
@@ -0,0 +1,1624 @@
+# punch_engine.py - 無介面的排程與發送核心 (GUI 與常駐模式共用)
+import json
+import threading
+import time
+from datetime import datetime, timedelta, time as dt_time
+import os
+import logging
+import queue
+import concurrent.futures
+from collections import Counter
+
+from punch_clock import SYSTEM_CLOCK
+from punch_batch import (WebhookBatcher, split_batch_response, DEFAULT_BATCH_WINDOW_MS, DEFAULT_BATCH_MAX_SIZE,
+                         BATCH_SIZE_BUCKETS)
+from punch_breaker import (CircuitBreakers, CircuitOpenError, STATE_OPEN, STATE_HALF_OPEN, STATE_LABELS,
+                           DEFAULT_BREAKER_FAILURE_THRESHOLD, DEFAULT_BREAKER_RESET_SECONDS)
+from punch_fanout import (FanoutSender, FanoutCollector, DeliveryTarget, parse_targets, PRIMARY_TARGET,
+                          DEFAULT_WEBHOOK_TIMEOUT)
+from punch_calendar import RestDayCalendar, REST_REASONS, REASON_MONDAY
+from punch_holidays import HolidayIndex, DEFAULT_HOLIDAY_FILES
+from punch_delivery import (WebhookClient, DeliveryPool, DEFAULT_DELIVERY_WORKERS,
+                            DEFAULT_DELIVERY_QUEUE_SIZE, DEFAULT_HTTP_POOL_MAXSIZE)
+from punch_metrics import (MetricsRegistry, MetricsServer, DEFAULT_METRICS_PORT, LATENCY_BUCKETS,
+                           LAG_BUCKETS, TICK_BUCKETS)
+from punch_logging import QueueLogging, DEFAULT_LOG_FORMAT, log_fields
+from punch_ledger import (PunchLedger, DEFAULT_LEDGER_FILE, EVENT_FIRED, EVENT_SUCCESS,
+                          EVENT_FAILED, EVENT_ERROR, EVENT_DEAD_LETTER, EVENT_MISSED, EVENT_CATCH_UP)
+from punch_outbox import (PunchOutbox, is_retryable_status, STATUS_PENDING, STATUS_DELIVERED,
+                          DEFAULT_RETRY_WORKERS, DEFAULT_RETRY_BASE_DELAY, DEFAULT_RETRY_MAX_DELAY,
+                          DEFAULT_RETRY_WINDOW_MINUTES)
+from punch_plan import (DayPlan, PUNCH_IN, PUNCH_OUT, PUNCH_TYPES, RANDOM_TOLERANCE,
+                        CATCH_UP_FIRE_LATE, CATCH_UP_SKIP, CATCH_UP_RESCHEDULE, DEFAULT_CATCH_UP_POLICY,
+                        DEFAULT_CATCH_UP_MAX_MINUTES, MISSED_STARTUP, MISSED_CLOCK_JUMP, MISSED_LATE,
+                        MISSED_REASONS)
+from punch_planner import profile_seed, catch_up_delay, plan_range, DEFAULT_PLAN_SEED
+from punch_profiles import (PunchProfile, ProfilesWatcher, intern_spec, PROFILE_FIELDS, DEFAULT_PROFILE_ID,
+                            DEFAULT_PROFILES_FILE, DEFAULT_PROFILES_RELOAD_SECONDS)
+from punch_ratelimit import (HostRateLimiter, host_key, format_delay, DEFAULT_RATE_LIMIT_PER_SECOND,
+                             DEFAULT_RATE_LIMIT_BURST)
+from punch_records import PunchRecordBuffer
+from punch_state import StateChanges, FIELD_SCHEDULE, FIELD_DELIVERY, FIELD_RECORDS, FIELD_WEEKEND
+from punch_scheduler import (PunchScheduler, DAY_ROLLOVER, FIRE_EXECUTED, FIRE_THROTTLED, FIRE_MISSED,
+                             FIRE_SKIPPED, FIRE_ROLLOVER)
+
+# 與 punch_async.DEFAULT_ASYNC_CONCURRENCY 相同，避免啟動時載入 asyncio
+DEFAULT_ASYNC_CONCURRENCY = 100
+
+# 限流延後少於此秒數時直接發送
+MIN_THROTTLE_DELAY = 0.01
+
+# 發送佇列已滿時，到期的打卡延後此秒數再觸發 (仍需在容許範圍內)
+DELIVERY_BACKLOG_DELAY = 0.05
+
+
+class PunchEngine:
+    """打卡核心：設定、日誌、排程、發送、帳本與重試佇列
+
+    不依賴 tkinter，可由 GUI 或常駐模式 (punch_card.py --headless) 使用。
+    狀態變更時呼叫 on_change (可能在背景執行緒中呼叫)。
+    所有時間都取自 clock (預設為系統時鐘，模擬時傳入 punch_clock.VirtualClock)。
+    """
+
+    def __init__(self, config_file="punch_config.json", on_change=None, clock=SYSTEM_CLOCK):
+        self.on_change = on_change
+        # 介面狀態變更事件 (介面執行緒取出後只重繪有變更的欄位)
+        self.state_changes = StateChanges()
+        self.clock = clock
+
+        # 設定日誌系統
+        self.setup_logging()
+
+        # 設定檔：punch_config.json 本身為預設設定檔，profiles_file 可再載入多個設定檔 (車隊模式)
+        self.profile_id = DEFAULT_PROFILE_ID
+        self.profile = PunchProfile(self.profile_id, '', None)
+        self.profiles = {self.profile_id: self.profile}
+        self.profiles_watcher = None
+
+        # 設定檔案
+        self.config_file = config_file
+        self.rest_calendar = None
+        self.rest_calendars = {}  # 其他設定檔共用的休息日索引 (依週末設定)
+        self.holidays = None
+        self.punch_specs = None
+        self.load_config()
+        self.log_queue.set_format(self.log_format)
+        self.compile_punch_specs()
+        self.load_holidays()
+
+        # Webhook 發送：共用連線池與有上限的工作執行緒池
+        self.webhook_client = WebhookClient(pool_maxsize=self.http_pool_maxsize)
+        self.delivery_pool = DeliveryPool(self.delivery_workers, self.delivery_queue_size, self.logger)
+        self._async_dispatcher = None
+        self._result_executor = None
+
+        # 多目標發送：除了設定檔的 Webhook 外，每筆打卡同時送到 delivery_targets 中的所有目標
+        self.compile_targets()
+        self.fanout = FanoutSender(self.send_target, self.delivery_workers * max(1, len(self.extra_targets)))
+
+        # 依 Webhook 主機限流 (到期的打卡依速率延後，而不是一次全部送出被 429 拒絕)
+        self.rate_limiter = HostRateLimiter(self.rate_limit_per_second, self.rate_limit_burst, clock=clock.time)
+
+        # 依 Webhook URL 的斷路器 (端點故障時不再等待逾時，改由重試佇列在恢復後補送)
+        self.breakers = CircuitBreakers(self.breaker_failure_threshold, self.breaker_reset_seconds,
+                                        clock=clock.time, on_state_change=self.on_breaker_change)
+
+        # 合併發送 (batch_window_ms > 0 時，同一 Webhook 的自動打卡合併為一次 POST)
+        self.batcher = None
+        if self.batch_window_ms > 0 and self.extra_targets:
+            self.logger.warning("已設定多個發送目標，合併發送停用")
+        elif self.batch_window_ms > 0:
+            self.batcher = WebhookBatcher(self.deliver_batch, self.batch_window_ms / 1000, self.batch_max_size,
+                                          logger=self.logger)
+
+        # 打卡帳本 (持久化，重啟時還原今日執行狀態)
+        self.ledger = PunchLedger(self.ledger_file, logger=self.logger, clock=clock.time)
+        self.ledger.start()
+
+        # 重試佇列 (與帳本共用資料庫檔案)
+        self.outbox = PunchOutbox(self.post_webhook, self.on_retry_result, path=self.ledger_file,
+                                  workers=self.retry_workers, base_delay=self.retry_base_delay,
+                                  max_delay=self.retry_max_delay, logger=self.logger, clock=clock.time)
+        self.outbox.throttle = self.retry_delay
+
+        # 打卡記錄 (固定容量，顯示端依序號只附加新記錄)
+        self.punch_records = PunchRecordBuffer()
+
+        # 自動打卡控制
+        self.auto_punch_enabled = True
+        self.scheduler_running = False
+
+        # 排程引擎：打卡事件依觸發時間排序，到期時精確執行
+        self.state_lock = threading.RLock()
+        self.scheduler = PunchScheduler(self.on_punch_due, self.logger, on_clock_jump=self.on_clock_jump,
+                                        clock=clock)
+
+        # 指標 (程序內累計，設定 metrics_port 時以 HTTP 提供)
+        self.metrics = MetricsRegistry()
+        self.metrics_server = None
+        self.setup_metrics()
+
+    @property
+    def async_dispatcher(self):
+        """asyncio 發送器 (第一次使用時才載入)"""
+        if self._async_dispatcher is None:
+            from punch_async import AsyncWebhookDispatcher
+            self._async_dispatcher = AsyncWebhookDispatcher(self.async_concurrency, logger=self.logger)
+        return self._async_dispatcher
+
+    @property
+    def result_executor(self):
+        """asyncio 發送的輔助執行緒：等待觸發記錄落盤、記錄結果 (會寫入 SQLite，不在事件迴圈中執行)"""
+        if self._result_executor is None:
+            self._result_executor = concurrent.futures.ThreadPoolExecutor(2, thread_name_prefix="PunchResult")
+        return self._result_executor
+
+    @property
+    def day_plan(self):
+        """預設設定檔的今日打卡計畫 (觸發時間、容許範圍與執行狀態)"""
+        return self.profile.plan
+
+    def start(self):
+        """啟動排程器與重試佇列"""
+        if not self.scheduler_running:
+            self.scheduler_running = True
+            self.outbox.start()
+            if self.batcher is not None:
+                self.batcher.start()
+            # 先載入設定檔清單，啟動時一併依補救策略處理
+            if self.profiles_file:
+                self.profiles_watcher = ProfilesWatcher(self.profiles_file, self.apply_profiles,
+                                                        self.profiles_reload_seconds, logger=self.logger)
+                self.profiles_watcher.check()
+            self.scheduler.start()
+            # 程式啟動時若已錯過今日打卡時間，依補救策略處理
+            self.check_punch_time(MISSED_STARTUP)
+            self.logger.info("排程器已啟動")
+            if self.profiles_watcher is not None:
+                self.profiles_watcher.start()
+            self.start_metrics_server()
+
+    def start_metrics_server(self):
+        """設定 metrics_port 時開放 Prometheus 指標端點"""
+        if not self.metrics_port or self.metrics_server is not None:
+            return
+        server = MetricsServer(self.metrics, self.metrics_port, logger=self.logger)
+        try:
+            server.start()
+        except OSError as e:
+            self.logger.error(f"無法啟動指標端點 (連接埠 {self.metrics_port}): {e}")
+            return
+        self.metrics_server = server
+
+    def stop(self):
+        """停止所有背景工作"""
+        self.scheduler_running = False
+        if self.profiles_watcher is not None:
+            self.profiles_watcher.stop()
+            self.profiles_watcher = None
+        self.scheduler.stop()
+        if self.batcher is not None:
+            # 尚未送出的批次先交給發送池
+            self.batcher.stop()
+        self.delivery_pool.shutdown()
+        self.fanout.shutdown()
+        if self._async_dispatcher is not None:
+            self._async_dispatcher.shutdown()
+        if self._result_executor is not None:
+            # 關閉時被取消的打卡結果需先寫入帳本與重試佇列
+            self._result_executor.shutdown(wait=True)
+        self.outbox.stop()
+        self.webhook_client.close()
+        self.ledger.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        # 最後停止日誌寫入執行緒，確保關閉過程的日誌都已寫出
+        self.log_queue.stop()
+
+    def notify_change(self, *fields):
+        """發布狀態變更 (fields 為 punch_state.FIELD_*，未指定時為全部欄位)"""
+        self.state_changes.publish(*fields)
+        if self.on_change is not None:
+            self.on_change()
+
+    def setup_metrics(self):
+        """建立指標 (更新成本極低，設定 metrics_port 時才開放 HTTP 端點)"""
+        metrics = self.metrics
+        self.webhook_latency = metrics.histogram(
+            'punch_webhook_latency_seconds', "Webhook 往返時間", LATENCY_BUCKETS, labels=('backend',))
+        self.scheduler_lag = metrics.histogram(
+            'punch_scheduler_lag_seconds', "實際觸發時間與目標時間的差距", LAG_BUCKETS, labels=('punch_type',))
+        self.tick_duration = metrics.histogram(
+            'punch_check_tick_seconds', "check_punch_time 執行時間", TICK_BUCKETS)
+        self.punch_outcomes = metrics.counter(
+            'punch_outcomes_total', "打卡結果 (依來源、結果與狀態碼)", labels=('source', 'outcome', 'status_code'))
+        self.missed_windows = metrics.counter(
+            'punch_missed_windows_total', "錯過打卡時間的次數 (依原因與處理方式)",
+            labels=('punch_type', 'reason', 'action'))
+        self.throttle_delays = metrics.histogram(
+            'punch_throttle_delay_seconds', "因限流延後發送的秒數", LAG_BUCKETS, labels=('host',))
+        self.batch_sizes = metrics.histogram(
+            'punch_webhook_batch_size', "合併發送的每批打卡數", BATCH_SIZE_BUCKETS)
+        self.target_outcomes = metrics.counter(
+            'punch_target_outcomes_total', "多目標發送時依目標累計的結果", labels=('target', 'outcome'))
+        self.breaker_transitions = metrics.counter(
+            'punch_breaker_transitions_total', "Webhook 斷路器狀態變更次數", labels=('state',))
+        self.clock_jumps = metrics.counter(
+            'punch_clock_jumps_total', "偵測到的系統時鐘跳動次數", labels=('direction',))
+        metrics.gauge('punch_delivery_queue_depth', "發送池排隊中的工作數", self.delivery_pool.queue_depth)
+        metrics.gauge('punch_outbox_pending', "待重試的打卡數", self.outbox.pending_count)
+        metrics.gauge('punch_scheduler_pending', "排程器中等待觸發的事件數", lambda: len(self.scheduler))
+        metrics.gauge('punch_batch_pending', "等待合併發送的打卡數",
+                      lambda: self.batcher.pending_count() if self.batcher is not None else 0)
+        metrics.gauge('punch_profiles', "目前載入的設定檔數", lambda: len(self.profiles))
+        metrics.gauge('punch_breaker_open', "開啟或半開的 Webhook 斷路器數", self.breakers.open_count)
+        metrics.gauge('punch_async_in_flight', "asyncio 發送中的請求數",
+                      lambda: self._async_dispatcher.in_flight() if self._async_dispatcher is not None else 0)
+
+    def count_outcome(self, source, outcome, status_code=None):
+        """累計打卡結果"""
+        self.punch_outcomes.inc(source, outcome, status_code if isinstance(status_code, int) else "none")
+
+    def check_punch_time(self, missed_reason=None, profile=None):
+        """計算今日打卡時間並交由排程器在到期時精確觸發
+
+        missed_reason 不為 None 時 (程式啟動、時鐘跳動)，已錯過的打卡會依補救策略處理；
+        變更設定後重新排程時則不補打。profile 為 None 時重新排程所有設定檔。
+        """
+        started = time.perf_counter()
+        missed = Counter()
+        try:
+            with self.state_lock:
+                current_time = self.clock.now()
+                profiles = [profile] if profile is not None else list(self.profiles.values())
+                for item in profiles:
+                    self.schedule_profile(item, current_time, missed_reason, missed)
+        finally:
+            self.tick_duration.observe(time.perf_counter() - started)
+        if missed:
+            self.log_missed_summary(missed_reason, missed)
+
+    def log_missed_summary(self, reason, missed):
+        """設定檔眾多時錯過的打卡只記錄一行摘要 (各設定檔的明細記錄於除錯日誌與帳本)"""
+        reason_text = MISSED_REASONS.get(reason, reason)
+        actions = ", ".join(f"{action} {count} 筆" for action, count in sorted(missed.items()))
+        self.logger.warning(f"{sum(missed.values())} 筆設定檔打卡已錯過，原因: {reason_text}，處理方式: {actions}",
+                            extra=log_fields(event="missed_summary", reason=reason, count=sum(missed.values()),
+                                             actions=dict(missed)))
+        self.notify_change(FIELD_RECORDS, FIELD_SCHEDULE)
+
+    def is_profile_active(self, profile):
+        """預設設定檔在車隊模式且未設定 Webhook 時不排程"""
+        return profile is not self.profile or bool(self.webhook_url) or not self.profiles_file
+
+    def schedule_profile(self, profile, current_time, missed_reason=None, missed=None):
+        """依設定檔的今日打卡計畫重新排程 (需持有 state_lock，由 check_punch_time 呼叫)
+
+        missed 為 Counter 時，其他設定檔錯過的打卡依處理方式累計，由呼叫端記錄摘要。
+        """
+        profile_id = profile.profile_id
+        current_date = current_time.date()
+
+        # 清除舊排程，並在下一個午夜重新排程
+        self.scheduler.cancel_profile(profile_id)
+        if not self.is_profile_active(profile):
+            return
+        next_midnight = datetime.combine(current_date + timedelta(days=1), datetime.min.time())
+        self.scheduler.schedule(profile_id, DAY_ROLLOVER, next_midnight.timestamp())
+
+        # 檢查是否需要重置每日執行狀態
+        if profile.plan is None or profile.plan.day != current_date:
+            if profile is self.profile:
+                self.logger.info(f"新的一天開始，重置打卡狀態: {current_date}")
+
+            # 重新產生隨機時間
+            self.generate_random_times(profile)
+
+        # 檢查是否為休息日
+        is_rest, rest_reason = self.is_rest_day(current_date, profile)
+        if is_rest:
+            # 如果是休息日，記錄當前日期並跳過今日所有檢查
+            if profile is self.profile and getattr(self, 'last_rest_date', None) != current_date:
+                self.last_rest_date = current_date
+                self.logger.info(f"今日為休息日，跳過所有打卡檢查: {rest_reason}")
+            return
+
+        plan = profile.plan
+        if plan is None:
+            return
+
+        # 排程上下班打卡
+        now = int(current_time.timestamp())
+        for index in (PUNCH_IN, PUNCH_OUT):
+            fire_at = plan.fire_time(index, now)
+            if (fire_at is None and missed_reason is not None and self.auto_punch_enabled
+                    and plan.is_missed(index, now)):
+                fire_at = self.handle_missed_window(profile, index, now, missed_reason, missed)
+            if fire_at is not None:
+                self.scheduler.schedule(profile_id, PUNCH_TYPES[index], fire_at)
+
+    def handle_missed_window(self, profile, index, now, reason, missed=None):
+        """依補救策略處理錯過的打卡 (需持有 state_lock)，回傳新的觸發時間，不補打時回傳 None
+
+        missed 為 Counter 時 (啟動或時鐘跳動時一次處理所有設定檔)，
+        預設設定檔以外只記錄除錯日誌，並將處理方式累計到 missed。
+        """
+        plan = profile.plan
+        punch_type = PUNCH_TYPES[index]
+        late = now - plan.targets[index]
+        action = CATCH_UP_SKIP
+        fire_at = None
+
+        # 隨機模式：在剩餘的隨機區間內重新取一個時間 (依設定檔種子與日期，重新啟動後相同)
+        if self.catch_up_policy == CATCH_UP_RESCHEDULE and plan.modes[index] == "random":
+            midnight = int(datetime.combine(plan.day, dt_time.min).timestamp())
+            window_end = midnight + profile.specs[index].end
+            if window_end > now:
+                seed = profile_seed(profile.profile_id, self.plan_seed)
+                fire_at = now + catch_up_delay(seed, plan.day.toordinal(), index, window_end - now)
+                plan.retarget(index, fire_at, RANDOM_TOLERANCE)
+                action = CATCH_UP_RESCHEDULE
+
+        # 立即補打 (重新排程但區間已過時也適用)，超過上限時間則放棄
+        if (action == CATCH_UP_SKIP and self.catch_up_policy in (CATCH_UP_FIRE_LATE, CATCH_UP_RESCHEDULE)
+                and late <= self.catch_up_max_minutes * 60):
+            plan.extend_deadline(index, now + plan.deadlines[index] - plan.targets[index])
+            fire_at = now
+            action = CATCH_UP_FIRE_LATE
+
+        current_time = datetime.fromtimestamp(now)
+        reason_text = MISSED_REASONS.get(reason, reason)
+        label = self.record_label(profile.profile_id)
+        if action == CATCH_UP_SKIP:
+            plan.mark_missed(index)
+            self.ledger.record(profile.profile_id, plan.day, punch_type, EVENT_MISSED, detail=reason)
+            record = f"{current_time.strftime('%H:%M:%S')} - {label}{punch_type}已錯過 ({reason_text})，未補打"
+        else:
+            self.ledger.record(profile.profile_id, plan.day, punch_type, EVENT_CATCH_UP,
+                               detail=f"{reason}:{action}")
+            if action == CATCH_UP_RESCHEDULE:
+                when = f"重新排程至 {datetime.fromtimestamp(fire_at).strftime('%H:%M:%S')}"
+            else:
+                when = "立即補打"
+            record = f"{current_time.strftime('%H:%M:%S')} - {label}{punch_type}已錯過 ({reason_text})，{when}"
+
+        self.punch_records.append(record)
+        self.missed_windows.inc(punch_type, reason, action)
+        summarized = missed is not None and profile is not self.profile
+        if summarized:
+            missed[action] += 1
+        log = self.logger.debug if summarized else self.logger.warning
+        log(
+            f"{label}錯過{punch_type}時間 {late:.0f} 秒，原因: {reason_text}，處理方式: {action}",
+            extra=log_fields(event="missed", profile_id=profile.profile_id, punch_type=punch_type,
+                             target_time=datetime.fromtimestamp(plan.targets[index]).isoformat(),
+                             actual_time=current_time.isoformat(), reason=reason, action=action))
+        if not summarized:
+            self.notify_change(FIELD_RECORDS, FIELD_SCHEDULE)
+        return fire_at
+
+    def on_clock_jump(self, jump):
+        """系統時鐘跳動 (在排程執行緒中呼叫)：重新排程並依補救策略處理錯過的打卡"""
+        self.clock_jumps.inc("forward" if jump > 0 else "backward")
+        self.check_punch_time(MISSED_CLOCK_JUMP)
+        self.notify_change()
+
+    def on_punch_due(self, event):
+        """排程事件到期 (在排程執行緒中呼叫)，回傳處理結果 (punch_scheduler.FIRE_*)"""
+        profile = self.profiles.get(event.profile_id)
+        if profile is None:
+            # 設定檔已移除
+            return FIRE_SKIPPED
+        if event.punch_type == DAY_ROLLOVER:
+            self.check_punch_time(profile=profile)
+            if profile is self.profile:
+                self.notify_change(FIELD_SCHEDULE, FIELD_WEEKEND)
+            return FIRE_ROLLOVER
+
+        index = PUNCH_TYPES.index(event.punch_type)
+        deferred = None
+        with self.state_lock:
+            if not self.auto_punch_enabled:
+                return FIRE_SKIPPED
+
+            plan = profile.plan
+            now = int(self.clock.time())
+            if plan is None:
+                return FIRE_SKIPPED
+            if not plan.is_due(index, now):
+                # 觸發時已超過容許範圍 (例如系統忙碌)，依補救策略處理
+                if plan.is_missed(index, now):
+                    fire_at = self.handle_missed_window(profile, index, now, MISSED_LATE)
+                    if fire_at is not None:
+                        self.scheduler.schedule(profile.profile_id, event.punch_type, fire_at)
+                    return FIRE_MISSED
+                return FIRE_SKIPPED
+            if self.defer_backlogged(profile, index, event.punch_type, event.reserved):
+                self.notify_change(FIELD_DELIVERY)
+                return FIRE_THROTTLED
+            if not event.reserved:
+                throttled, deferred = self.throttle_punch(profile, index, event.punch_type)
+                if throttled and deferred is None:
+                    self.notify_change(FIELD_DELIVERY)
+                    return FIRE_THROTTLED
+            plan.mark_executed(index)
+        if profile is self.profile:
+            self.notify_change(FIELD_SCHEDULE)
+        if deferred is not None:
+            # 帳本與重試佇列的寫入在釋放 state_lock 後進行
+            self.defer_throttled(profile, index, event.punch_type, deferred)
+            return FIRE_THROTTLED
+
+        # 觸發記錄交給帳本批次寫入，由發送端等待落盤後再發送 (排程執行緒不等待磁碟 I/O)
+        fired = self.ledger.record(profile.profile_id, plan.day, event.punch_type, EVENT_FIRED)
+
+        now = self.clock.time()
+        lag = now - event.fire_at
+        self.scheduler_lag.observe(now - plan.targets[index], event.punch_type)
+        self.logger.info(
+            f"觸發{self.record_label(profile.profile_id)}{event.punch_type}時間: "
+            f"{self.clock.now().strftime('%H:%M:%S')}, 延遲: {lag:.3f} 秒",
+            extra=log_fields(event="fired", profile_id=profile.profile_id, punch_type=event.punch_type,
+                             target_time=datetime.fromtimestamp(plan.targets[index]).isoformat(),
+                             actual_time=datetime.fromtimestamp(now).isoformat(timespec='milliseconds'),
+                             lag_ms=round(lag * 1000, 1)))
+        self.schedule_punch(event.punch_type, profile, fired)
+        return FIRE_EXECUTED
+
+    def throttle_punch(self, profile, index, punch_type):
+        """端點已達速率上限或要求暫停時，將打卡延後到輪到的時間 (需持有 state_lock)
+
+        回傳 (是否已延後, 需交給重試佇列的延後秒數或 None)；
+        後者不為 None 時由呼叫端在釋放 state_lock 後呼叫 defer_throttled。
+        """
+        # 合併發送時同一端點只會送出一次請求，不逐筆限流
+        if self.batcher is not None or not profile.webhook_url:
+            return False, None
+        delay = self.rate_limiter.reserve(profile.webhook_url)
+        if delay < MIN_THROTTLE_DELAY:
+            return False, None
+
+        fire_at = self.clock.time() + delay
+        host = host_key(profile.webhook_url)
+        self.throttle_delays.observe(delay, host)
+        if fire_at >= profile.plan.deadlines[index]:
+            # 輪到時已超過容許範圍：不延長容許範圍，交給重試佇列在預約的時間送出
+            return True, delay
+        self.scheduler.schedule(profile.profile_id, punch_type, fire_at, reserved=True)
+
+        self.logger.debug(f"{self.record_label(profile.profile_id)}{punch_type}因限流延後 {delay:.2f} 秒: {host}",
+                          extra=log_fields(event="throttled", profile_id=profile.profile_id,
+                                           punch_type=punch_type, host=host, delay_ms=round(delay * 1000, 1)))
+        return True, None
+
+    def defer_backlogged(self, profile, index, punch_type, reserved):
+        """發送佇列已滿時將到期的打卡稍後再觸發 (需持有 state_lock)，回傳是否已延後
+
+        延後後仍需在容許範圍內；已超過時照常交給發送池 (仍滿時排入重試佇列)。
+        """
+        if self.delivery_backend == "asyncio" or (self.batcher is not None and profile.webhook_url):
+            return False
+        if not self.delivery_pool.full():
+            return False
+        fire_at = self.clock.time() + DELIVERY_BACKLOG_DELAY
+        if fire_at >= profile.plan.deadlines[index]:
+            return False
+        self.scheduler.schedule(profile.profile_id, punch_type, fire_at, reserved=reserved)
+        self.logger.debug(f"{self.record_label(profile.profile_id)}{punch_type}因發送佇列已滿延後 "
+                          f"{DELIVERY_BACKLOG_DELAY} 秒")
+        return True
+
+    def defer_throttled(self, profile, index, punch_type, delay):
+        """限流延後超過容許範圍的打卡交給重試佇列 (已標記為執行，不需持有 state_lock)
+
+        設定檔的 Webhook 延後到已預約的時間，其他目標依重試佇列的退避時間送出。
+        """
+        plan = profile.plan
+        # 已交給重試佇列，重啟後不再觸發
+        self.ledger.record(profile.profile_id, plan.day, punch_type, EVENT_FIRED)
+
+        current_time = self.clock.now()
+        label = self.record_label(profile.profile_id)
+        reason = f"限流延後 {format_delay(delay)}，超過容許範圍"
+        record = f"{current_time.strftime('%H:%M:%S')} - {label}{punch_type}失敗 ({reason})"
+        retried = False
+        for target in self.targets_for(profile):
+            if self.enqueue_retry(punch_type, current_time, error=reason, profile=profile, url=target.url,
+                                  delay=delay if target.url == profile.webhook_url else 0):
+                retried = True
+        if retried:
+            record += " - 已排入重試"
+        self.punch_records.append(record)
+        self.ledger.record(profile.profile_id, plan.day, punch_type, EVENT_FAILED, detail=reason)
+        self.count_outcome("auto", EVENT_FAILED)
+        self.logger.warning(f"{label}{punch_type}{reason}，交給重試佇列",
+                            extra=log_fields(event="throttled", profile_id=profile.profile_id,
+                                             punch_type=punch_type, host=host_key(profile.webhook_url),
+                                             delay_ms=round(delay * 1000, 1), deferred=True))
+        self.notify_change(FIELD_RECORDS, FIELD_DELIVERY)
+
+    def wait_fired(self, fired, punch_type):
+        """等待觸發記錄寫入帳本 (在發送端呼叫)，先落盤再發送，避免當機重啟後重複打卡"""
+        if fired is not None and not fired.wait(2):
+            self.logger.warning(f"打卡帳本寫入逾時: {punch_type}")
+
+    def schedule_punch(self, punch_type, profile=None, fired=None):
+        """排程打卡執行 (fired 為觸發記錄落盤後設定的 Event，發送前等待)"""
+        profile = profile or self.profile
+        if self.batcher is not None and profile.webhook_url:
+            self.batcher.add(profile.webhook_url, (punch_type, profile, self.clock.now(), fired))
+            return
+        if self.delivery_backend == "asyncio":
+            self.schedule_punch_async(punch_type, profile, fired)
+            return
+
+        def punch_task():
+            try:
+                self.wait_fired(fired, punch_type)
+                current_time = self.clock.now()
+                self.logger.info(f"開始執行自動打卡: {self.record_label(profile.profile_id)}{punch_type}")
+
+                result = self.fanout.send_all(
+                    self.targets_for(profile), {"text": punch_type},
+                    on_late=lambda late: self.record_late_target(punch_type, current_time, late, profile=profile))
+                self.record_punch_result(punch_type, current_time, result.response, result.latency,
+                                         profile=profile, failure=result.failure, fanout=result)
+
+            except Exception as e:
+                self.record_punch_error(punch_type, e, profile)
+
+        # 交由發送池執行打卡
+        self.submit_delivery(punch_task, punch_type, profile=profile)
+
+    def schedule_punch_async(self, punch_type, profile=None, fired=None):
+        """以 asyncio 發送器執行打卡 (不佔用工作執行緒)"""
+        profile = profile or self.profile
+        current_time = self.clock.now()
+        self.logger.info(f"開始執行自動打卡 (asyncio): {self.record_label(profile.profile_id)}{punch_type}")
+
+        def record(result):
+            try:
+                self.record_punch_result(punch_type, current_time, result.response, result.latency,
+                                         profile=profile, failure=result.failure, fanout=result)
+            except Exception as e:
+                self.record_punch_error(punch_type, e, profile)
+
+        def on_complete(result):
+            # 事件迴圈中只做簿記 (延遲、限流、斷路器)，結果記錄交給結果執行緒
+            try:
+                self.result_executor.submit(record, result)
+            except RuntimeError:
+                # 已關閉
+                record(result)
+
+        targets = self.targets_for(profile)
+        collector = FanoutCollector(targets, on_complete)
+        payload = {"text": punch_type}
+        started = time.perf_counter()
+
+        def on_done(future, index, url):
+            latency = time.perf_counter() - started
+            self.webhook_latency.observe(latency, "asyncio")
+            error = None
+            try:
+                response = future.result()
+                self.observe_throttle(url, response)
+            except concurrent.futures.CancelledError:
+                # 關閉時被取消的打卡交由重試佇列於下次啟動時補送
+                response = None
+                error = "已取消"
+            except Exception as e:
+                self.logger.error(f"發送 Webhook 失敗: {e!r}")
+                response = None
+            self.breakers.record(url, response)
+            collector.set_result(index, response, error, latency)
+
+        def dispatch():
+            self.wait_fired(fired, punch_type)
+            # 各目標同時送出，全部回應後才記錄結果
+            for index, target in enumerate(targets):
+                if not target.url:
+                    self.logger.error("發送 Webhook 失敗: Webhook URL 未設定")
+                    collector.set_result(index)
+                elif not self.breakers.allow(target.url):
+                    collector.set_result(index, error="斷路器開啟")
+                else:
+                    future = self.async_dispatcher.submit(target.url, payload, timeout=target.timeout)
+                    future.add_done_callback(lambda f, index=index, url=target.url: on_done(f, index, url))
+
+        if fired is None or fired.is_set():
+            dispatch()
+        else:
+            # 觸發記錄尚未落盤：由輔助執行緒等待後再交給事件迴圈 (不佔用發送池的佇列)
+            self.result_executor.submit(dispatch)
+
+    def deliver_batch(self, url, items):
+        """以一次 POST 送出合併後的打卡，並將每筆結果對應回各設定檔 (在合併執行緒中呼叫)"""
+        payload = [{"text": punch_type, "profile_id": profile.profile_id} for punch_type, profile, _, _ in items]
+        self.batch_sizes.observe(len(items))
+
+        def batch_task():
+            for punch_type, _, _, fired in items:
+                self.wait_fired(fired, punch_type)
+            self.logger.info(f"開始執行合併打卡: {len(items)} 筆")
+            started = time.perf_counter()
+            failure = None
+            try:
+                response = self.post_webhook(url, payload)
+            except CircuitOpenError as e:
+                self.logger.warning(f"合併打卡 {len(items)} 筆未發送: {e}")
+                response = None
+                failure = "斷路器開啟"
+            except Exception as e:
+                self.logger.error(f"發送合併 Webhook 失敗: {e}")
+                response = None
+            latency = time.perf_counter() - started
+            for (punch_type, profile, current_time, _), result in zip(items, split_batch_response(response, len(items))):
+                self.record_punch_result(punch_type, current_time, result, latency, profile=profile, failure=failure)
+
+        try:
+            self.delivery_pool.submit_nowait(batch_task)
+        except (queue.Full, RuntimeError) as e:
+            # 不等待空位：仍在容許範圍內的打卡放回合併佇列，下一個時間窗再送，其餘交給重試佇列
+            requeue, failed = [], []
+            retry_at = self.clock.time() + self.batch_window_ms / 1000
+            for item in items:
+                punch_type, profile, _, _ = item
+                plan = profile.plan
+                if (isinstance(e, queue.Full) and self.batcher.running and plan is not None
+                        and retry_at < plan.deadlines[PUNCH_TYPES.index(punch_type)]):
+                    requeue.append(item)
+                else:
+                    failed.append(item)
+            if requeue:
+                self.batcher.requeue(url, requeue)
+                self.logger.debug(f"發送佇列已滿，合併打卡 {len(requeue)} 筆延後到下一個時間窗")
+            if failed:
+                self.logger.error(f"無法排入發送佇列: 合併打卡 {len(failed)} 筆, 錯誤: {e!r}")
+            for punch_type, profile, current_time, _ in failed:
+                self.record_punch_result(punch_type, current_time, None, profile=profile, failure="發送佇列已滿")
+
+    def record_label(self, profile_id):
+        """打卡記錄中標示設定檔 (預設設定檔不標示)"""
+        return "" if profile_id == self.profile_id else f"[{profile_id}] "
+
+    def record_punch_result(self, punch_type, current_time, response, latency=None, profile=None, failure=None,
+                            fanout=None):
+        """記錄自動打卡結果並更新 UI
+
+        latency 為 Webhook 往返秒數，failure 為未發送時記錄的原因，
+        fanout 為多目標發送時各目標的結果 (FanoutResult，成功與否依必要目標判斷)。
+        """
+        profile = profile or self.profile
+        profile_id = profile.profile_id
+        label = self.record_label(profile_id)
+        ok, status_code, detail = self.evaluate_result(response, failure, fanout)
+        fields = log_fields(event="result", profile_id=profile_id, punch_type=punch_type, source="auto",
+                            actual_time=current_time.isoformat(timespec='milliseconds'),
+                            status_code=response.status_code if response is not None else None,
+                            latency_ms=round(latency * 1000, 1) if latency is not None else None,
+                            targets=detail)
+        status_text = detail or f"狀態碼: {status_code}"
+        targets_text = f", 目標: {detail}" if detail else ""
+        # 檢查回應狀態
+        if ok:
+            record = f"{current_time.strftime('%H:%M:%S')} - {label}{punch_type}成功 ({status_text})"
+            if self.retry_failed_targets(punch_type, current_time, fanout, profile=profile):
+                record += " - 未送達的目標已排入重試"
+            self.punch_records.append(record)
+            self.ledger.record(profile_id, current_time.date(), punch_type, EVENT_SUCCESS,
+                               status_code=status_code, detail=detail)
+            self.count_outcome("auto", EVENT_SUCCESS, status_code)
+            self.logger.info(f"自動打卡成功: {label}{punch_type}, 狀態碼: {status_code}{targets_text}", extra=fields)
+        else:
+            record = f"{current_time.strftime('%H:%M:%S')} - {label}{punch_type}失敗 ({status_text})"
+            if self.retry_failed_targets(punch_type, current_time, fanout, status_code, profile=profile):
+                record += " - 已排入重試"
+            self.punch_records.append(record)
+            self.ledger.record(profile_id, current_time.date(), punch_type, EVENT_FAILED,
+                               status_code=status_code, detail=detail)
+            self.count_outcome("auto", EVENT_FAILED, status_code)
+            self.logger.error(f"自動打卡失敗: {label}{punch_type}, 狀態碼: {status_code}{targets_text}", extra=fields)
+
+        # 更新 UI (需要在主執行緒中執行)
+        self.notify_change(FIELD_RECORDS, FIELD_DELIVERY)
+
+    def record_punch_error(self, punch_type, error, profile=None):
+        """記錄自動打卡異常並更新 UI"""
+        profile_id = (profile or self.profile).profile_id
+        label = self.record_label(profile_id)
+        current_time = self.clock.now()
+        record = f"{current_time.strftime('%H:%M:%S')} - {label}{punch_type}錯誤: {error}"
+        self.punch_records.append(record)
+        self.ledger.record(profile_id, current_time.date(), punch_type, EVENT_ERROR, detail=str(error))
+        self.count_outcome("auto", EVENT_ERROR)
+        self.logger.error(f"自動打卡時發生異常: {label}{punch_type}, 錯誤: {error}",
+                          extra=log_fields(event="error", profile_id=profile_id, punch_type=punch_type,
+                                           source="auto", error=str(error)))
+        self.notify_change(FIELD_RECORDS)
+
+    def submit_delivery(self, punch_task, punch_type, source="auto", profile=None):
+        """將打卡工作排入發送池，回傳是否已排入
+
+        不等待佇列空位 (呼叫端為排程執行緒或介面執行緒)，佇列已滿時記錄為失敗並交給重試佇列。
+        """
+        try:
+            self.delivery_pool.submit_nowait(punch_task)
+            return True
+        except (queue.Full, RuntimeError) as e:
+            profile = profile or self.profile
+            current_time = self.clock.now()
+            record = (f"{current_time.strftime('%H:%M:%S')} - {self.record_label(profile.profile_id)}"
+                      f"{punch_type}失敗 (發送佇列已滿)")
+            if self.enqueue_retry(punch_type, current_time, source=source, error="發送佇列已滿", profile=profile):
+                record += " - 已排入重試"
+            self.punch_records.append(record)
+            self.ledger.record(profile.profile_id, current_time.date(), punch_type, EVENT_FAILED,
+                               source=source, detail="發送佇列已滿")
+            self.count_outcome(source, EVENT_FAILED)
+            self.logger.error(f"無法排入發送佇列: {punch_type}, 錯誤: {e!r}")
+            self.notify_change(FIELD_RECORDS, FIELD_DELIVERY)
+            return False
+
+    def get_retry_deadline(self, punch_type, current_time, plan=None):
+        """計算重試期限：不超過重試時間窗、當日結束，上班打卡也不晚於下班時間"""
+        deadline = current_time.timestamp() + self.retry_window_minutes * 60
+        end_of_day = datetime.combine(current_time.date() + timedelta(days=1), datetime.min.time()).timestamp()
+        deadline = min(deadline, end_of_day)
+
+        if plan is None:
+            plan = self.day_plan
+        if punch_type == PUNCH_TYPES[PUNCH_IN] and plan is not None and plan.day == current_time.date():
+            deadline = min(deadline, plan.targets[PUNCH_OUT])
+        return deadline
+
+    def enqueue_retry(self, punch_type, current_time, source="auto", status_code=None, error=None, profile=None,
+                      url=None, delay=0):
+        """將未送達的打卡排入重試佇列，回傳是否已排入
+
+        url 為 None 時使用設定檔的 Webhook，delay 為至少延後的秒數 (已向限流器預約的時間)。
+        """
+        profile = profile or self.profile
+        url = url or profile.webhook_url
+        if not url:
+            return False
+        if isinstance(status_code, int) and not is_retryable_status(status_code):
+            return False
+
+        try:
+            self.outbox.enqueue(profile.profile_id, current_time.date(), punch_type, url,
+                                {"text": punch_type}, self.get_retry_deadline(punch_type, current_time, profile.plan),
+                                source=source, error=error or f"狀態碼: {status_code}", delay=delay)
+            return True
+        except Exception as e:
+            self.logger.error(f"排入重試佇列失敗: {punch_type}, 錯誤: {e}")
+            return False
+
+    def evaluate_result(self, response, failure=None, fanout=None):
+        """判斷打卡結果，回傳 (是否成功, 主要 Webhook 的狀態碼或原因, 各目標狀態說明或 None)"""
+        if fanout is not None and fanout.multiple:
+            for result in fanout.results:
+                if not result.pending:
+                    self.target_outcomes.inc(result.target.name, EVENT_SUCCESS if result.ok else EVENT_FAILED)
+            return fanout.ok, fanout.primary.status, fanout.summary()
+        ok = response is not None and 200 <= response.status_code < 300
+        return ok, response.status_code if response is not None else failure or "無回應", None
+
+    def retry_failed_targets(self, punch_type, current_time, fanout, status_code=None, source="auto", profile=None):
+        """將未送達的目標排入重試佇列，回傳是否有排入
+
+        多目標發送時逐一排入失敗的目標 (打卡成功時也會補送非必要目標)，
+        單一目標時只有失敗才排入。
+        """
+        if fanout is None or not fanout.multiple:
+            if status_code is None:
+                return False
+            return self.enqueue_retry(punch_type, current_time, source=source, status_code=status_code,
+                                      profile=profile)
+        retried = False
+        for result in fanout.failed():
+            if self.enqueue_retry(punch_type, current_time, source=source, status_code=result.status,
+                                  profile=profile, url=result.target.url):
+                retried = True
+        return retried
+
+    def record_late_target(self, punch_type, current_time, result, source="auto", profile=None):
+        """逾時後才回報的目標 (在發送執行緒中呼叫)
+
+        請求已送出，逾時時未排入重試；送達時只記錄，失敗時才排入重試佇列，端點不會收到兩次。
+        """
+        profile = profile or self.profile
+        name = result.target.name
+        now = self.clock.now()
+        prefix = f"{now.strftime('%H:%M:%S')} - {self.record_label(profile.profile_id)}{punch_type} ({name})"
+        if result.ok:
+            record = f"{prefix}逾時後送達 (狀態碼: {result.status})"
+            self.ledger.record(profile.profile_id, current_time.date(), punch_type, EVENT_SUCCESS, source=source,
+                               status_code=result.status, detail=name)
+            self.target_outcomes.inc(name, EVENT_SUCCESS)
+            self.logger.info(f"發送目標逾時後送達: {punch_type} ({name}), 狀態碼: {result.status}")
+        else:
+            record = f"{prefix}逾時後失敗 ({result.status})"
+            if self.enqueue_retry(punch_type, current_time, source=source, status_code=result.status,
+                                  profile=profile, url=result.target.url):
+                record += " - 已排入重試"
+            self.target_outcomes.inc(name, EVENT_FAILED)
+            self.logger.error(f"發送目標逾時後失敗: {punch_type} ({name}), 原因: {result.status}")
+        self.punch_records.append(record)
+        self.notify_change(FIELD_RECORDS, FIELD_DELIVERY)
+
+    def compile_targets(self):
+        """解析 delivery_targets，建立依 URL 查詢名稱與逾時的索引"""
+        self.extra_targets = parse_targets(self.delivery_targets, self.webhook_timeout, self.logger)
+        self.targets_by_url = {target.url: target for target in self.extra_targets}
+
+    def targets_for(self, profile):
+        """設定檔的發送目標：設定檔的 Webhook 在前 (必要)，其後為 delivery_targets"""
+        return (DeliveryTarget(PRIMARY_TARGET, profile.webhook_url, self.webhook_timeout),) + self.extra_targets
+
+    def target_label(self, url):
+        """重試記錄中標示額外目標 (設定檔的 Webhook 不標示)"""
+        target = self.targets_by_url.get(url)
+        return f" ({target.name})" if target is not None else ""
+
+    def send_target(self, target, payload):
+        """發送到單一目標，回傳 (response, 失敗原因)，不拋出例外 (在發送執行緒中呼叫)"""
+        if not target.url:
+            self.logger.error("發送 Webhook 失敗: Webhook URL 未設定")
+            return None, None
+        try:
+            return self.post_webhook(target.url, payload, target.timeout), None
+        except CircuitOpenError:
+            # 端點故障中：不等待逾時，直接交給重試佇列
+            return None, "斷路器開啟"
+        except Exception as e:
+            self.logger.error(f"發送 Webhook 失敗 ({target.name}): {e}")
+            return None, None
+
+    def on_retry_result(self, entry, status, status_code, error):
+        """重試佇列回報結果 (在重試執行緒中呼叫)"""
+        if status == STATUS_PENDING:
+            return
+
+        current_time = self.clock.now()
+        label = self.record_label(entry.profile_id)
+        target = self.target_label(entry.url)
+        if status == STATUS_DELIVERED:
+            record = (f"{current_time.strftime('%H:%M:%S')} - {label}{entry.punch_type}{target}重試成功 "
+                      f"(第 {entry.attempts} 次, 狀態碼: {status_code})")
+            self.ledger.record(entry.profile_id, entry.day, entry.punch_type, EVENT_SUCCESS,
+                               source="retry", status_code=status_code, detail=target.strip(" ()") or None)
+            self.count_outcome("retry", EVENT_SUCCESS, status_code)
+        else:
+            record = f"{current_time.strftime('%H:%M:%S')} - {label}{entry.punch_type}{target}放棄重試 ({error})"
+            self.ledger.record(entry.profile_id, entry.day, entry.punch_type, EVENT_DEAD_LETTER,
+                               source="retry", status_code=status_code, detail=f"{error}{target}")
+            self.count_outcome("retry", EVENT_DEAD_LETTER, status_code)
+        self.punch_records.append(record)
+        self.notify_change(FIELD_RECORDS, FIELD_DELIVERY)
+
+    def post_webhook(self, url, payload, timeout=None):
+        """以共用連線池發送 Webhook (重試佇列使用)，斷路器開啟時拋出 CircuitOpenError
+
+        timeout 為 None 時使用該目標設定的逾時。
+        """
+        if not self.breakers.allow(url):
+            raise CircuitOpenError(url)
+        if timeout is None:
+            target = self.targets_by_url.get(url)
+            timeout = target.timeout if target is not None else self.webhook_timeout
+        started = time.perf_counter()
+        try:
+            response = self.webhook_client.post(url, payload, timeout=timeout)
+        except Exception:
+            self.breakers.record(url, None)
+            raise
+        finally:
+            self.webhook_latency.observe(time.perf_counter() - started, "thread")
+        self.breakers.record(url, response)
+        self.observe_throttle(url, response)
+        return response
+
+    def retry_delay(self, url):
+        """重試佇列發送前需延後的秒數：斷路器開啟中等到半開，否則等到限流器有權杖 (不預約權杖)"""
+        delay = self.breakers.retry_delay(url)
+        if delay > 0:
+            return delay
+        return self.rate_limiter.delay(url)
+
+    def on_breaker_change(self, url, previous, state, breaker):
+        """斷路器狀態變更 (在發送執行緒中呼叫)"""
+        host = host_key(url)
+        self.breaker_transitions.inc(state)
+        fields = log_fields(event="breaker", host=host, state=state, previous=previous, failures=breaker.failures)
+        if state == STATE_OPEN:
+            reason = "試探失敗" if previous == STATE_HALF_OPEN else f"連續失敗 {breaker.failures} 次"
+            self.logger.warning(f"Webhook 斷路器開啟: {host} ({reason})，"
+                                f"{format_delay(self.breakers.reset_seconds)}後試探，期間的打卡改由重試佇列補送",
+                                extra=fields)
+        elif state == STATE_HALF_OPEN:
+            self.logger.info(f"Webhook 斷路器半開: {host}，送出試探請求", extra=fields)
+        else:
+            self.logger.info(f"Webhook 已恢復，斷路器關閉: {host}", extra=fields)
+        self.notify_change(FIELD_DELIVERY)
+
+    def observe_throttle(self, url, response):
+        """端點回應 429/503 時依 Retry-After 暫停該主機的發送"""
+        pause = self.rate_limiter.observe(url, response)
+        if pause:
+            self.logger.warning(f"Webhook 要求降速 (狀態碼: {response.status_code})，"
+                                f"暫停發送 {format_delay(pause)}: {host_key(url)}")
+
+    def setup_logging(self):
+        """設定日誌系統 (呼叫端只寫入佇列，檔案與主控台輸出由背景執行緒處理)"""
+        # 設定主要 logger
+        self.logger = logging.getLogger('PunchCardApp')
+        self.logger.setLevel(logging.DEBUG)
+
+        # 設定檔載入前先以文字格式啟動，載入後再套用 log_format
+        self.log_queue = QueueLogging(self.logger)
+        self.log_queue.start()
+
+    def load_config(self):
+        """載入設定檔"""
+        try:
+            if os.path.exists(self.config_file):
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                    self.webhook_url = config.get('webhook_url', '')
+                    self.webhook_timeout = config.get('webhook_timeout', DEFAULT_WEBHOOK_TIMEOUT)
+
+                    # 額外的發送目標 (每筆打卡同時送到 webhook_url 與這些目標)
+                    self.delivery_targets = config.get('delivery_targets', [])
+
+                    # 原有設定
+                    self.punch_in_time = config.get('punch_in_time', '09:00')
+                    self.punch_out_time = config.get('punch_out_time', '18:00')
+                    self.punch_in_start = config.get('punch_in_start', '09:00')
+                    self.punch_in_end = config.get('punch_in_end', '09:20')
+                    self.punch_out_start = config.get('punch_out_start', '18:00')
+                    self.punch_out_end = config.get('punch_out_end', '18:20')
+                    self.punch_in_mode = config.get('punch_in_mode', 'exact')
+                    self.punch_out_mode = config.get('punch_out_mode', 'exact')
+
+                    # 新增：週末設定
+                    self.weekend_mode = config.get('weekend_mode', 'small')  # 'big' 或 'small'
+                    self.weekend_start_date = config.get('weekend_start_date', None)  # 週末循環起始日期
+
+                    # 發送池設定
+                    self.delivery_workers = config.get('delivery_workers', DEFAULT_DELIVERY_WORKERS)
+                    self.delivery_queue_size = config.get('delivery_queue_size', DEFAULT_DELIVERY_QUEUE_SIZE)
+                    self.http_pool_maxsize = config.get('http_pool_maxsize', DEFAULT_HTTP_POOL_MAXSIZE)
+                    self.delivery_backend = config.get('delivery_backend', 'thread')  # 'thread' 或 'asyncio'
+                    self.async_concurrency = config.get('async_concurrency', DEFAULT_ASYNC_CONCURRENCY)
+
+                    # 依 Webhook 主機限流 (每秒請求數，0 表示不限制)
+                    self.rate_limit_per_second = config.get('rate_limit_per_second', DEFAULT_RATE_LIMIT_PER_SECOND)
+                    self.rate_limit_burst = config.get('rate_limit_burst', DEFAULT_RATE_LIMIT_BURST)
+
+                    # 斷路器 (連續失敗次數，0 表示停用)
+                    self.breaker_failure_threshold = config.get('breaker_failure_threshold',
+                                                                DEFAULT_BREAKER_FAILURE_THRESHOLD)
+                    self.breaker_reset_seconds = config.get('breaker_reset_seconds', DEFAULT_BREAKER_RESET_SECONDS)
+
+                    # 合併發送 (毫秒，0 表示不合併)
+                    self.batch_window_ms = config.get('batch_window_ms', DEFAULT_BATCH_WINDOW_MS)
+                    self.batch_max_size = config.get('batch_max_size', DEFAULT_BATCH_MAX_SIZE)
+
+                    # 打卡帳本
+                    self.ledger_file = config.get('ledger_file', DEFAULT_LEDGER_FILE)
+
+                    # 重試佇列
+                    self.retry_workers = config.get('retry_workers', DEFAULT_RETRY_WORKERS)
+                    self.retry_base_delay = config.get('retry_base_delay', DEFAULT_RETRY_BASE_DELAY)
+                    self.retry_max_delay = config.get('retry_max_delay', DEFAULT_RETRY_MAX_DELAY)
+                    self.retry_window_minutes = config.get('retry_window_minutes', DEFAULT_RETRY_WINDOW_MINUTES)
+
+                    # 日誌檔案格式 ('text' 或 'json')
+                    self.log_format = config.get('log_format', DEFAULT_LOG_FORMAT)
+
+                    # 指標端點 (0 表示不開放)
+                    self.metrics_port = config.get('metrics_port', DEFAULT_METRICS_PORT)
+
+                    # 隨機打卡時間的種子 (同一設定檔同一天的時間固定)
+                    self.plan_seed = config.get('plan_seed', DEFAULT_PLAN_SEED)
+
+                    # 錯過打卡時間的補救策略
+                    self.catch_up_policy = config.get('catch_up_policy', DEFAULT_CATCH_UP_POLICY)
+                    self.catch_up_max_minutes = config.get('catch_up_max_minutes', DEFAULT_CATCH_UP_MAX_MINUTES)
+
+                    # 假日行事曆 (ICS/CSV，後面的檔案優先)
+                    self.holiday_files = config.get('holiday_files', list(DEFAULT_HOLIDAY_FILES))
+
+                    # 多設定檔清單 (空字串表示只使用本設定檔)
+                    self.profiles_file = config.get('profiles_file', DEFAULT_PROFILES_FILE)
+                    self.profiles_reload_seconds = config.get('profiles_reload_seconds',
+                                                              DEFAULT_PROFILES_RELOAD_SECONDS)
+
+                    self.logger.info(f"設定檔載入成功: {self.config_file}")
+            else:
+                self.set_default_config()
+                self.logger.info("使用預設設定")
+        except Exception as e:
+            self.logger.error(f"載入設定失敗: {e}")
+            self.set_default_config()
+
+    def set_default_config(self):
+        """設定預設值"""
+        self.webhook_url = ''
+        self.webhook_timeout = DEFAULT_WEBHOOK_TIMEOUT
+        self.delivery_targets = []
+        self.punch_in_time = '09:00'
+        self.punch_out_time = '18:30'
+        self.punch_in_start = '09:00'
+        self.punch_in_end = '09:10'
+        self.punch_out_start = '18:30'
+        self.punch_out_end = '18:35'
+        self.punch_in_mode = 'exact'
+        self.punch_out_mode = 'exact'
+
+        # 新增：週末預設設定
+        self.weekend_mode = 'small'  # 預設為小周末
+        self.weekend_start_date = None
+
+        # 發送池預設設定
+        self.delivery_workers = DEFAULT_DELIVERY_WORKERS
+        self.delivery_queue_size = DEFAULT_DELIVERY_QUEUE_SIZE
+        self.http_pool_maxsize = DEFAULT_HTTP_POOL_MAXSIZE
+        self.delivery_backend = 'thread'
+        self.async_concurrency = DEFAULT_ASYNC_CONCURRENCY
+
+        # 限流預設設定
+        self.rate_limit_per_second = DEFAULT_RATE_LIMIT_PER_SECOND
+        self.rate_limit_burst = DEFAULT_RATE_LIMIT_BURST
+
+        # 斷路器預設設定
+        self.breaker_failure_threshold = DEFAULT_BREAKER_FAILURE_THRESHOLD
+        self.breaker_reset_seconds = DEFAULT_BREAKER_RESET_SECONDS
+
+        # 合併發送預設設定
+        self.batch_window_ms = DEFAULT_BATCH_WINDOW_MS
+        self.batch_max_size = DEFAULT_BATCH_MAX_SIZE
+
+        # 打卡帳本預設設定
+        self.ledger_file = DEFAULT_LEDGER_FILE
+
+        # 重試佇列預設設定
+        self.retry_workers = DEFAULT_RETRY_WORKERS
+        self.retry_base_delay = DEFAULT_RETRY_BASE_DELAY
+        self.retry_max_delay = DEFAULT_RETRY_MAX_DELAY
+        self.retry_window_minutes = DEFAULT_RETRY_WINDOW_MINUTES
+
+        # 日誌預設設定
+        self.log_format = DEFAULT_LOG_FORMAT
+
+        # 指標預設設定
+        self.metrics_port = DEFAULT_METRICS_PORT
+
+        # 隨機打卡時間種子預設設定
+        self.plan_seed = DEFAULT_PLAN_SEED
+
+        # 補救策略預設設定
+        self.catch_up_policy = DEFAULT_CATCH_UP_POLICY
+        self.catch_up_max_minutes = DEFAULT_CATCH_UP_MAX_MINUTES
+
+        # 假日行事曆預設設定
+        self.holiday_files = list(DEFAULT_HOLIDAY_FILES)
+
+        # 多設定檔預設設定
+        self.profiles_file = DEFAULT_PROFILES_FILE
+        self.profiles_reload_seconds = DEFAULT_PROFILES_RELOAD_SECONDS
+
+    def save_config(self):
+        """儲存設定檔"""
+        config = {
+            'webhook_url': self.webhook_url,
+            'webhook_timeout': self.webhook_timeout,
+            'delivery_targets': self.delivery_targets,
+            'punch_in_time': self.punch_in_time,
+            'punch_out_time': self.punch_out_time,
+            'punch_in_start': self.punch_in_start,
+            'punch_in_end': self.punch_in_end,
+            'punch_out_start': self.punch_out_start,
+            'punch_out_end': self.punch_out_end,
+            'punch_in_mode': self.punch_in_mode,
+            'punch_out_mode': self.punch_out_mode,
+            # 新增：週末設定
+            'weekend_mode': self.weekend_mode,
+            'weekend_start_date': self.weekend_start_date,
+            # 發送池設定
+            'delivery_workers': self.delivery_workers,
+            'delivery_queue_size': self.delivery_queue_size,
+            'http_pool_maxsize': self.http_pool_maxsize,
+            'delivery_backend': self.delivery_backend,
+            'async_concurrency': self.async_concurrency,
+            # 依 Webhook 主機限流
+            'rate_limit_per_second': self.rate_limit_per_second,
+            'rate_limit_burst': self.rate_limit_burst,
+            # 斷路器
+            'breaker_failure_threshold': self.breaker_failure_threshold,
+            'breaker_reset_seconds': self.breaker_reset_seconds,
+            # 合併發送
+            'batch_window_ms': self.batch_window_ms,
+            'batch_max_size': self.batch_max_size,
+            # 打卡帳本
+            'ledger_file': self.ledger_file,
+            # 重試佇列
+            'retry_workers': self.retry_workers,
+            'retry_base_delay': self.retry_base_delay,
+            'retry_max_delay': self.retry_max_delay,
+            'retry_window_minutes': self.retry_window_minutes,
+            # 日誌
+            'log_format': self.log_format,
+            # 指標端點
+            'metrics_port': self.metrics_port,
+            # 隨機打卡時間的種子
+            'plan_seed': self.plan_seed,
+            # 錯過打卡時間的補救策略
+            'catch_up_policy': self.catch_up_policy,
+            'catch_up_max_minutes': self.catch_up_max_minutes,
+            # 假日行事曆
+            'holiday_files': self.holiday_files,
+            # 多設定檔清單
+            'profiles_file': self.profiles_file,
+            'profiles_reload_seconds': self.profiles_reload_seconds
+        }
+        try:
+            with open(self.config_file, 'w', encoding='utf-8') as f:
+                json.dump(config, f, ensure_ascii=False, indent=2)
+            self.logger.info("設定檔儲存成功")
+            return True
+        except Exception as e:
+            self.logger.error(f"儲存設定失敗: {e}")
+            return False
+
+    def get_rest_calendar(self, profile=None):
+        """取得休息日索引，週末設定變更時自動重建"""
+        if profile is not None and profile is not self.profile:
+            return self.get_profile_calendar(profile)
+
+        if not self.weekend_start_date:
+            # 如果沒有設定起始日期，使用當前日期作為起始點
+            self.weekend_start_date = self.clock.now().strftime('%Y-%m-%d')
+            self.save_config()
+
+        calendar = self.rest_calendar
+        if calendar is None or calendar.key != (self.weekend_mode, self.weekend_start_date):
+            calendar = RestDayCalendar(self.weekend_mode, self.weekend_start_date)
+            self.rest_calendar = calendar
+            self.logger.info(
+                f"重建休息日索引: {calendar.first_date} ~ {calendar.last_date} ({len(calendar)} 天)")
+        return calendar
+
+    def get_profile_calendar(self, profile):
+        """其他設定檔的休息日索引，週末設定相同的設定檔共用同一份"""
+        start_date = profile.weekend_start_date or self.get_rest_calendar().key[1]
+        key = (profile.weekend_mode, start_date)
+        calendar = self.rest_calendars.get(key)
+        if calendar is None:
+            calendar = self.rest_calendars.setdefault(key, RestDayCalendar(*key))
+        return calendar
+
+    def load_holidays(self):
+        """載入假日行事曆並建立區間索引 (未設定 holiday_files 時只依大小周判斷)"""
+        paths = self.holiday_files
+        if isinstance(paths, str):
+            paths = [paths]
+        if not paths:
+            self.holidays = None
+            return
+        self.holidays = HolidayIndex.from_files(paths, logger=self.logger)
+
+    def get_current_weekend_type(self, date=None):
+        """取得當前週末類型"""
+        if date is None:
+            date = self.clock.today()
+        try:
+            return self.get_rest_calendar().weekend_type(date)
+        except Exception as e:
+            self.logger.error(f"計算週末類型失敗: {e}")
+            return 'small'  # 預設返回小周末
+
+    def is_rest_day(self, date=None, profile=None):
+        """判斷是否為休息日"""
+        if date is None:
+            date = self.clock.today()
+
+        try:
+            # 假日行事曆 (國定假日、補班、公司休假) 優先於大小周週期
+            if self.holidays is not None:
+                entry = self.holidays.lookup(date)
+                if entry is not None:
+                    return entry.is_rest, entry.reason if entry.is_rest else ""
+            return self.get_rest_calendar(profile).lookup(date)
+        except Exception as e:
+            self.logger.error(f"計算休息日失敗: {e}")
+            # 星期一永遠是休息日，其他日子視為小周末
+            if date.weekday() == 0:
+                return True, REST_REASONS[REASON_MONDAY]
+            return False, ""
+
+    def get_weekend_status_text(self):
+        """取得週末狀態文字"""
+        current_type = self.get_current_weekend_type()
+        if current_type == 'big':
+            return "目前為大週末週期（週一、二休息）"
+        else:
+            return "目前為小週末週期（週一休息）"
+
+    def compile_punch_specs(self):
+        """解析打卡時間設定 (只在載入或儲存設定時執行一次)"""
+        try:
+            self.punch_specs = (
+                intern_spec(self.punch_in_mode, self.punch_in_time, self.punch_in_start, self.punch_in_end),
+                intern_spec(self.punch_out_mode, self.punch_out_time, self.punch_out_start, self.punch_out_end),
+            )
+        except ValueError as e:
+            self.logger.error(f"打卡時間格式錯誤: {e}")
+
+        # 同步預設設定檔
+        profile = self.profile
+        profile.webhook_url = self.webhook_url
+        profile.specs = self.punch_specs
+        profile.weekend_mode = self.weekend_mode
+        profile.weekend_start_date = self.weekend_start_date
+
+    def generate_random_times(self, profile=None):
+        """產生隨機打卡時間並編譯今日打卡計畫"""
+        profile = profile or self.profile
+        if profile.specs is None:
+            return
+
+        current_date = self.clock.today()
+
+        try:
+            previous = profile.plan
+            seed = profile_seed(profile.profile_id, self.plan_seed)
+            plan = profile.plan = DayPlan.compile(current_date, profile.specs, previous=previous, seed=seed)
+
+            # 新的一天 (或程式重新啟動) 時從帳本還原已執行的打卡
+            if previous is None or previous.day != current_date:
+                self.restore_executed_state(plan, profile.profile_id)
+            # 設定檔眾多時只在除錯日誌中記錄其他設定檔的計畫
+            log = self.logger.info if profile is self.profile else self.logger.debug
+            log(f"產生今日打卡計畫 - {self.record_label(profile.profile_id)}"
+                f"上班: {plan.target_datetime(PUNCH_IN).strftime('%H:%M:%S')}, "
+                f"下班: {plan.target_datetime(PUNCH_OUT).strftime('%H:%M:%S')}")
+
+        except Exception as e:
+            self.logger.error(f"產生隨機時間失敗: {e}")
+
+    def plan_ahead(self, days=30, first_day=None):
+        """預先計算所有設定檔未來 days 天的打卡時間 (與每日實際產生的時間相同，供預覽與稽核)
+
+        回傳 punch_planner.PlanMatrix；休息日仍會列出時間，是否打卡另由 is_rest_day 判斷。
+        """
+        with self.state_lock:
+            profiles = [profile for profile in self.profiles.values() if profile.specs is not None]
+        return plan_range([profile.profile_id for profile in profiles], [profile.specs for profile in profiles],
+                          first_day or self.clock.today(), days, self.plan_seed)
+
+    def restore_executed_state(self, plan, profile_id=None):
+        """依帳本中的觸發記錄還原今日打卡執行狀態"""
+        profile_id = profile_id or self.profile_id
+        try:
+            events = self.ledger.punch_events(profile_id, plan.day, (EVENT_FIRED, EVENT_MISSED))
+        except Exception as e:
+            self.logger.error(f"讀取打卡帳本失敗: {e}")
+            return
+
+        label = self.record_label(profile_id)
+        for index, punch_type in enumerate(PUNCH_TYPES):
+            if punch_type in events[EVENT_FIRED]:
+                plan.mark_executed(index)
+                self.logger.info(f"從打卡帳本還原執行狀態: {label}{punch_type}已於今日觸發")
+            elif punch_type in events[EVENT_MISSED]:
+                plan.mark_missed(index)
+                self.logger.info(f"從打卡帳本還原執行狀態: {label}{punch_type}今日已錯過")
+
+    def profile_defaults(self):
+        """設定檔清單中未指定的欄位沿用本設定檔的值"""
+        return {key: getattr(self, key) for key in PROFILE_FIELDS}
+
+    def add_profile(self, profile):
+        """新增或更新設定檔 (可傳入 PunchProfile 或 dict)，不需重新啟動"""
+        if not isinstance(profile, PunchProfile):
+            profile = PunchProfile.from_dict(profile, self.profile_defaults())
+        if profile.profile_id == self.profile_id:
+            raise ValueError(f"設定檔代號 {self.profile_id} 保留給 punch_config.json")
+
+        with self.state_lock:
+            existing = self.profiles.get(profile.profile_id)
+            if existing is not None:
+                if existing.same_settings(profile):
+                    return existing
+                # 同一天內保留已執行狀態
+                profile.plan = existing.plan
+                self.generate_random_times(profile)
+            self.profiles[profile.profile_id] = profile
+            if self.scheduler.running:
+                self.check_punch_time(profile=profile)
+
+        self.logger.debug(f"{'更新' if existing is not None else '新增'}設定檔: {profile.profile_id}")
+        return profile
+
+    def remove_profile(self, profile_id):
+        """移除設定檔並取消其排程，回傳是否已移除"""
+        if profile_id == self.profile_id:
+            raise ValueError("無法移除預設設定檔")
+        with self.state_lock:
+            profile = self.profiles.pop(profile_id, None)
+            self.scheduler.cancel_profile(profile_id)
+        if profile is None:
+            return False
+        self.logger.debug(f"移除設定檔: {profile_id}")
+        return True
+
+    def apply_profiles(self, entries):
+        """套用設定檔清單：新增、更新並移除清單中已不存在的設定檔"""
+        defaults = self.profile_defaults()
+        loaded = {}
+        for data in entries:
+            try:
+                profile = PunchProfile.from_dict(data, defaults)
+            except (ValueError, TypeError, AttributeError) as e:
+                self.logger.error(f"設定檔格式錯誤，已略過: {data!r}: {e}")
+                continue
+            if profile.profile_id == self.profile_id:
+                self.logger.warning(f"設定檔代號 {self.profile_id} 保留給 punch_config.json，已略過")
+                continue
+            loaded[profile.profile_id] = profile
+
+        with self.state_lock:
+            removed = [pid for pid in self.profiles if pid != self.profile_id and pid not in loaded]
+            for profile_id in removed:
+                self.remove_profile(profile_id)
+            added = sum(1 for profile_id in loaded if profile_id not in self.profiles)
+            for profile in loaded.values():
+                self.add_profile(profile)
+
+        self.logger.info(f"已載入設定檔清單: {len(loaded)} 個設定檔 (新增 {added}、移除 {len(removed)})")
+        self.notify_change(FIELD_DELIVERY)
+
+    def send_webhook(self, message, url=None):
+        """發送 Webhook (url 為 None 時使用本設定檔的 Webhook)，失敗時回傳 None，斷路器開啟時拋出 CircuitOpenError"""
+        if url is None:
+            url = self.webhook_url
+        try:
+            if not url:
+                raise Exception("Webhook URL 未設定")
+
+            payload = {"text": message}
+            response = self.post_webhook(url, payload)
+            return response
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            self.logger.error(f"發送 Webhook 失敗: {e}")
+            return None
+
+    def replan(self, all_profiles=False):
+        """重新編譯今日打卡計畫並重新排程 (all_profiles 為 True 時重新排程所有設定檔，例如假日行事曆變更後)"""
+        self.compile_punch_specs()
+        self.generate_random_times()
+        self.check_punch_time(profile=None if all_profiles else self.profile)
+        self.notify_change(FIELD_SCHEDULE, FIELD_DELIVERY)
+
+    def set_punch_mode(self, punch_type, mode):
+        """變更上班或下班的打卡模式"""
+        if punch_type == PUNCH_TYPES[PUNCH_IN]:
+            self.punch_in_mode = mode
+        else:
+            self.punch_out_mode = mode
+        self.replan()
+
+    def update_settings(self, settings):
+        """驗證後套用並儲存設定 (時間格式錯誤時拋出 ValueError，不會套用任何設定)"""
+        # 先以套用後的值驗證，全部通過才修改目前設定
+        self.validate_time_format(settings)
+
+        previous = {key: getattr(self, key) for key in settings}
+        for key, value in settings.items():
+            setattr(self, key, value)
+
+        # 儲存設定 (失敗時還原，執行中的設定與設定檔保持一致)
+        if not self.save_config():
+            for key, value in previous.items():
+                setattr(self, key, value)
+            raise IOError("寫入設定檔失敗")
+
+        # 假日行事曆影響所有設定檔的休息日
+        holidays_changed = 'holiday_files' in settings
+        if holidays_changed:
+            self.load_holidays()
+
+        # 重新編譯今日打卡計畫並重新排程
+        self.replan(all_profiles=holidays_changed)
+        self.logger.info("使用者設定已儲存")
+
+    def set_big_weekend_start(self):
+        """設定大週末起始點"""
+        self.weekend_mode = 'big'
+        self.weekend_start_date = self.clock.now().strftime('%Y-%m-%d')
+        self.save_config()
+        self.check_punch_time(profile=self.profile)
+        self.notify_change(FIELD_SCHEDULE, FIELD_WEEKEND)
+        self.logger.info(f"設定大週末起始點: {self.weekend_start_date}")
+
+    def reset_weekend_settings(self):
+        """重置週末設置"""
+        self.weekend_mode = 'small'
+        self.weekend_start_date = self.clock.now().strftime('%Y-%m-%d')
+        self.save_config()
+        self.check_punch_time(profile=self.profile)
+        self.notify_change(FIELD_SCHEDULE, FIELD_WEEKEND)
+        self.logger.info("重置週末設置為小週末")
+
+    def set_auto_punch(self, enabled):
+        """切換自動打卡狀態
+
+        停用期間到期的事件已被取出而不會再觸發，重新啟用時需重新排程今日尚未執行的打卡
+        (已超過容許範圍的不補打)。
+        """
+        was_enabled = self.auto_punch_enabled
+        self.auto_punch_enabled = enabled
+        if enabled and not was_enabled:
+            self.check_punch_time()
+        self.notify_change(FIELD_SCHEDULE)
+        status = "啟用" if enabled else "停用"
+        self.logger.info(f"自動打卡已{status}")
+        return status
+
+    def get_status_text(self):
+        """組合完整的狀態面板文字 (介面改為依變更事件分別更新各欄位)"""
+        return self.get_clock_text() + "\n" + self.get_schedule_text() + self.get_delivery_text()
+
+    def get_clock_text(self):
+        """目前時間 (介面以獨立的計時器每秒更新)"""
+        return f"目前時間: {self.clock.now().strftime('%Y-%m-%d %H:%M:%S')}"
+
+    def get_schedule_text(self):
+        """休息日、自動打卡與今日計畫 (FIELD_SCHEDULE)"""
+        # 檢查是否為休息日
+        is_rest, rest_reason = self.is_rest_day()
+
+        if is_rest:
+            status_text = f"狀態: 休息日 ({rest_reason})\n"
+            status_text += "自動打卡: 暫停\n"
+        else:
+            status_text = f"自動打卡: {'啟用' if self.auto_punch_enabled else '停用'}\n"
+
+            # 顯示今日打卡計畫
+            plan = self.day_plan
+            if plan is not None:
+                status_text += f"今日計畫: {plan.day}\n"
+                status_text += plan.describe(PUNCH_IN) + "\n"
+                status_text += plan.describe(PUNCH_OUT) + "\n"
+            else:
+                status_text += "今日計畫: 尚未產生\n"
+        return status_text
+
+    def get_delivery_text(self):
+        """重試佇列、限流、斷路器與設定檔數 (FIELD_DELIVERY)，沒有需要顯示的項目時為空字串
+
+        限流與斷路器的倒數秒數會隨時間變化，delivery_countdown_active() 為 True 時介面每秒重新取得。
+        """
+        status_text = ""
+
+        # 重試佇列狀態
+        pending = self.outbox.pending_count()
+        if pending:
+            status_text += f"待重試打卡: {pending} 筆\n"
+
+        # 限流延後中的端點
+        for host, backlog, throttled in self.rate_limiter.status():
+            if backlog > 0:
+                status_text += f"發送限流: {host} 延後 {format_delay(backlog)} (累計 {throttled} 筆)\n"
+
+        # 斷路器未關閉的端點
+        for host, state, failures, retry_in, rejected in self.breakers.status():
+            if state == STATE_OPEN:
+                detail = f"連續失敗 {failures} 次，{format_delay(retry_in)}後試探"
+            else:
+                detail = "試探中"
+            status_text += f"Webhook 斷路器: {host} {STATE_LABELS[state]} ({detail}，已擋下 {rejected} 筆)\n"
+
+        # 車隊模式
+        if len(self.profiles) > 1:
+            status_text += f"設定檔: {len(self.profiles)} 個 (排程中事件 {len(self.scheduler)} 筆)\n"
+
+        return status_text
+
+    def delivery_countdown_active(self):
+        """發送狀態中是否有會隨時間變化的倒數 (限流延後或斷路器未關閉)，不查詢資料庫"""
+        if self.breakers.open_count():
+            return True
+        return any(backlog > 0 for _, backlog, _ in self.rate_limiter.status())
+
+    def manual_punch(self, punch_type, on_done=None):
+        """手動打卡，完成後呼叫 on_done(ok, title, message) (在工作執行緒中呼叫)"""
+
+        def done(ok, title, message):
+            if on_done is not None:
+                on_done(ok, title, message)
+
+        def punch_task():
+            try:
+                current_time = self.clock.now()
+                self.logger.info(f"開始執行手動打卡: {punch_type}")
+
+                result = self.fanout.send_all(
+                    self.targets_for(self.profile), {"text": punch_type},
+                    on_late=lambda late: self.record_late_target(punch_type, current_time, late, source="manual"))
+                response, failure = result.response, result.failure
+                ok, status_code, detail = self.evaluate_result(response, failure, result)
+                fields = log_fields(event="result", profile_id=self.profile_id, punch_type=punch_type,
+                                    source="manual", actual_time=current_time.isoformat(timespec='milliseconds'),
+                                    status_code=response.status_code if response is not None else None,
+                                    latency_ms=round(result.latency * 1000, 1), targets=detail)
+                status_text = detail or f"狀態碼: {status_code}"
+
+                if ok:
+                    record = f"{current_time.strftime('%H:%M:%S')} - {punch_type}成功 (手動, {status_text})"
+                    if self.retry_failed_targets(punch_type, current_time, result, source="manual"):
+                        record += " - 未送達的目標已排入重試"
+                    self.punch_records.append(record)
+                    self.ledger.record(self.profile_id, current_time.date(), punch_type, EVENT_SUCCESS,
+                                       source="manual", status_code=status_code, detail=detail)
+                    self.count_outcome("manual", EVENT_SUCCESS, status_code)
+                    self.logger.info(f"手動打卡成功: {punch_type}", extra=fields)
+                    done(True, "成功", f"{punch_type}成功" + (f"\n{detail}" if detail else ""))
+                else:
+                    record = f"{current_time.strftime('%H:%M:%S')} - {punch_type}失敗 (手動, {status_text})"
+                    if self.retry_failed_targets(punch_type, current_time, result, status_code, source="manual"):
+                        record += " - 已排入重試"
+                    self.punch_records.append(record)
+                    self.ledger.record(self.profile_id, current_time.date(), punch_type, EVENT_FAILED,
+                                       source="manual", status_code=status_code, detail=detail)
+                    self.count_outcome("manual", EVENT_FAILED, status_code)
+                    self.logger.error(f"手動打卡失敗: {punch_type}", extra=fields)
+                    reason = detail or failure
+                    done(False, "失敗", f"{punch_type}失敗" + (f" ({reason}，稍後自動重試)" if reason else ""))
+
+                self.notify_change(FIELD_RECORDS, FIELD_DELIVERY)
+
+            except Exception as e:
+                current_time = self.clock.now()
+                record = f"{current_time.strftime('%H:%M:%S')} - {punch_type}錯誤 (手動): {e}"
+                self.punch_records.append(record)
+                self.ledger.record(self.profile_id, current_time.date(), punch_type, EVENT_ERROR,
+                                   source="manual", detail=str(e))
+                self.count_outcome("manual", EVENT_ERROR)
+                self.logger.error(f"手動打卡時發生異常: {e}")
+                done(False, "錯誤", f"打卡時發生錯誤: {e}")
+                self.notify_change(FIELD_RECORDS, FIELD_DELIVERY)
+
+        self.submit_delivery(punch_task, punch_type, source="manual")
+
+    def validate_time_format(self, settings=None):
+        """驗證時間格式與隨機區間 (settings 為尚未套用的設定，未包含的欄位以目前的值驗證)"""
+        settings = settings or {}
+
+        def value(key):
+            return settings.get(key, getattr(self, key))
+
+        time_fields = [
+            ('punch_in_time', "上班精確時間"),
+            ('punch_out_time', "下班精確時間"),
+            ('punch_in_start', "上班隨機開始時間"),
+            ('punch_in_end', "上班隨機結束時間"),
+            ('punch_out_start', "下班隨機開始時間"),
+            ('punch_out_end', "下班隨機結束時間")
+        ]
+
+        for key, field_name in time_fields:
+            try:
+                datetime.strptime(value(key), '%H:%M')
+            except ValueError:
+                raise ValueError(f"{field_name} 格式錯誤，請使用 HH:MM 格式")
+
+        # 隨機區間的結束時間不可早於開始時間
+        for prefix in ('punch_in', 'punch_out'):
+            intern_spec(value(f'{prefix}_mode'), value(f'{prefix}_time'), value(f'{prefix}_start'),
+                        value(f'{prefix}_end'))
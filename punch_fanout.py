@@ -0,0 +1,254 @@
+# punch_fanout.py - 多目標發送：每筆打卡同時送到打卡系統、聊天室與稽核端點，並依目標彙總結果
+import concurrent.futures
+import logging
+import threading
+import time
+
+from punch_ratelimit import host_key
+
+# 單一請求的預設逾時秒數
+DEFAULT_WEBHOOK_TIMEOUT = 10
+# 設定檔 webhook_url 對應的主要目標名稱
+PRIMARY_TARGET = "webhook"
+# 等待其他目標時，在逾時之外多等的秒數 (連線建立與排隊)
+FANOUT_GRACE_SECONDS = 1
+
+
+class DeliveryTarget:
+    """單一發送目標
+
+    required 為 True 的目標全部成功才算打卡成功 (主要目標一律為必要)，
+    非必要目標失敗只會記錄並排入重試，不影響打卡結果。
+    """
+    __slots__ = ('name', 'url', 'timeout', 'required')
+
+    def __init__(self, name, url, timeout=DEFAULT_WEBHOOK_TIMEOUT, required=True):
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+        self.required = required
+
+    @classmethod
+    def from_dict(cls, data, default_timeout=DEFAULT_WEBHOOK_TIMEOUT):
+        """由 delivery_targets 中的一筆資料建立 (缺少 url 時拋出 ValueError)"""
+        url = data.get('url')
+        if not url:
+            raise ValueError("發送目標缺少 url")
+        name = data.get('name') or host_key(url)
+        timeout = data.get('timeout') or default_timeout
+        if timeout <= 0:
+            raise ValueError(f"發送目標 {name} 的 timeout 必須大於 0")
+        return cls(str(name), url, timeout, bool(data.get('required', False)))
+
+    def __repr__(self):
+        return f"DeliveryTarget({self.name!r}, required={self.required})"
+
+
+def parse_targets(entries, default_timeout=DEFAULT_WEBHOOK_TIMEOUT, logger=None):
+    """解析 delivery_targets 設定，格式錯誤的項目記錄後略過"""
+    logger = logger or logging.getLogger('PunchCardApp')
+    targets = []
+    names = {PRIMARY_TARGET}
+    for data in entries or ():
+        try:
+            if not isinstance(data, dict):
+                raise ValueError("發送目標需為物件")
+            target = DeliveryTarget.from_dict(data, default_timeout)
+            if target.name in names:
+                raise ValueError(f"發送目標名稱重複: {target.name}")
+        except (TypeError, ValueError) as e:
+            logger.error(f"略過發送目標設定: {e}")
+            continue
+        names.add(target.name)
+        targets.append(target)
+    return tuple(targets)
+
+
+class TargetResult:
+    """單一目標的發送結果 (response 為 None 時 error 為原因)
+
+    pending 為 True 表示等待逾時時請求仍在進行中，結果未知：不排入重試，之後的結果另外回報。
+    """
+    __slots__ = ('target', 'response', 'error', 'latency', 'pending')
+
+    def __init__(self, target, response=None, error=None, latency=0.0, pending=False):
+        self.target = target
+        self.response = response
+        self.error = error
+        self.latency = latency
+        self.pending = pending
+
+    @property
+    def ok(self):
+        return self.response is not None and 200 <= self.response.status_code < 300
+
+    @property
+    def status(self):
+        """狀態碼，沒有回應時為原因"""
+        if self.response is not None:
+            return self.response.status_code
+        if self.pending:
+            return f"{self.error} (發送中)"
+        return self.error or "無回應"
+
+
+class FanoutResult:
+    """一筆打卡在所有目標的結果 (第一個目標為設定檔的主要 Webhook)"""
+    __slots__ = ('results',)
+
+    def __init__(self, results):
+        self.results = results
+
+    @property
+    def primary(self):
+        return self.results[0]
+
+    @property
+    def response(self):
+        return self.results[0].response
+
+    @property
+    def failure(self):
+        return self.results[0].error
+
+    @property
+    def latency(self):
+        """整體延遲為最慢目標的延遲 (各目標同時發送)"""
+        return max(result.latency for result in self.results)
+
+    @property
+    def multiple(self):
+        return len(self.results) > 1
+
+    @property
+    def ok(self):
+        """所有必要目標都成功才算打卡成功"""
+        return all(result.ok for result in self.results if result.target.required)
+
+    def failed(self):
+        """發送失敗的目標結果 (不含仍在進行中的目標)"""
+        return [result for result in self.results if not result.ok and not result.pending]
+
+    def summary(self):
+        """各目標狀態，例如 "webhook 200, chat 503" """
+        return ", ".join(f"{result.target.name} {result.status}" for result in self.results)
+
+
+class FanoutCollector:
+    """收集各目標的結果，全部到齊時呼叫 on_complete(FanoutResult) (可從任意執行緒回報)
+
+    wait() 逾時後才回報的目標改為呼叫 on_late(TargetResult)。
+    """
+
+    def __init__(self, targets, on_complete=None, on_late=None):
+        self.targets = targets
+        self.on_complete = on_complete
+        self.on_late = on_late
+        self._results = [None] * len(targets)
+        self._remaining = len(targets)
+        self._late = set()  # 逾時時仍在進行中的目標
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def set_result(self, index, response=None, error=None, latency=0.0):
+        result = TargetResult(self.targets[index], response, error, latency)
+        with self._lock:
+            if index in self._late:
+                self._late.discard(index)
+                late = True
+            elif self._results[index] is not None:
+                return
+            else:
+                late = False
+                self._results[index] = result
+                self._remaining -= 1
+                finished = self._remaining == 0
+        if late:
+            if self.on_late is not None:
+                self.on_late(result)
+            return
+        if finished:
+            self._done.set()
+            if self.on_complete is not None:
+                self.on_complete(FanoutResult(self._results))
+
+    def join(self, timeout):
+        """等待所有目標回報，回傳是否全部到齊"""
+        return self._done.wait(timeout)
+
+    def wait(self, timeout):
+        """等待所有目標回報，回傳 FanoutResult
+
+        逾時仍未回報的目標記錄為「逾時」並標示 pending，不視為失敗；之後的結果交給 on_late。
+        """
+        if not self._done.wait(timeout):
+            with self._lock:
+                for index, result in enumerate(self._results):
+                    if result is None:
+                        self._results[index] = TargetResult(self.targets[index], error="逾時", latency=timeout,
+                                                            pending=True)
+                        self._late.add(index)
+        return FanoutResult(self._results)
+
+
+class FanoutSender:
+    """在工作執行緒中同時送出一筆打卡到多個目標
+
+    第一個目標在呼叫端執行緒送出，其餘目標交給共用的執行緒池，
+    因此總延遲約為最慢目標的延遲，而不是各目標延遲的總和。
+    只有一個目標時完全不使用執行緒池；workers 為 0 時依序在呼叫端執行緒發送 (虛擬時鐘模擬使用)。
+    """
+
+    def __init__(self, send, workers=4):
+        self.send = send  # send(target, payload) 回傳 (response, error)
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(self.workers,
+                                                                       thread_name_prefix="FanoutWorker")
+            return self._executor
+
+    def _deliver(self, collector, index, payload):
+        target = collector.targets[index]
+        started = time.perf_counter()
+        try:
+            response, error = self.send(target, payload)
+        except Exception as e:
+            response, error = None, str(e)
+        collector.set_result(index, response, error, time.perf_counter() - started)
+
+    def send_all(self, targets, payload, on_late=None):
+        """同時發送到所有目標並等待結果，回傳 FanoutResult
+
+        等待逾時時，還在執行緒池排隊的目標直接取消 (記錄為「逾時」，可重試)；
+        已送出的請求不取消也不重試，結果到達時呼叫 on_late(TargetResult)，避免端點收到兩次。
+        """
+        collector = FanoutCollector(targets, on_late=on_late)
+        if self.workers <= 0:
+            for index in range(len(targets)):
+                self._deliver(collector, index, payload)
+            return collector.wait(0)
+        futures = {}
+        for index in range(1, len(targets)):
+            try:
+                futures[index] = self.executor.submit(self._deliver, collector, index, payload)
+            except RuntimeError as e:
+                collector.set_result(index, error=f"無法發送: {e}")
+        self._deliver(collector, 0, payload)
+        timeout = max(target.timeout for target in targets) + FANOUT_GRACE_SECONDS
+        if not collector.join(timeout):
+            for index, future in futures.items():
+                if future.cancel():
+                    collector.set_result(index, error="逾時", latency=timeout)
+        return collector.wait(0)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
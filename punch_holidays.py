@@ -0,0 +1,283 @@
+# punch_holidays.py - 匯入 ICS/CSV 假日行事曆 (國定假日、補班日、公司休假) 並建立區間索引
+import bisect
+import csv
+import heapq
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta
+
+from punch_calendar import DEFAULT_YEARS_AFTER
+
+KIND_HOLIDAY = "holiday"  # 休息 (國定假日、公司休假)
+KIND_WORKDAY = "workday"  # 補班：即使大小周週期為休息日也要上班
+
+DEFAULT_HOLIDAY_FILES = ()
+
+# CSV type 欄位與 ICS 分類可使用的名稱
+KIND_ALIASES = {
+    "holiday": KIND_HOLIDAY, "closure": KIND_HOLIDAY, "off": KIND_HOLIDAY,
+    "假日": KIND_HOLIDAY, "放假": KIND_HOLIDAY, "休假": KIND_HOLIDAY, "國定假日": KIND_HOLIDAY,
+    "workday": KIND_WORKDAY, "work": KIND_WORKDAY,
+    "補班": KIND_WORKDAY, "上班": KIND_WORKDAY, "補行上班": KIND_WORKDAY,
+}
+
+# ICS 沒有標示類型時，依標題判斷是否為補班
+WORKDAY_KEYWORDS = ("補班", "補行上班", "調整上班", "workday")
+
+_DURATION_DAYS = re.compile(r'^P(?:(\d+)W)?(?:(\d+)D)?')
+
+
+class HolidayEntry:
+    """單筆假日或補班區間 (以 date.toordinal() 表示，含頭尾)"""
+    __slots__ = ('start', 'end', 'kind', 'name', 'priority')
+
+    def __init__(self, start, end, kind, name="", priority=0):
+        if end < start:
+            raise ValueError("結束日期不可早於開始日期")
+        self.start = start
+        self.end = end
+        self.kind = kind
+        self.name = name
+        self.priority = priority  # 後匯入的行事曆優先
+
+    @property
+    def is_rest(self):
+        return self.kind == KIND_HOLIDAY
+
+    @property
+    def reason(self):
+        """休息或補班原因 (顯示用)"""
+        if self.kind == KIND_WORKDAY:
+            return f"補班日: {self.name}" if self.name else "補班日"
+        return f"假日: {self.name}" if self.name else "假日"
+
+    def rank(self):
+        # 同一份行事曆中補班優先於假日 (例如「本週六補班」覆蓋連假)
+        return self.priority, self.kind == KIND_WORKDAY
+
+    def __repr__(self):
+        return (f"HolidayEntry({date.fromordinal(self.start)}~{date.fromordinal(self.end)}, "
+                f"{self.kind!r}, {self.name!r})")
+
+
+def parse_kind(value, default=KIND_HOLIDAY):
+    """將類型文字轉為 KIND_HOLIDAY 或 KIND_WORKDAY"""
+    if not value:
+        return default
+    kind = KIND_ALIASES.get(value.strip().lower())
+    if kind is None:
+        raise ValueError(f"未知的假日類型: {value}")
+    return kind
+
+
+def parse_date(value):
+    """解析 YYYY-MM-DD、YYYY/MM/DD 或 YYYYMMDD"""
+    value = value.strip()
+    for fmt in ('%Y-%m-%d', '%Y/%m/%d', '%Y%m%d'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"日期格式錯誤: {value}")
+
+
+def load_csv(path, priority=0):
+    """讀取 CSV 行事曆
+
+    欄位：date (或 start、end)、name、type (holiday/workday，可用中文「假日」「補班」)，
+    type 空白時視為假日。
+    """
+    entries = []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames is None:
+            return entries
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        for line_no, row in enumerate(reader, start=2):
+            try:
+                start = row.get('start') or row.get('date')
+                if not start:
+                    raise ValueError("缺少 date 或 start 欄位")
+                start = parse_date(start)
+                end = parse_date(row['end']) if row.get('end') else start
+                kind = parse_kind(row.get('type') or row.get('kind'))
+                name = (row.get('name') or row.get('summary') or '').strip()
+            except ValueError as e:
+                raise ValueError(f"{path} 第 {line_no} 行: {e}") from None
+            entries.append(HolidayEntry(start.toordinal(), end.toordinal(), kind, name, priority))
+    return entries
+
+
+def _unfold(text):
+    """合併 ICS 的折行 (以空白或 tab 開頭的行接續上一行)"""
+    lines = []
+    for line in text.splitlines():
+        if line[:1] in (' ', '\t') and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+    return lines
+
+
+def _ics_date(value):
+    """ICS 日期或日期時間，回傳 (date, 是否為整日)"""
+    value = value.strip()
+    day = datetime.strptime(value[:8], '%Y%m%d').date()
+    if len(value) == 8:
+        return day, True
+    # 午夜結束的日期時間視為不含當日
+    return day, value[9:15] == "000000"
+
+
+def _ics_kind(props):
+    explicit = props.get('X-PUNCH-KIND') or props.get('X-PUNCH-TYPE')
+    if explicit:
+        return parse_kind(explicit)
+    for category in props.get('CATEGORIES', '').split(','):
+        kind = KIND_ALIASES.get(category.strip().lower())
+        if kind is not None:
+            return kind
+    summary = props.get('SUMMARY', '')
+    if any(keyword in summary.lower() for keyword in WORKDAY_KEYWORDS):
+        return KIND_WORKDAY
+    return KIND_HOLIDAY
+
+
+def _ics_entries(props, priority, last_year):
+    start, _ = _ics_date(props['DTSTART'])
+    if 'DTEND' in props:
+        end, exclusive = _ics_date(props['DTEND'])
+        if exclusive and end > start:
+            end -= timedelta(days=1)
+    else:
+        end = start
+        match = _DURATION_DAYS.match(props.get('DURATION', ''))
+        if match and (match.group(1) or match.group(2)):
+            days = int(match.group(1) or 0) * 7 + int(match.group(2) or 0)
+            end = start + timedelta(days=max(days - 1, 0))
+
+    kind = _ics_kind(props)
+    name = props.get('SUMMARY', '').replace('\\,', ',').replace('\\;', ';').strip()
+    length = end.toordinal() - start.toordinal()
+
+    rule = props.get('RRULE')
+    if not rule:
+        return [HolidayEntry(start.toordinal(), end.toordinal(), kind, name, priority)]
+
+    # 只展開每年重複的事件 (例如元旦)，展開到索引預設範圍的最後一年
+    parts = dict(part.split('=', 1) for part in rule.split(';') if '=' in part)
+    if parts.get('FREQ') != 'YEARLY':
+        raise ValueError(f"不支援的重複規則: {rule}")
+    count = int(parts['COUNT']) if 'COUNT' in parts else None
+    until = _ics_date(parts['UNTIL'])[0] if 'UNTIL' in parts else date(last_year, 12, 31)
+    interval = int(parts.get('INTERVAL', 1))
+
+    entries = []
+    year = start.year
+    while (count is None or len(entries) < count) and year <= until.year:
+        try:
+            occurrence = start.replace(year=year)
+        except ValueError:  # 2/29 在非閏年不發生
+            occurrence = None
+        if occurrence is not None:
+            if occurrence > until:
+                break
+            entries.append(HolidayEntry(occurrence.toordinal(), occurrence.toordinal() + length,
+                                        kind, name, priority))
+        year += interval
+    return entries
+
+
+def load_ics(path, priority=0, logger=None):
+    """讀取 ICS 行事曆的 VEVENT
+
+    類型依 X-PUNCH-KIND、CATEGORIES 或標題中的「補班」判斷，預設為假日；
+    重複事件只支援 FREQ=YEARLY，其他規則會略過並記錄警告。
+    """
+    logger = logger or logging.getLogger('PunchCardApp')
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        lines = _unfold(f.read())
+
+    last_year = date.today().year + DEFAULT_YEARS_AFTER
+    entries = []
+    props = None
+    for line in lines:
+        if line == 'BEGIN:VEVENT':
+            props = {}
+        elif line == 'END:VEVENT':
+            if props is not None and 'DTSTART' in props:
+                try:
+                    entries.extend(_ics_entries(props, priority, last_year))
+                except ValueError as e:
+                    logger.warning(f"略過行事曆事件 {props.get('SUMMARY', '')}: {e}")
+            props = None
+        elif props is not None and ':' in line:
+            key, value = line.split(':', 1)
+            props.setdefault(key.split(';', 1)[0].upper(), value)
+    return entries
+
+
+def load_holiday_file(path, priority=0, logger=None):
+    """依副檔名讀取 ICS 或 CSV 行事曆"""
+    if os.path.splitext(path)[1].lower() in ('.ics', '.ical', '.ifb'):
+        return load_ics(path, priority, logger)
+    return load_csv(path, priority)
+
+
+class HolidayIndex:
+    """假日區間索引
+
+    建立時將所有 (可能互相重疊的) 區間切成互不重疊的片段，每段只保留優先權最高的區間；
+    查詢時對片段起點做二分搜尋，單日查詢為 O(log n)，與行事曆數量和重疊程度無關。
+    """
+
+    def __init__(self, entries=()):
+        self.entries = list(entries)
+        self._starts = []  # 片段起點 (ordinal)
+        self._values = []  # 片段對應的 HolidayEntry，None 表示不在任何區間內
+        self._build()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _build(self):
+        by_start = sorted(self.entries, key=lambda e: e.start)
+        points = sorted({e.start for e in by_start} | {e.end + 1 for e in by_start})
+        active = []  # (-優先權, 順序, entry)，過期的區間延遲移除
+        i = 0
+        for point in points:
+            while i < len(by_start) and by_start[i].start <= point:
+                entry = by_start[i]
+                priority, workday = entry.rank()
+                heapq.heappush(active, (-priority, -workday, i, entry))
+                i += 1
+            while active and active[0][3].end < point:
+                heapq.heappop(active)
+            top = active[0][3] if active else None
+            if self._values and self._values[-1] is top:
+                continue
+            self._starts.append(point)
+            self._values.append(top)
+
+    def lookup(self, target_date):
+        """取得指定日期生效的 HolidayEntry，不在任何區間內時回傳 None"""
+        index = bisect.bisect_right(self._starts, target_date.toordinal()) - 1
+        if index < 0:
+            return None
+        return self._values[index]
+
+    @classmethod
+    def from_files(cls, paths, logger=None):
+        """依序載入多份行事曆，後面的檔案優先；讀取失敗的檔案會略過"""
+        logger = logger or logging.getLogger('PunchCardApp')
+        entries = []
+        for priority, path in enumerate(paths):
+            try:
+                loaded = load_holiday_file(path, priority, logger)
+            except (OSError, ValueError, UnicodeDecodeError) as e:
+                logger.error(f"載入假日行事曆失敗: {path}: {e}")
+                continue
+            entries.extend(loaded)
+            logger.info(f"載入假日行事曆: {path} ({len(loaded)} 筆)")
+        return cls(entries)
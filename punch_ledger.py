@@ -0,0 +1,173 @@
+# punch_ledger.py - 持久化的打卡帳本 (SQLite WAL, 只附加)
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+DEFAULT_LEDGER_FILE = "punch_ledger.db"
+
+# 帳本事件類型
+EVENT_FIRED = "fired"  # 排程已觸發 (寫入後才會發送，重啟時據此還原執行狀態)
+EVENT_SUCCESS = "success"
+EVENT_FAILED = "failed"
+EVENT_ERROR = "error"
+EVENT_DEAD_LETTER = "dead_letter"  # 重試佇列已放棄
+EVENT_MISSED = "missed"  # 錯過打卡時間且依策略不補打 (detail 為原因)
+EVENT_CATCH_UP = "catch_up"  # 錯過打卡時間後補打或重新排程 (detail 為原因與策略)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS punch_ledger (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    profile_id TEXT NOT NULL,
+    punch_type TEXT NOT NULL,
+    event TEXT NOT NULL,
+    source TEXT NOT NULL,
+    status_code INTEGER,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_punch_ledger_day ON punch_ledger (day, profile_id, event);
+"""
+
+
+class PunchLedger:
+    """只附加的打卡帳本
+
+    寫入由背景執行緒批次提交 (每批一次 fsync)，呼叫端不會被磁碟 I/O 阻塞；
+    需要確保已落盤時可等待 record() 回傳的 threading.Event。
+    依日期建立索引，啟動時只查詢當天資料，歷史再多也不影響啟動速度。
+    """
+
+    def __init__(self, path=DEFAULT_LEDGER_FILE, batch_size=200, linger=0.05, logger=None,
+                 synchronous="FULL", clock=time.time):
+        self.path = path
+        self.batch_size = batch_size
+        self.linger = linger
+        self.logger = logger or logging.getLogger('PunchCardApp')
+        self.synchronous = synchronous  # 模擬時可設為 OFF，不等待 fsync
+        self.clock = clock
+
+        self._queue = queue.Queue()
+        self._thread = None
+
+        # 查詢共用同一條唯讀連線 (設定檔眾多時避免每次查詢都重新連線)
+        self._read_conn = None
+        self._read_lock = threading.Lock()
+
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + FULL：每次提交都會 fsync，由批次提交攤平成本
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        return conn
+
+    def start(self):
+        """啟動背景寫入執行緒"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="PunchLedgerWriter", daemon=True)
+            self._thread.start()
+
+    def record(self, profile_id, day, punch_type, event, source="auto", status_code=None, detail=None, ts=None):
+        """加入一筆帳本事件 (非阻塞)，回傳落盤後會被設定的 threading.Event"""
+        if self._thread is None:
+            self.start()
+        done = threading.Event()
+        row = (ts or self.clock(), str(day), profile_id, punch_type, event, source,
+               status_code if isinstance(status_code, int) else None, detail)
+        self._queue.put((row, done))
+        return done
+
+    def _query(self, sql, params):
+        with self._read_lock:
+            if self._read_conn is None:
+                self._read_conn = self._connect()
+            return self._read_conn.execute(sql, params).fetchall()
+
+    def executed_punches(self, profile_id, day, event=EVENT_FIRED):
+        """查詢指定日期已觸發 (或其他事件) 的自動打卡類型 (重啟時還原執行狀態用)"""
+        return self.punch_events(profile_id, day, (event,))[event]
+
+    def punch_events(self, profile_id, day, events=(EVENT_FIRED,)):
+        """以一次查詢取得指定日期多種事件的打卡類型，回傳 {事件: {打卡類型, ...}}"""
+        placeholders = ",".join("?" * len(events))
+        rows = self._query(
+            "SELECT DISTINCT event, punch_type FROM punch_ledger "
+            f"WHERE day = ? AND profile_id = ? AND event IN ({placeholders})",
+            (str(day), profile_id, *events))
+        result = {event: set() for event in events}
+        for event, punch_type in rows:
+            result[event].add(punch_type)
+        return result
+
+    def events_for_day(self, day, profile_id=None):
+        """查詢指定日期的所有帳本事件"""
+        sql = ("SELECT ts, profile_id, punch_type, event, source, status_code, detail "
+               "FROM punch_ledger WHERE day = ?")
+        params = [str(day)]
+        if profile_id is not None:
+            sql += " AND profile_id = ?"
+            params.append(profile_id)
+        return self._query(sql + " ORDER BY id", params)
+
+    def close(self, timeout=5):
+        """寫入剩餘事件後停止背景執行緒"""
+        with self._read_lock:
+            if self._read_conn is not None:
+                self._read_conn.close()
+                self._read_conn = None
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                batch = [item]
+                stop = False
+
+                # 在短暫等待時間內盡量收集同一批次
+                deadline = time.monotonic() + self.linger
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=max(0, remaining)) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+
+                self._write_batch(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, batch):
+        try:
+            conn.executemany(
+                "INSERT INTO punch_ledger (ts, day, profile_id, punch_type, event, source, status_code, detail) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for row, _ in batch])
+            conn.commit()
+        except sqlite3.Error as e:
+            self.logger.error(f"寫入打卡帳本失敗: {e}")
+        finally:
+            for _, done in batch:
+                done.set()
@@ -0,0 +1,220 @@
+# punch_loadgen.py - 負載產生器：以指定速率經由打卡核心的發送路徑打到本機替身 Webhook
+"""
+執行方式:
+    python punch_loadgen.py --rate 200 --duration 10                  # 啟動程序內替身端點，每秒 200 筆打卡
+    python punch_loadgen.py --rate 500 --backend asyncio --latency-ms 50 --jitter-ms 20
+    python punch_loadgen.py --rate 1000 --batch-window-ms 50          # 測試合併發送
+    python punch_loadgen.py --url http://127.0.0.1:8765/webhook       # 打到另一個程序的 punch_standin.py
+
+每筆打卡都經過 PunchEngine.schedule_punch (發送池或 asyncio 發送器、合併發送、結果記錄、帳本與重試佇列)，
+延遲以排入到記錄結果的時間計算 (含排隊時間)。在暫存目錄中執行，不影響正式的設定檔、帳本與日誌。
+替身端點與負載產生器在同一程序時會互相競爭 CPU，需要精確數字時請另外啟動 punch_standin.py 並指定 --url。
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from array import array
+from urllib.parse import urlsplit
+
+from punch_engine import PunchEngine
+from punch_plan import PUNCH_TYPES
+from punch_profiles import PunchProfile
+from punch_standin import start_stand_in_server, add_behavior_arguments, behavior_from_args
+
+# 送完後等待未完成打卡的最長秒數
+DRAIN_TIMEOUT = 30
+
+
+class LoadTracker:
+    """記錄每筆打卡的排入時間、完成時間與狀態碼"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._submitted = {}  # profile_id -> 排入時間 (perf_counter)
+        self.latencies = array('d')
+        self.status_counts = {}
+        self.completed = 0
+        self.last_completed = None
+
+    def submit(self, key):
+        with self._cond:
+            self._submitted[key] = time.perf_counter()
+
+    def complete(self, key, response, status=None):
+        now = time.perf_counter()
+        if status is None:
+            status = str(response.status_code) if response is not None else "無回應"
+        with self._cond:
+            started = self._submitted.pop(key, None)
+            if started is None:
+                return
+            self.latencies.append(now - started)
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            self.completed += 1
+            self.last_completed = now
+            if not self._submitted:
+                self._cond.notify_all()
+
+    def wait(self, timeout):
+        """等待所有已排入的打卡完成，回傳未完成的筆數"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._submitted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return len(self._submitted)
+
+
+class LoadEngine(PunchEngine):
+    """完成打卡時通知 LoadTracker 的 PunchEngine"""
+
+    def __init__(self, config_file, tracker):
+        self.tracker = tracker
+        super().__init__(config_file)
+
+    def record_punch_result(self, punch_type, current_time, response, latency=None, profile=None, failure=None,
+                            fanout=None):
+        super().record_punch_result(punch_type, current_time, response, latency, profile, failure, fanout)
+        self.tracker.complete((profile or self.profile).profile_id, response)
+
+    def record_punch_error(self, punch_type, error, profile=None):
+        super().record_punch_error(punch_type, error, profile)
+        self.tracker.complete((profile or self.profile).profile_id, None)
+
+    def submit_delivery(self, punch_task, punch_type, source="auto", profile=None):
+        # 發送佇列已滿時打卡直接交給重試佇列，不會再記錄結果
+        queued = super().submit_delivery(punch_task, punch_type, source, profile)
+        if not queued:
+            self.tracker.complete((profile or self.profile).profile_id, None, status="發送佇列已滿")
+        return queued
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_load(engine, url, rate, count):
+    """以固定速率排入 count 筆打卡 (開放式負載：不等待前一筆完成)，回傳實際排入耗時"""
+    tracker = engine.tracker
+    interval = 1 / rate
+    specs = engine.punch_specs
+    started = time.perf_counter()
+    for i in range(count):
+        delay = started + i * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        profile = PunchProfile(f"load-{i}", url, specs)
+        tracker.submit(profile.profile_id)
+        engine.schedule_punch(PUNCH_TYPES[i % 2], profile)
+    return started, time.perf_counter() - started
+
+
+def write_config(path, args, url):
+    config = {
+        'webhook_url': url,
+        'delivery_backend': args.backend,
+        'delivery_workers': args.workers,
+        'http_pool_maxsize': args.workers,
+        'async_concurrency': args.concurrency,
+        'batch_window_ms': args.batch_window_ms,
+        'metrics_port': 0,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="打卡發送負載產生器 (只打本機替身 Webhook)")
+    parser.add_argument('--rate', type=float, default=100, help="每秒排入的打卡數")
+    parser.add_argument('--duration', type=float, default=10, help="持續秒數")
+    parser.add_argument('--url', help="替身 Webhook URL (未指定時在程序內啟動 punch_standin)")
+    parser.add_argument('--backend', choices=('thread', 'asyncio'), default='thread', help="發送方式")
+    parser.add_argument('--workers', type=int, default=8, help="發送池執行緒數 (thread)")
+    parser.add_argument('--concurrency', type=int, default=100, help="最大同時請求數 (asyncio)")
+    parser.add_argument('--batch-window-ms', type=int, default=0, help="合併發送時間窗 (毫秒，0 表示不合併)")
+    parser.add_argument('--output', help="結果 JSON 路徑")
+    add_behavior_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_stand_in_server(behavior_from_args(args))
+    elif urlsplit(url).hostname not in ('127.0.0.1', 'localhost', '::1'):
+        raise SystemExit("負載產生器只能打到本機替身 Webhook (127.0.0.1 / localhost)")
+
+    output_path = os.path.abspath(args.output) if args.output else None
+    original_dir = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="punch_load_")
+    os.chdir(workdir)
+    write_config('punch_config.json', args, url)
+
+    count = max(1, int(args.rate * args.duration))
+    tracker = LoadTracker()
+    engine = LoadEngine('punch_config.json', tracker)
+    # 失敗與無回應屬預期結果，只寫入暫存目錄的日誌
+    engine.logger.setLevel(logging.WARNING)
+    engine.log_queue.console_handler.setLevel(logging.CRITICAL)
+    if engine.batcher is not None:
+        engine.batcher.start()
+
+    try:
+        started, submit_elapsed = run_load(engine, url, args.rate, count)
+        if engine.batcher is not None:
+            engine.batcher.stop()
+        incomplete = tracker.wait(DRAIN_TIMEOUT)
+    finally:
+        engine.stop()
+        os.chdir(original_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+        if server is not None:
+            server.shutdown()
+
+    latencies = sorted(tracker.latencies)
+    elapsed = (tracker.last_completed - started) if tracker.last_completed else submit_elapsed
+    result = {
+        "url": url,
+        "backend": args.backend,
+        "batch_window_ms": args.batch_window_ms,
+        "target_rate": args.rate,
+        "submitted": count,
+        "offered_rate": round(count / submit_elapsed, 1) if submit_elapsed else None,
+        "completed": tracker.completed,
+        "incomplete": incomplete,
+        "throughput": round(tracker.completed / elapsed, 1) if elapsed else None,
+        "latency_ms": {name: round(_percentile(latencies, q) * 1000, 2)
+                       for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))},
+        "status_counts": tracker.status_counts,
+    }
+    if server is not None:
+        result["stand_in"] = server.stats.to_dict()
+
+    print(f"目標 {args.rate:g} 筆/秒，實際排入 {result['offered_rate']} 筆/秒，"
+          f"完成 {tracker.completed:,}/{count:,} 筆 ({result['throughput']} 筆/秒)")
+    latency = result["latency_ms"]
+    print(f"延遲: p50 {latency['p50']} ms, p90 {latency['p90']} ms, p99 {latency['p99']} ms, "
+          f"最大 {latency['max']} ms")
+    print(f"狀態碼: {tracker.status_counts}" + (f"，未完成 {incomplete} 筆" if incomplete else ""))
+    if server is not None:
+        print(f"替身端點: {result['stand_in']}")
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"結果已寫入 {output_path}")
+
+
+if __name__ == "__main__":
+    main()
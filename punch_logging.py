@@ -0,0 +1,104 @@
+# punch_logging.py - 非阻塞日誌：佇列處理器與背景寫入執行緒，可選 JSON-lines 結構化格式
+import json
+import logging
+import os
+import queue
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT_TEXT = "text"
+LOG_FORMAT_JSON = "json"
+DEFAULT_LOG_FORMAT = LOG_FORMAT_TEXT
+
+LOG_DIR = 'logs'
+LOG_FILE = os.path.join(LOG_DIR, 'punch_card.log')
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# 目前使用中的背景寫入器 (重新設定時先停止舊的)
+_active = None
+
+
+def log_fields(**fields):
+    """產生 logger 的 extra 參數，結構化格式會將這些欄位輸出為 JSON 鍵值"""
+    return {'fields': {key: value for key, value in fields.items() if value is not None}}
+
+
+class JsonLineFormatter(logging.Formatter):
+    """每筆日誌輸出為一行 JSON，方便下游工具解析"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class QueueLogging:
+    """佇列式日誌
+
+    logger 只掛上 QueueHandler，呼叫端 (包括 Tk 主執行緒與排程執行緒) 只需將記錄放入佇列；
+    檔案寫入、輪轉與主控台輸出都由 QueueListener 的背景執行緒處理。
+    """
+
+    def __init__(self, logger, log_format=DEFAULT_LOG_FORMAT):
+        self.logger = logger
+        self.queue = queue.SimpleQueue()
+
+        if not os.path.exists(LOG_DIR):
+            os.makedirs(LOG_DIR)
+
+        # 檔案處理器 - 輪轉日誌檔案
+        self.file_handler = RotatingFileHandler(
+            LOG_FILE,
+            maxBytes=5 * 1024 * 1024,  # 5MB
+            backupCount=5,
+            encoding='utf-8'
+        )
+        self.file_handler.setLevel(logging.DEBUG)
+
+        # 控制台處理器 (固定為文字格式)
+        self.console_handler = logging.StreamHandler()
+        self.console_handler.setLevel(logging.INFO)
+        self.console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        self.set_format(log_format)
+
+        self.listener = QueueListener(self.queue, self.file_handler, self.console_handler,
+                                      respect_handler_level=True)
+
+    def set_format(self, log_format):
+        """切換日誌檔案格式 (text 或 json)"""
+        if log_format == LOG_FORMAT_JSON:
+            self.file_handler.setFormatter(JsonLineFormatter())
+        else:
+            self.file_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        self.log_format = log_format
+
+    def start(self):
+        global _active
+        if _active is not None and _active is not self:
+            _active.stop()
+        _active = self
+
+        self.logger.handlers.clear()
+        self.logger.addHandler(QueueHandler(self.queue))
+        self.listener.start()
+
+    def stop(self):
+        """寫出佇列中剩餘的日誌後停止背景執行緒"""
+        global _active
+        for handler in list(self.logger.handlers):
+            if isinstance(handler, QueueHandler) and handler.queue is self.queue:
+                self.logger.removeHandler(handler)
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.file_handler.close()
+        if _active is self:
+            _active = None
@@ -0,0 +1,235 @@
+# punch_metrics.py - 程序內指標 (計數器、量表、直方圖) 與 Prometheus 文字格式端點
+import bisect
+import logging
+import threading
+
+# 0 表示不開啟指標端點 (指標仍會在程序內累計)
+DEFAULT_METRICS_PORT = 0
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+# 預設直方圖區間 (秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 15, 30, 60)
+TICK_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _ShardedMetric:
+    """每個執行緒各自累加在自己的分片，更新時不需加鎖；讀取時才合併所有分片"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def _snapshot(self):
+        with self._lock:
+            shards = list(self._shards)
+        return [(key, list(series)) for shard in shards for key, series in list(shard.items())]
+
+
+class Counter(_ShardedMetric):
+    """只增不減的計數器，可依標籤分開累計"""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__()
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+
+    def inc(self, *label_values, amount=1):
+        shard = self._shard()
+        cell = shard.get(label_values)
+        if cell is None:
+            cell = shard[label_values] = [0]
+        cell[0] += amount
+
+    def value(self, *label_values):
+        return sum(cell[0] for key, cell in self._snapshot() if key == label_values)
+
+    def samples(self):
+        totals = {}
+        for key, cell in self._snapshot():
+            key = tuple(str(v) for v in key)
+            totals[key] = totals.get(key, 0) + cell[0]
+        for key, value in sorted(totals.items()):
+            yield self.name, _format_labels(self.labels, key), value
+
+
+class Gauge:
+    """量表：讀取時才呼叫 callback 取得目前值，更新端不需任何成本"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, callback):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+
+    def samples(self):
+        yield self.name, "", self.callback()
+
+
+class Histogram(_ShardedMetric):
+    """固定區間直方圖
+
+    區間在建立時決定，observe() 只做一次二分搜尋與執行緒分片內的累加，不需加鎖。
+    """
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        super().__init__()
+        self.name = name
+        self.help = help_text
+        self.bounds = tuple(sorted(buckets))
+        self.labels = tuple(labels)
+
+    def observe(self, value, *label_values):
+        shard = self._shard()
+        series = shard.get(label_values)
+        if series is None:
+            # [各區間計數..., +Inf 計數, 總和]
+            series = shard[label_values] = [0] * (len(self.bounds) + 1) + [0.0]
+        series[bisect.bisect_left(self.bounds, value)] += 1
+        series[-1] += value
+
+    def _merged(self):
+        merged = {}
+        for key, series in self._snapshot():
+            key = tuple(str(v) for v in key)
+            total = merged.get(key)
+            if total is None:
+                merged[key] = series
+            else:
+                merged[key] = [a + b for a, b in zip(total, series)]
+        return merged
+
+    def count(self, *label_values):
+        series = self._merged().get(tuple(str(v) for v in label_values))
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        for key, series in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float('inf'),), series[:-1]):
+                cumulative += count
+                yield (self.name + "_bucket",
+                       _format_labels(self.labels, key, ("le", _format_value(float(bound)))), cumulative)
+            yield self.name + "_sum", _format_labels(self.labels, key), series[-1]
+            yield self.name + "_count", _format_labels(self.labels, key), cumulative
+
+
+class MetricsRegistry:
+    """指標登錄表"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, callback):
+        return self._register(Gauge(name, help_text, callback))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, labels=()):
+        return self._register(Histogram(name, help_text, buckets, labels))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """輸出 Prometheus 文字格式 (0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:  # 量表 callback 失敗時略過該指標
+                logging.getLogger('PunchCardApp').debug(f"讀取指標失敗: {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """以 HTTP 提供 /metrics 的本機端點 (背景執行緒)"""
+
+    def __init__(self, registry, port, host=DEFAULT_METRICS_HOST, logger=None):
+        self.registry = registry
+        self.port = port
+        self.host = host
+        self.logger = logger or logging.getLogger('PunchCardApp')
+        self._server = None
+
+    def start(self):
+        # 指標端點預設不開啟，開啟時才載入 http.server
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((self.host, self.port), Handler)
+        server.daemon_threads = True
+        self._server = server
+        self.port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, name="MetricsServer", daemon=True).start()
+        self.logger.info(f"指標端點已啟動: http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,318 @@
+# punch_outbox.py - 發送失敗打卡的持久化重試佇列
+import json
+import logging
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_OUTBOX_FILE = "punch_ledger.db"
+DEFAULT_RETRY_WORKERS = 4
+DEFAULT_RETRY_BASE_DELAY = 5  # 秒
+DEFAULT_RETRY_MAX_DELAY = 300  # 秒
+DEFAULT_RETRY_WINDOW_MINUTES = 30
+
+# 重試結果
+STATUS_PENDING = "pending"
+STATUS_DELIVERED = "delivered"
+STATUS_DEAD = "dead"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS punch_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    day TEXT NOT NULL,
+    profile_id TEXT NOT NULL,
+    punch_type TEXT NOT NULL,
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    deadline REAL NOT NULL,
+    status TEXT NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_punch_outbox_due ON punch_outbox (status, next_attempt);
+"""
+
+
+def is_retryable_status(status_code):
+    """判斷 HTTP 狀態碼是否值得重試 (逾時、限流與伺服器錯誤)"""
+    return status_code in (408, 425, 429) or status_code >= 500
+
+
+class OutboxEntry:
+    """重試佇列中的單筆打卡"""
+    __slots__ = ('id', 'day', 'profile_id', 'punch_type', 'source', 'url', 'payload',
+                 'attempts', 'deadline', 'last_error')
+
+    def __init__(self, id, day, profile_id, punch_type, source, url, payload, attempts, deadline, last_error):
+        self.id = id
+        self.day = day
+        self.profile_id = profile_id
+        self.punch_type = punch_type
+        self.source = source
+        self.url = url
+        self.payload = payload
+        self.attempts = attempts
+        self.deadline = deadline
+        self.last_error = last_error
+
+
+class PunchOutbox:
+    """持久化的打卡重試佇列
+
+    失敗的打卡由背景寫入執行緒批次寫入 SQLite (排入時不等待磁碟 I/O)，再由背景執行緒重試：
+    退避時間以指數成長並設有上限，且採用完整抖動 (full jitter) 打散重試時間；
+    同時進行的重試數量受執行緒池限制，網路恢復後可快速消化大量積壓而不會瞬間湧入。
+    超過期限仍未送達的打卡會標記為放棄 (dead letter)。
+    """
+
+    def __init__(self, send_fn, on_result=None, path=DEFAULT_OUTBOX_FILE, workers=DEFAULT_RETRY_WORKERS,
+                 base_delay=DEFAULT_RETRY_BASE_DELAY, max_delay=DEFAULT_RETRY_MAX_DELAY,
+                 batch_size=200, logger=None, clock=time.time):
+        self.send_fn = send_fn
+        self.on_result = on_result
+        self.path = path
+        self.workers = workers
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self.throttle = None  # throttle(url) 回傳該端點需延後的秒數 (限流器)
+        self.clock = clock
+        self.logger = logger or logging.getLogger('PunchCardApp')
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+        self._executor = None
+        self._inserts = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+        # 待重試數量保存在記憶體中 (介面每秒查詢)，只在開啟時從磁碟計算一次
+        self._pending_lock = threading.Lock()
+        self._pending = self._conn.execute(
+            "SELECT COUNT(*) FROM punch_outbox WHERE status = ?", (STATUS_PENDING,)).fetchone()[0]
+
+    def start(self):
+        """啟動重試執行緒 (上次未完成的項目會繼續重試)"""
+        if self._running:
+            return
+        self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="OutboxRetry")
+        self._thread = threading.Thread(target=self._run, name="PunchOutbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        """寫入尚未落盤的項目後停止重試執行緒，未送達的項目保留在磁碟上"""
+        self.flush(timeout)
+        if not self._running:
+            return
+        self._running = False
+        self._wake.set()
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._thread = None
+
+    def enqueue(self, profile_id, day, punch_type, url, payload, deadline, source="auto", error=None, delay=0):
+        """加入一筆待重試的打卡 (非阻塞)，回傳落盤後會被設定的 threading.Event
+
+        delay 為至少延後的秒數，例如已向限流器預約的時間。
+        """
+        now = self.clock()
+        next_attempt = now + max(self.backoff(1), delay)
+        if self.throttle is not None:
+            next_attempt = max(next_attempt, now + self.throttle(url))
+        row = (now, str(day), profile_id, punch_type, source, url, json.dumps(payload, ensure_ascii=False),
+               next_attempt, deadline, STATUS_PENDING, error)
+        done = threading.Event()
+        self._add_pending(1)
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="PunchOutboxWriter", daemon=True)
+                self._writer.start()
+            self._inserts.put((row, done))
+        return done
+
+    def flush(self, timeout=2):
+        """寫入所有已排入的項目並停止背景寫入執行緒 (之後再排入會重新啟動)"""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+            if writer is None:
+                return
+            self._inserts.put(None)
+        writer.join(timeout)
+
+    def _write_loop(self):
+        while True:
+            item = self._inserts.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            # 一次寫入目前已排入的項目 (大量打卡同時失敗時只提交一次)
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._inserts.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        try:
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT INTO punch_outbox (created, day, profile_id, punch_type, source, url, payload, "
+                    "attempts, next_attempt, deadline, status, last_error) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?, ?, ?)",
+                    [row for row, _ in batch])
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self.logger.error(f"寫入重試佇列失敗: {e}")
+            self._add_pending(-len(batch))
+        finally:
+            for _, done in batch:
+                done.set()
+        self._wake.set()
+
+    def backoff(self, attempts):
+        """第 attempts 次失敗後的等待秒數 (指數退避 + 完整抖動)"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return random.uniform(0, delay)
+
+    def pending_count(self):
+        """待重試的項目數 (不查詢資料庫)"""
+        return self._pending
+
+    def _add_pending(self, count):
+        with self._pending_lock:
+            self._pending = max(0, self._pending + count)
+
+    def _run(self):
+        while self._running:
+            self._wake.clear()
+            try:
+                self._expire(self.clock())
+                entries = self._due(self.clock())
+            except sqlite3.Error as e:
+                self.logger.error(f"讀取重試佇列失敗: {e}")
+                self._wake.wait(5)
+                continue
+
+            if not entries:
+                next_attempt = self._next_attempt()
+                timeout = 60 if next_attempt is None else min(60, max(0, next_attempt - self.clock()))
+                self._wake.wait(timeout)
+                continue
+
+            futures = [(entry, self._executor.submit(self.send_fn, entry.url, entry.payload))
+                       for entry in entries]
+            results = []
+            for entry, future in futures:
+                try:
+                    response = future.result()
+                    error = None
+                except Exception as e:
+                    response = None
+                    error = repr(e)
+                results.append(self._evaluate(entry, response, error))
+            if not self._running:
+                return
+            self._apply(results)
+
+    def _due(self, now):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, day, profile_id, punch_type, source, url, payload, attempts, deadline, last_error "
+                "FROM punch_outbox WHERE status = ? AND next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+                (STATUS_PENDING, now, self.batch_size)).fetchall()
+        return [OutboxEntry(*row[:6], json.loads(row[6]), *row[7:]) for row in rows]
+
+    def _next_attempt(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt) FROM punch_outbox WHERE status = ?", (STATUS_PENDING,)).fetchone()
+        return row[0]
+
+    def _expire(self, now):
+        """將超過期限的項目標記為放棄"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, day, profile_id, punch_type, source, url, payload, attempts, deadline, last_error "
+                "FROM punch_outbox WHERE status = ? AND deadline < ?", (STATUS_PENDING, now)).fetchall()
+            if not rows:
+                return
+            self._conn.executemany(
+                "UPDATE punch_outbox SET status = ? WHERE id = ?", [(STATUS_DEAD, row[0]) for row in rows])
+            self._conn.commit()
+        self._add_pending(-len(rows))
+        for row in rows:
+            entry = OutboxEntry(*row[:6], json.loads(row[6]), *row[7:])
+            self._notify(entry, STATUS_DEAD, None, entry.last_error or "超過重試期限")
+
+    def _evaluate(self, entry, response, error):
+        """依發送結果決定下一步：送達、稍後重試或放棄"""
+        now = self.clock()
+        status_code = response.status_code if response is not None else None
+        attempts = entry.attempts + 1
+
+        if status_code is not None and 200 <= status_code < 300:
+            status, next_attempt = STATUS_DELIVERED, now
+        else:
+            if error is None:
+                error = f"狀態碼: {status_code}"
+            next_attempt = now + self.backoff(attempts)
+            if self.throttle is not None:
+                # 端點要求降速 (Retry-After) 或已達速率上限時，至少延後到可發送的時間
+                next_attempt = max(next_attempt, now + self.throttle(entry.url))
+            if (status_code is not None and not is_retryable_status(status_code)) or next_attempt > entry.deadline:
+                status = STATUS_DEAD
+            else:
+                status = STATUS_PENDING
+
+        entry.attempts = attempts
+        entry.last_error = error
+        return entry, status, status_code, next_attempt
+
+    def _apply(self, results):
+        """整批寫回重試結果 (一次提交)"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE punch_outbox SET attempts = ?, next_attempt = ?, status = ?, last_error = ? WHERE id = ?",
+                [(entry.attempts, next_attempt, status, entry.last_error, entry.id)
+                 for entry, status, _, next_attempt in results])
+            self._conn.commit()
+        self._add_pending(-sum(1 for _, status, _, _ in results if status != STATUS_PENDING))
+
+        for entry, status, status_code, _ in results:
+            self._notify(entry, status, status_code, entry.last_error)
+
+    def _notify(self, entry, status, status_code, error):
+        if status == STATUS_DELIVERED:
+            self.logger.info(f"重試打卡成功: {entry.punch_type} (第 {entry.attempts} 次嘗試)")
+        elif status == STATUS_DEAD:
+            self.logger.error(f"放棄重試打卡: {entry.punch_type}, 嘗試 {entry.attempts} 次, 原因: {error}")
+        else:
+            self.logger.warning(f"重試打卡失敗: {entry.punch_type} (第 {entry.attempts} 次), 原因: {error}")
+
+        if self.on_result is not None:
+            try:
+                self.on_result(entry, status, status_code, error)
+            except Exception as e:
+                self.logger.error(f"處理重試結果失敗: {e}")
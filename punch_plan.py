@@ -0,0 +1,150 @@
+# punch_plan.py - 預先編譯的每日打卡計畫
+import random
+from datetime import datetime, time as dt_time
+
+from punch_planner import seeded_offset
+
+PUNCH_IN = 0
+PUNCH_OUT = 1
+PUNCH_TYPES = ("上班打卡", "下班打卡")
+
+# 觸發後仍可執行的容許秒數
+EXACT_TOLERANCE = 15
+RANDOM_TOLERANCE = 30
+
+# 錯過打卡時間 (休眠、時鐘跳動、程式晚啟動) 時的補救策略
+CATCH_UP_FIRE_LATE = "fire_late"  # 在上限時間內立即補打
+CATCH_UP_SKIP = "skip"  # 不補打，只記錄並提醒
+CATCH_UP_RESCHEDULE = "reschedule"  # 隨機模式在剩餘區間內重新抽時間，區間已過則同 fire_late
+CATCH_UP_POLICIES = (CATCH_UP_FIRE_LATE, CATCH_UP_SKIP, CATCH_UP_RESCHEDULE)
+DEFAULT_CATCH_UP_POLICY = CATCH_UP_SKIP
+DEFAULT_CATCH_UP_MAX_MINUTES = 30
+
+# 錯過原因
+MISSED_STARTUP = "startup"  # 程式啟動時已超過容許範圍
+MISSED_CLOCK_JUMP = "clock_jump"  # 系統休眠或時鐘被調整
+MISSED_LATE = "late"  # 排程觸發時已超過容許範圍
+MISSED_REASONS = {
+    MISSED_STARTUP: "程式啟動時已超過打卡時間",
+    MISSED_CLOCK_JUMP: "系統休眠或時鐘調整",
+    MISSED_LATE: "排程延遲",
+}
+
+
+def parse_hhmm(time_str):
+    """將 HH:MM 轉為距午夜的秒數"""
+    parsed = datetime.strptime(time_str, '%H:%M')
+    return parsed.hour * 3600 + parsed.minute * 60
+
+
+class PunchSpec:
+    """單一打卡 (上班或下班) 的設定，時間字串只在設定變更時解析一次"""
+    __slots__ = ('mode', 'exact', 'start', 'end')
+
+    def __init__(self, mode, exact_time, start_time, end_time):
+        self.mode = mode
+        self.exact = parse_hhmm(exact_time)
+        self.start = parse_hhmm(start_time)
+        self.end = parse_hhmm(end_time)
+        if self.end < self.start:
+            raise ValueError(f"隨機區間結束時間早於開始時間: {start_time} ~ {end_time}")
+
+
+class DayPlan:
+    """單日打卡計畫
+
+    觸發時間與截止時間以 epoch 整數秒保存，
+    排程觸發時只需整數比較即可判斷是否仍在容許範圍內。
+    """
+    __slots__ = ('day', 'modes', 'targets', 'deadlines', 'executed', 'missed')
+
+    def __init__(self, day, modes, targets, deadlines, executed=None, missed=None):
+        self.day = day
+        self.modes = modes
+        self.targets = targets
+        self.deadlines = deadlines
+        self.executed = executed if executed is not None else [False, False]
+        self.missed = missed if missed is not None else [False, False]
+
+    @classmethod
+    def compile(cls, day, specs, previous=None, rng=random, seed=None):
+        """依打卡設定編譯指定日期的計畫
+
+        previous 為同一天的舊計畫時保留已執行狀態 (例如儲存設定後重新編譯)。
+        seed 為設定檔種子 (punch_planner.profile_seed) 時，隨機時間只由種子與日期決定，
+        重新啟動後仍相同；否則使用 rng。
+        """
+        midnight = int(datetime.combine(day, dt_time.min).timestamp())
+        ordinal = day.toordinal()
+        modes = []
+        targets = []
+        deadlines = []
+        for index, spec in enumerate(specs):
+            if spec.mode == "random":
+                if seed is not None:
+                    offset = seeded_offset(seed, ordinal, index, spec.start, spec.end)
+                else:
+                    offset = spec.start + rng.randint(0, spec.end - spec.start)
+                tolerance = RANDOM_TOLERANCE
+            else:
+                offset = spec.exact
+                tolerance = EXACT_TOLERANCE
+            target = midnight + offset
+            modes.append(spec.mode)
+            targets.append(target)
+            deadlines.append(target + tolerance)
+
+        executed = None
+        missed = None
+        if previous is not None and previous.day == day:
+            executed = list(previous.executed)
+            missed = list(previous.missed)
+        return cls(day, tuple(modes), targets, deadlines, executed, missed)
+
+    def fire_time(self, index, now):
+        """取得排程觸發時間，已執行或已錯過容許範圍時回傳 None"""
+        if self.executed[index] or now > self.deadlines[index]:
+            return None
+        return max(self.targets[index], now)
+
+    def is_due(self, index, now):
+        """是否已到觸發時間且仍在容許範圍內"""
+        return not self.executed[index] and self.targets[index] <= now <= self.deadlines[index]
+
+    def is_missed(self, index, now):
+        """是否已超過容許範圍仍未執行 (且尚未處理過)"""
+        return not self.executed[index] and not self.missed[index] and now > self.deadlines[index]
+
+    def mark_executed(self, index):
+        self.executed[index] = True
+
+    def mark_missed(self, index):
+        self.missed[index] = True
+
+    def extend_deadline(self, index, deadline):
+        """補打時延長容許範圍 (保留原目標時間，延遲仍會反映在指標中)"""
+        self.deadlines[index] = deadline
+
+    def retarget(self, index, target, tolerance):
+        """重新抽時間時改變觸發時間與容許範圍"""
+        self.targets[index] = target
+        self.deadlines[index] = target + tolerance
+
+    def target_datetime(self, index):
+        return datetime.fromtimestamp(self.targets[index])
+
+    def describe(self, index):
+        """狀態面板顯示用的文字"""
+        label = PUNCH_TYPES[index]
+        if self.executed[index]:
+            return f"{label}: 已完成"
+        if self.missed[index]:
+            return f"{label}: 已錯過 (未補打)"
+        target = datetime.fromtimestamp(self.targets[index]).strftime('%H:%M:%S')
+        deadline = datetime.fromtimestamp(self.deadlines[index]).strftime('%H:%M:%S')
+        mode = "精確" if self.modes[index] == "exact" else "隨機"
+        return f"{label}: 等待 ({target}, {mode}, 容許至 {deadline})"
+
+    def __repr__(self):
+        return (f"DayPlan({self.day}, targets={self.targets}, "
+                f"deadlines={self.deadlines}, executed={self.executed})")
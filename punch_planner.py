@@ -0,0 +1,180 @@
+# punch_planner.py - 可重現的多日打卡時間規劃 (依設定檔固定種子，可一次向量化計算 N 個設定檔 × D 天)
+import hashlib
+import sys
+from array import array
+from datetime import datetime, date, timedelta, time as dt_time
+from functools import lru_cache
+
+from punch_calendar import load_numpy
+
+# 預設規劃種子 (設定為私密字串後，只有知道種子的人能推算隨機打卡時間)
+DEFAULT_PLAN_SEED = ""
+
+# 超過此格數 (設定檔數 × 天數) 才載入 numpy 向量化計算
+VECTORIZE_MIN_CELLS = 20000
+
+_MASK = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+
+
+@lru_cache(maxsize=65536)
+def profile_seed(profile_id, secret=DEFAULT_PLAN_SEED):
+    """設定檔的 64 位元種子 (不使用 hash()，每次啟動都相同)"""
+    digest = hashlib.blake2b(f"{secret}\0{profile_id}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def seeded_value(seed, day_ordinal, index):
+    """以 SplitMix64 計算 (種子, 日期, 上/下班) 對應的 64 位元亂數
+
+    只依輸入計算，不保存狀態：同一天重新啟動後得到相同的時間，
+    任一天也可單獨驗算，並能以 numpy 對整個矩陣一次計算。
+    """
+    z = (seed + (day_ordinal * 2 + index + 1) * _GOLDEN) & _MASK
+    z = ((z ^ (z >> 30)) * _MIX1) & _MASK
+    z = ((z ^ (z >> 27)) * _MIX2) & _MASK
+    return z ^ (z >> 31)
+
+
+def seeded_offset(seed, day_ordinal, index, start, end):
+    """在 [start, end] 秒 (含頭尾) 中依種子取一個時間"""
+    return start + seeded_value(seed, day_ordinal, index) % (end - start + 1)
+
+
+def catch_up_delay(seed, day_ordinal, index, span):
+    """錯過打卡後重新排程的延後秒數 ([0, span])，同樣只由種子與日期決定
+
+    以當天計畫的亂數再混合一次，與原本的打卡時間互不相關。
+    """
+    return seeded_value(seeded_value(seed, day_ordinal, index), day_ordinal, index) % (span + 1)
+
+
+def _seeded_values_vectorized(np, seeds, ordinals, index):
+    """seeded_value 的 numpy 版本，回傳 (設定檔數, 天數) 的 uint64 陣列"""
+    counters = (ordinals.astype(np.uint64) * np.uint64(2) + np.uint64(index + 1)) * np.uint64(_GOLDEN)
+    z = seeds[:, None] + counters[None, :]
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+    return z ^ (z >> np.uint64(31))
+
+
+class PlanMatrix:
+    """多日打卡計畫
+
+    只保存每個設定檔每天上下班距離午夜的秒數 (int32)，
+    一萬個設定檔 × 30 天約 2.4 MB；需要時才換算為 epoch 秒。
+    """
+
+    def __init__(self, profile_ids, first_day, days, offsets, np=None):
+        self.profile_ids = list(profile_ids)
+        self.rows = {profile_id: row for row, profile_id in enumerate(self.profile_ids)}
+        self.first_day = first_day
+        self.days = days
+        self.offsets = offsets  # numpy (設定檔, 天, 2) 或扁平的 array('i')
+        self._np = np
+
+    def __len__(self):
+        return len(self.profile_ids)
+
+    @property
+    def nbytes(self):
+        if self._np is not None:
+            return self.offsets.nbytes
+        return len(self.offsets) * self.offsets.itemsize
+
+    def offset(self, profile_id, day, index):
+        """指定設定檔與日期的打卡時間 (距離午夜的秒數)"""
+        row = self.rows[profile_id]
+        column = day.toordinal() - self.first_day.toordinal()
+        if not 0 <= column < self.days:
+            raise ValueError(f"日期超出規劃範圍: {day}")
+        if self._np is not None:
+            return int(self.offsets[row, column, index])
+        return self.offsets[(row * self.days + column) * 2 + index]
+
+    def target(self, profile_id, day, index):
+        """指定設定檔與日期的打卡時間 (epoch 秒)"""
+        midnight = int(datetime.combine(day, dt_time.min).timestamp())
+        return midnight + self.offset(profile_id, day, index)
+
+    def iter_rows(self):
+        """依設定檔、日期列出 (profile_id, date, 上班 HH:MM:SS, 下班 HH:MM:SS)，供匯出與稽核"""
+        for profile_id in self.profile_ids:
+            for column in range(self.days):
+                day = self.first_day + timedelta(days=column)
+                yield (profile_id, day, _format_offset(self.offset(profile_id, day, 0)),
+                       _format_offset(self.offset(profile_id, day, 1)))
+
+
+def _format_offset(seconds):
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def plan_range(profile_ids, specs_list, first_day=None, days=30, secret=DEFAULT_PLAN_SEED):
+    """一次計算多個設定檔未來多天的打卡時間
+
+    specs_list 為各設定檔的 (上班 PunchSpec, 下班 PunchSpec)。
+    結果與 DayPlan.compile(..., seed=profile_seed(...)) 逐日計算的時間完全相同。
+    """
+    if first_day is None:
+        first_day = date.today()
+    profile_ids = list(profile_ids)
+    seeds = [profile_seed(profile_id, secret) for profile_id in profile_ids]
+
+    np = None
+    if len(profile_ids) * days >= VECTORIZE_MIN_CELLS or 'numpy' in sys.modules:
+        np = load_numpy()
+
+    if np is not None:
+        offsets = _plan_vectorized(np, seeds, specs_list, first_day, days)
+    else:
+        offsets = _plan_python(seeds, specs_list, first_day, days)
+    return PlanMatrix(profile_ids, first_day, days, offsets, np)
+
+
+def _plan_vectorized(np, seeds, specs_list, first_day, days):
+    seeds = np.array(seeds, dtype=np.uint64)
+    ordinals = np.arange(first_day.toordinal(), first_day.toordinal() + days, dtype=np.int64)
+
+    # 設定檔共用 punch_profiles.intern_spec 產生的 PunchSpec，先整理成小表再以索引展開
+    pair_codes = {}
+    pairs = []
+    codes = []
+    for pair in specs_list:
+        key = (id(pair[0]), id(pair[1]))
+        code = pair_codes.get(key)
+        if code is None:
+            code = pair_codes[key] = len(pairs)
+            pairs.append(pair)
+        codes.append(code)
+    codes = np.array(codes, dtype=np.intp)
+
+    offsets = np.empty((len(seeds), days, 2), dtype=np.int32)
+    for index in (0, 1):
+        specs = [pair[index] for pair in pairs]
+        random_mode = np.array([spec.mode == "random" for spec in specs], dtype=bool)[codes]
+        start = np.array([spec.start for spec in specs], dtype=np.uint64)[codes]
+        width = np.array([spec.end - spec.start + 1 for spec in specs], dtype=np.uint64)[codes]
+        exact = np.array([spec.exact for spec in specs], dtype=np.int32)[codes]
+
+        values = _seeded_values_vectorized(np, seeds, ordinals, index)
+        randomized = (start[:, None] + values % width[:, None]).astype(np.int32)
+        offsets[:, :, index] = np.where(random_mode[:, None], randomized, exact[:, None])
+    return offsets
+
+
+def _plan_python(seeds, specs_list, first_day, days):
+    offsets = array('i', bytes(len(seeds) * days * 2 * array('i').itemsize))
+    first = first_day.toordinal()
+    position = 0
+    for seed, specs in zip(seeds, specs_list):
+        for ordinal in range(first, first + days):
+            for index, spec in enumerate(specs):
+                if spec.mode == "random":
+                    offsets[position] = seeded_offset(seed, ordinal, index, spec.start, spec.end)
+                else:
+                    offsets[position] = spec.exact
+                position += 1
+    return offsets
@@ -0,0 +1,140 @@
+# punch_profiles.py - 多設定檔 (車隊模式)：精簡的設定檔記錄與設定檔清單熱載入
+import json
+import logging
+import os
+import threading
+
+from punch_plan import PunchSpec
+
+DEFAULT_PROFILE_ID = "default"
+DEFAULT_PROFILES_FILE = ""  # 空字串表示只使用 punch_config.json 的單一設定檔
+DEFAULT_PROFILES_RELOAD_SECONDS = 5
+
+# 每個設定檔可覆寫的欄位，未指定時沿用 punch_config.json 的值
+PROFILE_FIELDS = (
+    'webhook_url',
+    'punch_in_mode', 'punch_in_time', 'punch_in_start', 'punch_in_end',
+    'punch_out_mode', 'punch_out_time', 'punch_out_start', 'punch_out_end',
+    'weekend_mode', 'weekend_start_date',
+)
+
+# 相同的打卡設定共用同一個 PunchSpec，數千個設定檔通常只有少數幾種時間組合
+_spec_cache = {}
+
+
+def intern_spec(mode, exact_time, start_time, end_time):
+    """取得共用的 PunchSpec (時間格式錯誤時拋出 ValueError)"""
+    key = (mode, exact_time, start_time, end_time)
+    spec = _spec_cache.get(key)
+    if spec is None:
+        spec = _spec_cache.setdefault(key, PunchSpec(mode, exact_time, start_time, end_time))
+    return spec
+
+
+class PunchProfile:
+    """單一設定檔 (員工或帳號) 的打卡設定與今日計畫
+
+    只保存識別碼、Webhook、共用的 PunchSpec 與週末設定，
+    每個設定檔約數百位元組，數千個設定檔可放在同一個程序中。
+    """
+    __slots__ = ('profile_id', 'webhook_url', 'specs', 'weekend_mode', 'weekend_start_date', 'plan')
+
+    def __init__(self, profile_id, webhook_url, specs, weekend_mode='small', weekend_start_date=None):
+        self.profile_id = profile_id
+        self.webhook_url = webhook_url
+        self.specs = specs  # (上班 PunchSpec, 下班 PunchSpec)
+        self.weekend_mode = weekend_mode
+        self.weekend_start_date = weekend_start_date
+        self.plan = None  # 今日 DayPlan
+
+    @classmethod
+    def from_dict(cls, data, defaults):
+        """由設定檔清單中的一筆資料建立，缺少的欄位使用 defaults"""
+        profile_id = data.get('profile_id')
+        if not profile_id:
+            raise ValueError("設定檔缺少 profile_id")
+        values = {key: data.get(key, defaults.get(key)) for key in PROFILE_FIELDS}
+        specs = (
+            intern_spec(values['punch_in_mode'], values['punch_in_time'],
+                        values['punch_in_start'], values['punch_in_end']),
+            intern_spec(values['punch_out_mode'], values['punch_out_time'],
+                        values['punch_out_start'], values['punch_out_end']),
+        )
+        return cls(str(profile_id), values['webhook_url'] or '', specs,
+                   values['weekend_mode'] or 'small', values['weekend_start_date'])
+
+    def same_settings(self, other):
+        """設定是否相同 (PunchSpec 為共用物件，可直接比較身分)"""
+        return (self.webhook_url == other.webhook_url
+                and self.specs[0] is other.specs[0] and self.specs[1] is other.specs[1]
+                and self.weekend_mode == other.weekend_mode
+                and self.weekend_start_date == other.weekend_start_date)
+
+    def __repr__(self):
+        return f"PunchProfile({self.profile_id!r})"
+
+
+def load_profiles_file(path):
+    """讀取設定檔清單，格式為 JSON 陣列或 {"profiles": [...]}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('profiles', [])
+    if not isinstance(data, list):
+        raise ValueError("設定檔清單格式錯誤，需為 JSON 陣列")
+    return data
+
+
+class ProfilesWatcher:
+    """定期檢查設定檔清單的修改時間，變更時重新載入 (新增或移除設定檔不需重新啟動)"""
+
+    def __init__(self, path, on_reload, interval=DEFAULT_PROFILES_RELOAD_SECONDS, logger=None):
+        self.path = path
+        self.on_reload = on_reload
+        self.interval = interval
+        self.logger = logger or logging.getLogger('PunchCardApp')
+        self._signature = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """檔案有變更時載入並呼叫 on_reload，回傳是否已重新載入"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            if self._signature is not None:
+                self.logger.warning(f"找不到設定檔清單: {self.path}")
+                self._signature = None
+            return False
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return False
+        try:
+            entries = load_profiles_file(self.path)
+        except (OSError, ValueError) as e:
+            # 可能是寫入到一半，下次檢查時再試
+            self.logger.error(f"讀取設定檔清單失敗: {e}")
+            return False
+        self._signature = signature
+        self.on_reload(entries)
+        return True
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ProfilesWatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=2):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.error(f"重新載入設定檔清單失敗: {e}")
@@ -0,0 +1,156 @@
+# punch_ratelimit.py - 依 Webhook 主機的權杖桶限流，遵守 Retry-After
+import threading
+import time
+from datetime import timezone
+from urllib.parse import urlsplit
+
+# 0 表示不限制發送速率 (仍會遵守 Retry-After)
+DEFAULT_RATE_LIMIT_PER_SECOND = 0
+DEFAULT_RATE_LIMIT_BURST = 10
+
+# 429/503 沒有 Retry-After 時暫停的秒數
+DEFAULT_RETRY_AFTER = 1
+# Retry-After 上限，避免錯誤的標頭讓打卡停擺過久
+MAX_RETRY_AFTER = 300
+
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def host_key(url):
+    return urlsplit(url).netloc
+
+
+def parse_retry_after(value, now=None):
+    """解析 Retry-After (秒數或 HTTP 日期)，回傳需等待的秒數，無法解析時回傳 None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    # HTTP 日期格式很少見，需要時才載入 email.utils
+    from email.utils import parsedate_to_datetime
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now if now is not None else time.time()
+    return max(0.0, when.timestamp() - now)
+
+
+class TokenBucket:
+    """單一主機的權杖桶 (預約制)
+
+    權杖不足時不拒絕，而是回傳要等多久才輪到這一筆，並預先扣除權杖，
+    同時到期的大量打卡會依速率排成等間隔的時間點。
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'updated', 'throttled')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = now  # tokens 為此時間點的權杖數，Retry-After 暫停時為未來時間
+        self.throttled = 0  # 被延後的打卡數
+
+    def _refill(self, now):
+        if now > self.updated:
+            if self.rate > 0:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self, now):
+        """預約一個權杖，回傳需等待的秒數"""
+        if self.rate <= 0:
+            delay = max(0.0, self.updated - now)
+        else:
+            self._refill(now)
+            self.tokens -= 1
+            delay = (self.updated - now) + max(0.0, -self.tokens) / self.rate
+        if delay > 0:
+            self.throttled += 1
+        return delay
+
+    def peek(self, now):
+        """下一個權杖可用前需等待的秒數 (不預約權杖)"""
+        if self.rate <= 0:
+            return max(0.0, self.updated - now)
+        self._refill(now)
+        return max(0.0, (self.updated - now) + max(0.0, 1 - self.tokens) / self.rate)
+
+    def pause(self, until, now):
+        """收到 Retry-After 時，until 之前不發放權杖"""
+        self._refill(now)
+        if until > self.updated:
+            self.updated = until
+            self.tokens = min(self.tokens, 0.0)
+
+    def backlog(self, now):
+        """目前已預約到未來的秒數"""
+        if self.rate <= 0:
+            return max(0.0, self.updated - now)
+        return max(0.0, (self.updated - now) + max(0.0, -self.tokens) / self.rate)
+
+
+class HostRateLimiter:
+    """依 Webhook 主機分開的限流器"""
+
+    def __init__(self, rate=DEFAULT_RATE_LIMIT_PER_SECOND, burst=DEFAULT_RATE_LIMIT_BURST, clock=time.time):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host, now):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.rate, self.burst, now)
+        return bucket
+
+    def reserve(self, url):
+        """預約發送到 url 的權杖，回傳需延後的秒數 (0 表示可立即發送)"""
+        now = self.clock()
+        with self._lock:
+            return self._bucket(host_key(url), now).reserve(now)
+
+    def delay(self, url):
+        """發送到 url 前需等待的秒數，不預約權杖 (重試佇列排定時間用)"""
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(host_key(url))
+            return bucket.peek(now) if bucket is not None else 0.0
+
+    def observe(self, url, response):
+        """依回應調整限流：429/503 時依 Retry-After 暫停該主機，回傳暫停秒數"""
+        if response is None or response.status_code not in THROTTLE_STATUS_CODES:
+            return 0.0
+        now = self.clock()
+        headers = getattr(response, 'headers', None) or {}
+        retry_after = parse_retry_after(headers.get('retry-after') or headers.get('Retry-After'), now)
+        if retry_after is None:
+            if response.status_code == 503:
+                return 0.0
+            retry_after = DEFAULT_RETRY_AFTER
+        retry_after = min(retry_after, MAX_RETRY_AFTER)
+        with self._lock:
+            self._bucket(host_key(url), now).pause(now + retry_after, now)
+        return retry_after
+
+    def status(self):
+        """各主機目前的延後秒數與累計延後筆數，回傳 [(主機, 延後秒數, 累計筆數), ...]"""
+        now = self.clock()
+        with self._lock:
+            return [(host, bucket.backlog(now), bucket.throttled)
+                    for host, bucket in sorted(self._buckets.items()) if bucket.throttled]
+
+    def __repr__(self):
+        return f"HostRateLimiter(rate={self.rate}, burst={self.burst}, hosts={len(self._buckets)})"
+
+
+def format_delay(seconds):
+    """延後秒數的顯示文字"""
+    if seconds >= 60:
+        return f"{seconds / 60:.1f} 分鐘"
+    return f"{seconds:.1f} 秒"
@@ -0,0 +1,61 @@
+# punch_records.py - 固定容量的打卡記錄環形緩衝區
+import threading
+from collections import deque
+
+DEFAULT_RECORD_CAPACITY = 1000
+
+
+class PunchRecordBuffer:
+    """固定容量的打卡記錄
+
+    超過容量時自動捨棄最舊的記錄，記憶體用量固定。
+    每筆記錄有遞增的序號，顯示端只需取出上次序號之後的新記錄。
+    """
+
+    def __init__(self, capacity=DEFAULT_RECORD_CAPACITY):
+        self._records = deque(maxlen=capacity)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        return self._records.maxlen
+
+    @property
+    def seq(self):
+        """目前最後一筆記錄的序號 (累計寫入筆數)"""
+        return self._seq
+
+    def append(self, record):
+        """加入一筆記錄，回傳其序號"""
+        with self._lock:
+            self._records.append(record)
+            self._seq += 1
+            return self._seq
+
+    def since(self, seq):
+        """取得序號 seq 之後的新記錄，回傳 (最新序號, 記錄列表)
+
+        若新記錄多於容量，只會回傳仍保留在緩衝區中的部分。
+        """
+        with self._lock:
+            missing = self._seq - seq
+            if missing <= 0:
+                return self._seq, []
+            if missing >= len(self._records):
+                return self._seq, list(self._records)
+            return self._seq, list(self._records)[-missing:]
+
+    def latest(self, count):
+        """取得最近 count 筆記錄"""
+        with self._lock:
+            if count >= len(self._records):
+                return list(self._records)
+            return list(self._records)[-count:]
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._records))
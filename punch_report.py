@@ -0,0 +1,296 @@
+# punch_report.py - 串流分析輪轉日誌 (punch_card.log 與備份)，依日期與打卡類型彙總
+"""
+執行方式:
+    python punch_report.py                          # 彙總 logs/ 下所有日誌
+    python punch_report.py --since 2025-06-01       # 只列出指定日期之後
+    python punch_report.py --json report.json       # 另存為 JSON
+    python punch_report.py --no-cache               # 不使用偏移索引，重新解析全部日誌
+
+日誌以 mmap 逐行讀取，記憶體用量只與天數有關，與日誌大小無關。
+每個日誌檔已解析到的位置與彙總結果記錄在 logs/punch_report_index.json，
+日誌輪轉後檔名改變也能依檔案開頭辨識，再次執行時只解析新寫入的部分。
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+from datetime import datetime
+
+from punch_logging import LOG_DIR, LOG_FILE
+from punch_plan import PUNCH_TYPES
+
+INDEX_FILE = os.path.join(LOG_DIR, 'punch_report_index.json')
+# 解析規則變更時遞增，舊索引中的彙總結果會被捨棄並重新解析
+INDEX_VERSION = 2
+
+# 檔案開頭用來辨識日誌檔的位元組數 (第一行含毫秒時間戳，輪轉改名後仍相同)
+FINGERPRINT_BYTES = 512
+
+_TYPE = "(" + "|".join(re.escape(punch_type) for punch_type in PUNCH_TYPES) + ")"
+_LABEL = r"(?:\[[^\]]+\] )?"
+
+# setup_logging 的文字格式: 2025-06-10 09:00:01,234 - INFO - 訊息
+TEXT_LINE = re.compile(r'^(\d{4}-\d{2}-\d{2}) (\d{2}):\d{2}:\d{2},\d{3} - (\w+) - (.*)$')
+
+MESSAGE_PATTERNS = (
+    ("success", re.compile(rf'^(?:自動|手動)打卡成功: {_LABEL}{_TYPE}(?:, 狀態碼: (\d+))?')),
+    ("failed", re.compile(rf'^(?:自動|手動)打卡失敗: {_LABEL}{_TYPE}(?:, 狀態碼: ([^,\s]+))?')),
+    ("errors", re.compile(rf'^自動打卡時發生異常: {_LABEL}{_TYPE}')),
+    ("fired", re.compile(rf'^觸發{_LABEL}{_TYPE}時間: \S+, 延遲: (-?[\d.]+) 秒')),
+    ("retry_success", re.compile(rf'^重試打卡成功: {_TYPE}')),
+    ("dead_letter", re.compile(rf'^放棄重試打卡: {_TYPE}')),
+    ("missed", re.compile(rf'^{_LABEL}錯過{_TYPE}時間')),
+)
+
+COUNTERS = ("fired", "success", "failed", "errors", "missed", "retry_success", "dead_letter")
+
+
+class TypeStats:
+    """單日單一打卡類型的彙總"""
+    __slots__ = COUNTERS + ('status_codes', 'lag_sum', 'lag_max', 'failure_hours')
+
+    def __init__(self):
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self.status_codes = {}
+        self.lag_sum = 0.0
+        self.lag_max = 0.0
+        self.failure_hours = [0] * 24
+
+    def merge(self, other):
+        for name in COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for code, count in other.status_codes.items():
+            self.status_codes[code] = self.status_codes.get(code, 0) + count
+        self.lag_sum += other.lag_sum
+        self.lag_max = max(self.lag_max, other.lag_max)
+        self.failure_hours = [a + b for a, b in zip(self.failure_hours, other.failure_hours)]
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in COUNTERS}
+        data.update(status_codes=self.status_codes, lag_sum=round(self.lag_sum, 3),
+                    lag_max=self.lag_max, failure_hours=self.failure_hours)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for name in COUNTERS:
+            setattr(stats, name, data.get(name, 0))
+        stats.status_codes = dict(data.get('status_codes', {}))
+        stats.lag_sum = data.get('lag_sum', 0.0)
+        stats.lag_max = data.get('lag_max', 0.0)
+        stats.failure_hours = list(data.get('failure_hours', [0] * 24))
+        return stats
+
+
+class LogStats:
+    """依 (日期, 打卡類型) 累計的日誌統計"""
+
+    def __init__(self):
+        self.days = {}  # 'YYYY-MM-DD' -> {打卡類型: TypeStats}
+
+    def _stats(self, day, punch_type):
+        types = self.days.get(day)
+        if types is None:
+            types = self.days[day] = {}
+        stats = types.get(punch_type)
+        if stats is None:
+            stats = types[punch_type] = TypeStats()
+        return stats
+
+    def add_line(self, line):
+        """解析一行日誌 (文字或 JSON-lines 格式)，無關的行直接略過"""
+        if line.startswith('{'):
+            try:
+                entry = json.loads(line)
+                timestamp = entry['time']
+                message = entry['message']
+            except (ValueError, KeyError, TypeError):
+                return
+            day, hour = timestamp[:10], int(timestamp[11:13] or 0)
+        else:
+            match = TEXT_LINE.match(line)
+            if match is None:
+                return
+            day, hour, message = match.group(1), int(match.group(2)), match.group(4)
+        self.add_message(day, hour, message)
+
+    def add_message(self, day, hour, message):
+        for kind, pattern in MESSAGE_PATTERNS:
+            match = pattern.match(message)
+            if match is None:
+                continue
+            stats = self._stats(day, match.group(1))
+            setattr(stats, kind, getattr(stats, kind) + 1)
+            if kind == "fired":
+                lag = float(match.group(2))
+                stats.lag_sum += lag
+                stats.lag_max = max(stats.lag_max, lag)
+            elif kind in ("success", "failed"):
+                code = match.group(2) or "無"
+                stats.status_codes[code] = stats.status_codes.get(code, 0) + 1
+            if kind in ("failed", "errors", "dead_letter"):
+                stats.failure_hours[hour] += 1
+            return
+
+    def merge(self, other):
+        for day, types in other.days.items():
+            for punch_type, stats in types.items():
+                self._stats(day, punch_type).merge(stats)
+
+    def to_dict(self):
+        return {day: {punch_type: stats.to_dict() for punch_type, stats in types.items()}
+                for day, types in self.days.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        result = cls()
+        for day, types in data.items():
+            result.days[day] = {punch_type: TypeStats.from_dict(stats) for punch_type, stats in types.items()}
+        return result
+
+
+def log_files(log_file=LOG_FILE):
+    """列出目前的日誌與輪轉備份 (由舊到新)"""
+    directory = os.path.dirname(log_file) or '.'
+    base = os.path.basename(log_file)
+    backups = []
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            suffix = name[len(base) + 1:]
+            if name.startswith(base + '.') and suffix.isdigit():
+                backups.append((int(suffix), os.path.join(directory, name)))
+    files = [path for _, path in sorted(backups, reverse=True)]
+    if os.path.exists(log_file):
+        files.append(log_file)
+    return files
+
+
+def fingerprint(path):
+    """以檔案開頭辨識日誌檔 (輪轉只改檔名，內容開頭不變)，開頭不足一行時回傳 None"""
+    with open(path, 'rb') as f:
+        head = f.read(FINGERPRINT_BYTES)
+    if b'\n' not in head:
+        return None
+    return hashlib.sha1(head[:head.index(b'\n') + 1]).hexdigest()
+
+
+def scan(path, start, stats):
+    """從 start 位元組開始以 mmap 逐行解析，回傳最後一個完整行之後的位置"""
+    size = os.path.getsize(path)
+    if size <= start:
+        return start
+    position = start
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        while True:
+            end = mm.find(b'\n', position)
+            if end < 0:
+                # 最後一行尚未寫完，下次再解析
+                break
+            stats.add_line(mm[position:end].decode('utf-8', 'replace').rstrip('\r'))
+            position = end + 1
+    return position
+
+
+def load_index(path=INDEX_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if index.get('version') != INDEX_VERSION:
+        return {}
+    return index.get('files', {})
+
+
+def save_index(files, path=INDEX_FILE):
+    temp = path + '.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump({'version': INDEX_VERSION, 'files': files}, f, ensure_ascii=False)
+    os.replace(temp, path)
+
+
+def build_report(log_file=LOG_FILE, index_file=INDEX_FILE, use_cache=True):
+    """彙總所有日誌檔，回傳 (LogStats, 本次新解析的位元組數)"""
+    cached = load_index(index_file) if use_cache else {}
+    files = {}
+    total = LogStats()
+    parsed_bytes = 0
+
+    for path in log_files(log_file):
+        key = fingerprint(path)
+        entry = cached.get(key) if key is not None else None
+        if entry is not None and entry['offset'] <= os.path.getsize(path):
+            stats = LogStats.from_dict(entry['stats'])
+            offset = entry['offset']
+        else:
+            stats = LogStats()
+            offset = 0
+
+        end = scan(path, offset, stats)
+        parsed_bytes += end - offset
+        total.merge(stats)
+        if key is not None:
+            files[key] = {'offset': end, 'stats': stats.to_dict()}
+
+    # 只保留仍存在的日誌檔 (超過備份數量而刪除的檔案不再記錄)
+    if use_cache:
+        try:
+            save_index(files, index_file)
+        except OSError as e:
+            print(f"無法寫入偏移索引: {e}", file=sys.stderr)
+    return total, parsed_bytes
+
+
+def format_report(stats, since=None, until=None):
+    """輸出依日期與打卡類型排列的文字報表"""
+    lines = [f"{'日期':<10}  {'類型':<6} {'觸發':>4} {'成功':>4} {'失敗':>4} {'異常':>4} {'錯過':>4} "
+             f"{'重試成功':>6} {'放棄':>4}  {'平均延遲':>8} {'最大延遲':>8}  狀態碼 / 失敗時段"]
+    for day in sorted(stats.days):
+        if (since and day < since) or (until and day > until):
+            continue
+        for punch_type in sorted(stats.days[day], key=lambda t: PUNCH_TYPES.index(t)):
+            s = stats.days[day][punch_type]
+            average = f"{s.lag_sum / s.fired:.3f}s" if s.fired else "-"
+            maximum = f"{s.lag_max:.3f}s" if s.fired else "-"
+            codes = ", ".join(f"{code}×{count}" for code, count in sorted(s.status_codes.items()))
+            hours = ", ".join(f"{hour:02d}時×{count}" for hour, count in enumerate(s.failure_hours) if count)
+            detail = " / ".join(part for part in (codes, hours) if part)
+            lines.append(f"{day:<10}  {punch_type:<6} {s.fired:>4} {s.success:>4} {s.failed:>4} {s.errors:>4} "
+                         f"{s.missed:>4} {s.retry_success:>6} {s.dead_letter:>4}  {average:>8} {maximum:>8}  "
+                         f"{detail}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="打卡日誌彙總報表")
+    parser.add_argument('--log-file', default=LOG_FILE, help="日誌檔路徑 (備份為同名加 .1、.2 ...)")
+    parser.add_argument('--since', help="起始日期 YYYY-MM-DD")
+    parser.add_argument('--until', help="結束日期 YYYY-MM-DD")
+    parser.add_argument('--json', dest='json_output', help="另存彙總結果為 JSON")
+    parser.add_argument('--no-cache', action='store_true', help="不使用偏移索引，重新解析全部日誌")
+    args = parser.parse_args()
+
+    for value in (args.since, args.until):
+        if value:
+            datetime.strptime(value, '%Y-%m-%d')
+
+    index_file = os.path.join(os.path.dirname(args.log_file) or '.', os.path.basename(INDEX_FILE))
+    stats, parsed_bytes = build_report(args.log_file, index_file, use_cache=not args.no_cache)
+    print(format_report(stats, args.since, args.until))
+    print(f"\n本次解析 {parsed_bytes:,} 位元組")
+
+    if args.json_output:
+        data = {day: types for day, types in stats.to_dict().items()
+                if not ((args.since and day < args.since) or (args.until and day > args.until))}
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"結果已寫入 {args.json_output}")
+
+
+if __name__ == "__main__":
+    main()
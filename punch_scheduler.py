@@ -0,0 +1,220 @@
+# punch_scheduler.py - 以最小堆實作的多設定檔打卡排程引擎
+import heapq
+import itertools
+import logging
+import threading
+
+from punch_clock import SYSTEM_CLOCK
+
+# 跨日重新排程用的特殊事件類型
+DAY_ROLLOVER = "跨日重新排程"
+
+# 事件到期時的處理結果 (on_fire 的回傳值，模擬時據此統計)
+FIRE_EXECUTED = "executed"  # 已觸發打卡
+FIRE_THROTTLED = "throttled"  # 因限流延後
+FIRE_MISSED = "missed"  # 超過容許範圍，交由補救策略處理
+FIRE_SKIPPED = "skipped"  # 自動打卡停用、已執行或設定檔已移除
+FIRE_ROLLOVER = "rollover"  # 跨日重新排程
+
+# 牆上時鐘與單調時鐘的差距超過此秒數即視為時鐘跳動 (休眠喚醒或手動調整時間)
+CLOCK_JUMP_THRESHOLD = 5
+# 單次最長睡眠秒數：休眠期間單調時鐘可能不前進，需定期醒來檢查牆上時鐘
+MAX_SLEEP = 30
+
+
+class ScheduledPunch:
+    """排程中的單筆打卡事件"""
+    __slots__ = ('fire_at', 'seq', 'profile_id', 'punch_type', 'cancelled', 'reserved')
+
+    def __init__(self, fire_at, seq, profile_id, punch_type, reserved=False):
+        self.fire_at = fire_at  # 觸發時間 (epoch 秒)
+        self.seq = seq  # 同時間事件依加入順序觸發
+        self.profile_id = profile_id
+        self.punch_type = punch_type
+        self.cancelled = False
+        self.reserved = reserved  # 已因限流延後並預約發送權杖
+
+    def __lt__(self, other):
+        if self.fire_at != other.fire_at:
+            return self.fire_at < other.fire_at
+        return self.seq < other.seq
+
+    def __repr__(self):
+        return f"ScheduledPunch({self.profile_id!r}, {self.punch_type!r}, fire_at={self.fire_at:.3f})"
+
+
+class PunchScheduler:
+    """無介面的排程核心
+
+    所有設定檔的待執行打卡都放在同一個依觸發時間排序的最小堆中，
+    背景執行緒只會睡到下一筆事件到期為止，每次觸發的成本為 O(log n)。
+    """
+
+    def __init__(self, on_fire, logger=None, on_clock_jump=None, clock=SYSTEM_CLOCK):
+        self.on_fire = on_fire
+        self.on_clock_jump = on_clock_jump  # on_clock_jump(秒數)，正值為時間往前跳
+        self.logger = logger or logging.getLogger('PunchCardApp')
+        self.clock = clock
+
+        self._heap = []
+        self._by_profile = {}  # profile_id -> 該設定檔尚未觸發的事件
+        self._cancelled_count = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """啟動排程執行緒"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="PunchScheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        """停止排程執行緒"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running
+
+    def schedule(self, profile_id, punch_type, fire_at, reserved=False):
+        """加入一筆打卡事件，fire_at 為 epoch 秒"""
+        with self._cond:
+            event = ScheduledPunch(fire_at, next(self._seq), profile_id, punch_type, reserved)
+            heapq.heappush(self._heap, event)
+            self._by_profile.setdefault(profile_id, set()).add(event)
+            # 只有新事件成為最早到期者時才需要喚醒排程執行緒
+            if self._heap[0] is event:
+                self._cond.notify()
+            return event
+
+    def cancel(self, event):
+        """取消單筆事件 (延遲刪除)"""
+        with self._cond:
+            self._cancel_locked(event)
+
+    def cancel_profile(self, profile_id):
+        """取消指定設定檔所有尚未觸發的事件"""
+        with self._cond:
+            for event in list(self._by_profile.get(profile_id, ())):
+                self._cancel_locked(event)
+
+    def pending(self, profile_id=None):
+        """取得尚未觸發的事件 (依觸發時間排序)"""
+        with self._cond:
+            if profile_id is None:
+                events = [e for e in self._heap if not e.cancelled]
+            else:
+                events = list(self._by_profile.get(profile_id, ()))
+        return sorted(events)
+
+    def next_fire_time(self):
+        """最早到期事件的觸發時間，沒有事件時回傳 None"""
+        with self._cond:
+            self._drop_cancelled_head()
+            return self._heap[0].fire_at if self._heap else None
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap) - self._cancelled_count
+
+    def fire_due(self, now=None):
+        """在呼叫端執行緒中觸發所有已到期的事件，回傳觸發數 (虛擬時鐘模擬使用，不需啟動排程執行緒)"""
+        with self._cond:
+            due = self._pop_due(self.clock.time() if now is None else now)
+        self._fire(due)
+        return len(due)
+
+    def _cancel_locked(self, event):
+        if event.cancelled:
+            return
+        event.cancelled = True
+        self._cancelled_count += 1
+        self._forget(event)
+
+        # 已取消事件過多時重建堆積，避免記憶體與比較成本累積
+        if self._cancelled_count > 64 and self._cancelled_count * 2 > len(self._heap):
+            self._heap = [e for e in self._heap if not e.cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled_count = 0
+        self._cond.notify()
+
+    def _forget(self, event):
+        events = self._by_profile.get(event.profile_id)
+        if events is not None:
+            events.discard(event)
+            if not events:
+                del self._by_profile[event.profile_id]
+
+    def _drop_cancelled_head(self):
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+            self._cancelled_count -= 1
+
+    def _pop_due(self, now):
+        """取出所有已到期的事件"""
+        due = []
+        while self._heap and self._heap[0].fire_at <= now:
+            event = heapq.heappop(self._heap)
+            if event.cancelled:
+                self._cancelled_count -= 1
+                continue
+            self._forget(event)
+            due.append(event)
+        return due
+
+    def _run(self):
+        """排程主迴圈：睡到下一筆事件到期後一次取出所有到期事件
+
+        每次醒來比較牆上時鐘與單調時鐘的前進量，差距過大代表系統曾休眠或時間被調整，
+        此時先通知 on_clock_jump (通常會重新排程) 再處理到期事件。
+        """
+        clock = self.clock
+        last_wall, last_mono = clock.time(), clock.monotonic()
+        while True:
+            jump = None
+            with self._cond:
+                while self._running:
+                    wall, mono = clock.time(), clock.monotonic()
+                    drift = (wall - last_wall) - (mono - last_mono)
+                    last_wall, last_mono = wall, mono
+                    if abs(drift) >= CLOCK_JUMP_THRESHOLD:
+                        jump = drift
+                        break
+
+                    self._drop_cancelled_head()
+                    delay = self._heap[0].fire_at - wall if self._heap else MAX_SLEEP
+                    if delay <= 0:
+                        break
+                    self._cond.wait(min(delay, MAX_SLEEP))
+                if not self._running:
+                    return
+                due = self._pop_due(clock.time()) if jump is None else []
+
+            if jump is not None:
+                self.logger.warning(f"偵測到系統時鐘跳動 {jump:+.1f} 秒 (休眠喚醒或時間調整)")
+                if self.on_clock_jump is not None:
+                    try:
+                        self.on_clock_jump(jump)
+                    except Exception as e:
+                        self.logger.error(f"處理時鐘跳動失敗: {e}")
+                continue
+
+            # 回呼在鎖外執行，避免阻塞新事件的加入
+            self._fire(due)
+
+    def _fire(self, due):
+        for event in due:
+            try:
+                self.on_fire(event)
+            except Exception as e:
+                self.logger.error(f"執行排程事件失敗: {event}, 錯誤: {e}")
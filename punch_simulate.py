@@ -0,0 +1,366 @@
+# punch_simulate.py - 以虛擬時鐘驅動真實排程核心，數秒內模擬數月的打卡決策
+"""
+執行方式:
+    python punch_simulate.py --days 180                          # 從今天起模擬 180 天 (事件驅動，直接跳到下一筆事件)
+    python punch_simulate.py --start 2025-01-01 --days 365 --tick 1
+                                                                 # 每秒一個 tick，量測每個 tick 的成本
+    python punch_simulate.py --days 30 --tick 1 --status-every 1 # 每個 tick 同時組合狀態面板文字 (相當於介面每秒重繪)
+    python punch_simulate.py --failure-rate 0.05 --events events.csv --output summary.json
+
+模擬在暫存目錄中執行 (複製設定檔後改用暫存的帳本與日誌)，不會影響正式資料；
+Webhook 由 SimulatedWebhookClient 立即回應，不會連線到任何端點。
+"""
+import argparse
+import bisect
+import csv
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from punch_clock import VirtualClock
+from punch_engine import PunchEngine
+from punch_ledger import PunchLedger
+from punch_metrics import TICK_BUCKETS
+from punch_plan import PUNCH_TYPES
+from punch_profiles import load_profiles_file
+from punch_scheduler import FIRE_EXECUTED, DAY_ROLLOVER
+
+# 設定檔中需改為絕對路徑的欄位 (模擬在暫存目錄中執行)
+PATH_FIELDS = ('profiles_file',)
+
+
+class SimulatedResponse:
+    """模擬的 Webhook 回應 (與 requests.Response 一樣提供 status_code 與 headers)"""
+    __slots__ = ('status_code', 'headers')
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        raise ValueError("模擬回應沒有本文")
+
+
+class SimulatedWebhookClient:
+    """取代 punch_delivery.WebhookClient：依失敗率立即回應，不連線"""
+
+    def __init__(self, failure_rate=0.0, failure_status=503, rng=None):
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.rng = rng or random.Random(0)
+        self.status_counts = {}
+
+    def post(self, url, payload, timeout=10):
+        status = self.failure_status if self.rng.random() < self.failure_rate else 200
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        return SimulatedResponse(status)
+
+    def close(self):
+        pass
+
+
+class InlineDeliveryPool:
+    """取代 punch_delivery.DeliveryPool：在呼叫端執行緒中立即執行，結果與虛擬時間一致且可重現"""
+
+    def submit(self, task, *args, timeout=None):
+        task(*args)
+
+    def submit_nowait(self, task, *args):
+        task(*args)
+
+    def queue_depth(self):
+        return 0
+
+    def full(self):
+        return False
+
+    def shutdown(self, wait=False, timeout=2):
+        pass
+
+
+class TickStats:
+    """每個 tick 的執行時間 (依 TICK_BUCKETS 分桶，上百萬個 tick 也只佔固定記憶體)"""
+
+    def __init__(self, buckets=TICK_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """分位數所在區間的上限 (超過最大區間時回傳實際最大值)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_us": round(self.total / self.count * 1e6, 3) if self.count else 0.0,
+            "p50_us_le": round(self.quantile(0.5) * 1e6, 3),
+            "p99_us_le": round(self.quantile(0.99) * 1e6, 3),
+            "max_us": round(self.max * 1e6, 3),
+        }
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class PunchSimulation:
+    """以虛擬時鐘驅動 PunchEngine 的排程器
+
+    每筆到期事件都經過真實的 on_punch_due (休息日、容許範圍、補救策略、限流)，
+    並記錄處理結果與延遲；events 為 csv.writer 時逐筆寫出，記憶體只保留彙總。
+    """
+
+    def __init__(self, engine, clock, events=None):
+        self.engine = engine
+        self.clock = clock
+        self.events = events
+        self.decisions = {}
+        self.lags = array('d')  # 觸發時間與排程時間的差距 (tick 粒度造成)
+        self.target_lags = array('d')  # 觸發時間與計畫時間的差距 (含補打與限流延後)
+        self.ticks = TickStats()
+        self.status_renders = 0
+        engine.scheduler.on_fire = self.on_fire
+
+    def on_fire(self, event):
+        engine = self.engine
+        now = self.clock.time()
+        decision = engine.on_punch_due(event)
+        self.decisions[decision] = self.decisions.get(decision, 0) + 1
+
+        target_lag = None
+        if decision == FIRE_EXECUTED:
+            plan = engine.profiles[event.profile_id].plan
+            target_lag = now - plan.targets[PUNCH_TYPES.index(event.punch_type)]
+            self.lags.append(now - event.fire_at)
+            self.target_lags.append(target_lag)
+        if self.events is not None and event.punch_type != DAY_ROLLOVER:
+            self.events.writerow([
+                datetime.fromtimestamp(event.fire_at).isoformat(timespec='seconds'),
+                datetime.fromtimestamp(now).isoformat(timespec='seconds'),
+                event.profile_id, event.punch_type, decision, round(now - event.fire_at, 3),
+                round(target_lag, 3) if target_lag is not None else ""])
+        return decision
+
+    def start(self):
+        """載入設定檔清單並排程 (取代 engine.start()，不啟動任何背景執行緒)"""
+        engine = self.engine
+        if engine.profiles_file:
+            engine.apply_profiles(load_profiles_file(engine.profiles_file))
+        engine.check_punch_time()
+
+    def run(self, until, tick=None, status_every=0):
+        """模擬到 until (epoch 秒)
+
+        tick 為 None 時直接跳到下一筆事件 (最快)；指定秒數時時鐘每次前進 tick 秒並檢查到期事件，
+        status_every > 0 時每 status_every 個 tick 組合一次狀態面板文字。
+        """
+        clock = self.clock
+        scheduler = self.engine.scheduler
+        perf = time.perf_counter
+        observe = self.ticks.observe
+
+        if tick is None:
+            while True:
+                fire_at = scheduler.next_fire_time()
+                if fire_at is None or fire_at > until:
+                    break
+                clock.set(fire_at)
+                started = perf()
+                scheduler.fire_due(fire_at)
+                observe(perf() - started)
+            clock.set(until)
+            return
+
+        count = 0
+        while clock.time() < until:
+            now = clock.advance(tick)
+            started = perf()
+            scheduler.fire_due(now)
+            if status_every:
+                count += 1
+                if count >= status_every:
+                    count = 0
+                    self.engine.get_status_text()
+                    self.status_renders += 1
+            observe(perf() - started)
+
+    def summary(self):
+        return {
+            "decisions": dict(sorted(self.decisions.items())),
+            "lag_seconds": {
+                "p50": round(_percentile(self.lags, 0.5), 3),
+                "p99": round(_percentile(self.lags, 0.99), 3),
+                "max": round(max(self.lags, default=0.0), 3),
+            },
+            "target_lag_seconds": {
+                "p50": round(_percentile(self.target_lags, 0.5), 3),
+                "p99": round(_percentile(self.target_lags, 0.99), 3),
+                "max": round(max(self.target_lags, default=0.0), 3),
+            },
+            "ticks": self.ticks.to_dict(),
+            "status_renders": self.status_renders,
+        }
+
+
+def prepare_config(config_file, workdir):
+    """複製設定檔到暫存目錄，帳本與日誌改用暫存目錄，並關閉指標端點"""
+    config = {}
+    if os.path.exists(config_file):
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    base = os.path.dirname(os.path.abspath(config_file))
+    for key in PATH_FIELDS:
+        if config.get(key):
+            config[key] = os.path.join(base, config[key])
+    holiday_files = config.get('holiday_files') or []
+    if isinstance(holiday_files, str):
+        holiday_files = [holiday_files]
+    config['holiday_files'] = [os.path.join(base, path) for path in holiday_files]
+    config.pop('ledger_file', None)
+    config['metrics_port'] = 0
+    # 合併發送與 asyncio 發送器依賴真實時間與網路，模擬時改為逐筆同步發送
+    config['batch_window_ms'] = 0
+    config['delivery_backend'] = 'thread'
+
+    path = os.path.join(workdir, 'punch_config.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def create_engine(config_file, clock, failure_rate=0.0, seed=0):
+    """建立以虛擬時鐘運作的 PunchEngine (需先切換到暫存目錄)"""
+    engine = PunchEngine(config_file, clock=clock)
+
+    # 帳本不等待 fsync，每筆觸發記錄立即寫入 (發送前會等待觸發記錄落盤)
+    engine.ledger.close()
+    engine.ledger = PunchLedger(engine.ledger_file, linger=0, logger=engine.logger,
+                                synchronous="OFF", clock=clock.time)
+    engine.ledger.start()
+
+    engine.delivery_pool.shutdown()
+    engine.delivery_pool = InlineDeliveryPool()
+    engine.fanout.workers = 0
+    engine.webhook_client = SimulatedWebhookClient(failure_rate, rng=random.Random(seed))
+    return engine
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="以虛擬時鐘模擬打卡排程")
+    parser.add_argument('--config', default="punch_config.json", help="設定檔路徑 (不會被修改)")
+    parser.add_argument('--start', help="模擬起始日期 YYYY-MM-DD (預設為今天 00:00)")
+    parser.add_argument('--days', type=int, default=30, help="模擬天數")
+    parser.add_argument('--tick', type=float, help="每個 tick 前進的秒數 (未指定時直接跳到下一筆事件)")
+    parser.add_argument('--status-every', type=int, default=0, help="每 N 個 tick 組合一次狀態面板文字")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="模擬 Webhook 失敗率 (0~1)")
+    parser.add_argument('--seed', type=int, default=0, help="模擬失敗與補救策略使用的亂數種子")
+    parser.add_argument('--events', help="逐筆寫出事件處理結果的 CSV 路徑")
+    parser.add_argument('--output', help="彙總結果 JSON 路徑")
+    parser.add_argument('--verbose', action='store_true', help="保留引擎的 INFO 日誌 (寫入暫存目錄)")
+    parser.add_argument('--keep', action='store_true', help="保留暫存目錄 (帳本、日誌) 供檢查")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.status_every and args.tick is None:
+        raise SystemExit("--status-every 需搭配 --tick")
+
+    start = datetime.strptime(args.start, '%Y-%m-%d') if args.start else datetime.combine(
+        datetime.now().date(), datetime.min.time())
+    until = (start + timedelta(days=args.days)).timestamp()
+    random.seed(args.seed)
+
+    events_path = os.path.abspath(args.events) if args.events else None
+    output_path = os.path.abspath(args.output) if args.output else None
+    original_dir = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="punch_sim_")
+    config_file = prepare_config(args.config, workdir)
+    os.chdir(workdir)
+
+    clock = VirtualClock(start)
+    engine = create_engine(config_file, clock, args.failure_rate, args.seed)
+    if not args.verbose:
+        # 模擬中的失敗與錯過屬預期結果，只寫入暫存目錄的日誌，不輸出到主控台
+        engine.logger.setLevel(logging.WARNING)
+        engine.log_queue.console_handler.setLevel(logging.CRITICAL)
+
+    events_file = open(events_path, 'w', encoding='utf-8', newline='') if events_path else None
+    try:
+        writer = None
+        if events_file is not None:
+            writer = csv.writer(events_file)
+            writer.writerow(["fire_at", "fired_at", "profile_id", "punch_type", "decision", "lag", "target_lag"])
+        simulation = PunchSimulation(engine, clock, writer)
+
+        started = time.perf_counter()
+        simulation.start()
+        simulation.run(until, args.tick, args.status_every)
+        elapsed = time.perf_counter() - started
+    finally:
+        if events_file is not None:
+            events_file.close()
+        engine.stop()
+        os.chdir(original_dir)
+        if args.keep:
+            print(f"暫存目錄: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = simulation.summary()
+    summary.update({
+        "start": start.isoformat(timespec='seconds'),
+        "days": args.days,
+        "tick": args.tick,
+        "profiles": len(engine.profiles),
+        "webhook_status_codes": engine.webhook_client.status_counts,
+        "wall_seconds": round(elapsed, 3),
+        "speedup": round(args.days * 86400 / elapsed) if elapsed else None,
+    })
+
+    print(f"模擬 {start.date()} 起 {args.days} 天，設定檔 {summary['profiles']} 個，"
+          f"耗時 {elapsed:.2f} 秒 (約 {summary['speedup']:,} 倍速)")
+    for decision, count in summary["decisions"].items():
+        print(f"  {decision:<10} {count:>10,}")
+    lag, target_lag, ticks = summary["lag_seconds"], summary["target_lag_seconds"], summary["ticks"]
+    print(f"觸發延遲: p50 {lag['p50']}s, p99 {lag['p99']}s, 最大 {lag['max']}s")
+    print(f"距計畫時間: p50 {target_lag['p50']}s, p99 {target_lag['p99']}s, 最大 {target_lag['max']}s")
+    print(f"每個 tick: {ticks['count']:,} 次, 平均 {ticks['mean_us']} µs, p50 ≤ {ticks['p50_us_le']} µs, "
+          f"p99 ≤ {ticks['p99_us_le']} µs, 最大 {ticks['max_us']} µs")
+    print(f"Webhook 回應: {summary['webhook_status_codes']}")
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"結果已寫入 {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# punch_standin.py - 本機替身 Webhook：模擬延遲、錯誤、429 與斷線，不會發送到真實聊天室
+"""
+執行方式:
+    python punch_standin.py                                      # http://127.0.0.1:8765/webhook，一律回應 200
+    python punch_standin.py --latency-ms 80 --jitter-ms 40       # 每個請求延遲 40~120 毫秒
+    python punch_standin.py --error-rate 0.02 --throttle-rate 0.05 --retry-after 2 --drop-rate 0.01
+
+請求本文需符合 send_webhook 的格式 {"text": ...}，合併發送的陣列 [{"text": ..., "profile_id": ...}, ...]
+會逐筆決定結果並回傳 {"results": [狀態碼, ...]}；格式錯誤時回應 400。
+GET /stats 回傳累計的請求數與各狀態碼次數。
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_STANDIN_HOST = '127.0.0.1'
+DEFAULT_STANDIN_PORT = 8765
+
+# 斷線 (不回應直接關閉連線) 在統計中的代號
+DROPPED = "dropped"
+
+
+class StandInBehavior:
+    """替身端點的行為設定 (各比例為 0~1，依序判斷斷線、429、錯誤)"""
+    __slots__ = ('latency_ms', 'jitter_ms', 'error_rate', 'error_status', 'throttle_rate', 'retry_after',
+                 'drop_rate', '_rng', '_lock')
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, error_status=503, throttle_rate=0.0,
+                 retry_after=1, drop_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.drop_rate = drop_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """本次請求的延遲秒數"""
+        if not self.latency_ms and not self.jitter_ms:
+            return 0.0
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def outcome(self):
+        """決定整個請求的結果：DROPPED、429、error_status 或 200"""
+        with self._lock:
+            value = self._rng.random()
+        if value < self.drop_rate:
+            return DROPPED
+        value -= self.drop_rate
+        if value < self.throttle_rate:
+            return 429
+        value -= self.throttle_rate
+        if value < self.error_rate:
+            return self.error_status
+        return 200
+
+    def item_outcome(self):
+        """合併發送時單筆打卡的結果"""
+        with self._lock:
+            value = self._rng.random()
+        return self.error_status if value < self.error_rate else 200
+
+
+def valid_item(item):
+    return isinstance(item, dict) and isinstance(item.get('text'), str)
+
+
+class StandInStats:
+    """累計的請求統計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.items = 0
+        self.status_counts = {}
+
+    def add(self, status, items=1):
+        with self._lock:
+            self.requests += 1
+            self.items += items
+            key = str(status)
+            self.status_counts[key] = self.status_counts.get(key, 0) + 1
+
+    def to_dict(self):
+        with self._lock:
+            return {"requests": self.requests, "items": self.items, "status_counts": dict(self.status_counts)}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """替身 Webhook 的請求處理"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        batch = isinstance(payload, list)
+        if not (valid_item(payload) or (batch and payload and all(valid_item(item) for item in payload))):
+            self.server.stats.add(400)
+            self.reply(400, {"ok": False, "error": 'payload 必須為 {"text": ...} 或其陣列'})
+            return
+
+        behavior = self.server.behavior
+        delay = behavior.delay()
+        if delay:
+            time.sleep(delay)
+
+        items = len(payload) if batch else 1
+        status = behavior.outcome()
+        self.server.stats.add(status, items)
+        if status == DROPPED:
+            # 不回應直接關閉連線 (用戶端會收到連線中斷)
+            self.close_connection = True
+            return
+        if status == 429:
+            self.reply(429, {"ok": False, "error": "rate limited"}, {'Retry-After': str(behavior.retry_after)})
+        elif status != 200:
+            self.reply(status, {"ok": False, "error": "simulated failure"})
+        elif batch:
+            self.reply(200, {"results": [behavior.item_outcome() for _ in payload]})
+        else:
+            self.reply(200, {"ok": True})
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self.reply(200, self.server.stats.to_dict())
+        else:
+            self.reply(404, {"ok": False})
+
+    def reply(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 需在 listen() 前設定，避免大量並行連線時被拒
+    request_queue_size = 1024
+
+    def __init__(self, address, behavior=None):
+        super().__init__(address, StandInHandler)
+        self.behavior = behavior or StandInBehavior()
+        self.stats = StandInStats()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/webhook"
+
+
+def start_stand_in_server(behavior=None, host=DEFAULT_STANDIN_HOST, port=0):
+    """在背景執行緒啟動替身 Webhook，回傳 (server, url)；port 為 0 時自動選擇"""
+    server = StandInServer((host, port), behavior)
+    threading.Thread(target=server.serve_forever, name="StandInServer", daemon=True).start()
+    return server, server.url
+
+
+def add_behavior_arguments(parser):
+    """加入替身端點行為的命令列參數 (punch_loadgen.py 共用)"""
+    parser.add_argument('--latency-ms', type=float, default=0, help="平均回應延遲 (毫秒)")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="延遲的隨機變動範圍 (毫秒，±)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="回應錯誤狀態碼的比例 (0~1)")
+    parser.add_argument('--error-status', type=int, default=503, help="錯誤時的狀態碼")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="回應 429 的比例 (0~1)")
+    parser.add_argument('--retry-after', type=int, default=1, help="429 回應的 Retry-After 秒數")
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="不回應直接斷線的比例 (0~1)")
+    parser.add_argument('--seed', type=int, help="亂數種子 (結果可重現)")
+
+
+def behavior_from_args(args):
+    return StandInBehavior(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status,
+                           args.throttle_rate, args.retry_after, args.drop_rate, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本機替身 Webhook")
+    parser.add_argument('--host', default=DEFAULT_STANDIN_HOST, help="監聽位址")
+    parser.add_argument('--port', type=int, default=DEFAULT_STANDIN_PORT, help="監聽連接埠")
+    add_behavior_arguments(parser)
+    args = parser.parse_args()
+
+    server = StandInServer((args.host, args.port), behavior_from_args(args))
+    print(f"替身 Webhook: {server.url} (統計: http://{args.host}:{server.server_address[1]}/stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats.to_dict(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
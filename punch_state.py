@@ -0,0 +1,47 @@
+# punch_state.py - 可觀察的介面狀態：背景執行緒發布變更的欄位，介面只重繪有變更的部分
+import queue
+import threading
+
+# 狀態面板的欄位
+FIELD_SCHEDULE = "schedule"  # 休息日、自動打卡開關、今日計畫
+FIELD_DELIVERY = "delivery"  # 重試佇列、限流、斷路器、設定檔數
+FIELD_RECORDS = "records"  # 打卡記錄新增
+FIELD_WEEKEND = "weekend"  # 大小週末週期
+
+ALL_FIELDS = (FIELD_SCHEDULE, FIELD_DELIVERY, FIELD_RECORDS, FIELD_WEEKEND)
+
+
+class StateChanges:
+    """狀態變更事件佇列 (執行緒安全)
+
+    任意執行緒以 publish() 發布變更的欄位，介面執行緒以 drain() 一次取出。
+    同一欄位在被取出前只會排入一次，大量打卡同時完成時佇列長度不會超過欄位數，
+    沒有取用端 (無介面模式) 時也不會累積。
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def publish(self, *fields):
+        """發布變更的欄位 (未指定時為全部欄位)"""
+        with self._lock:
+            for field in fields or ALL_FIELDS:
+                if field not in self._pending:
+                    self._pending.add(field)
+                    self._queue.put(field)
+
+    def drain(self):
+        """取出所有待處理的變更欄位，沒有變更時回傳空集合"""
+        fields = set()
+        while True:
+            try:
+                field = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            fields.add(field)
+        if fields:
+            with self._lock:
+                self._pending.difference_update(fields)
+        return fields
@@ -2,6 +2,12 @@
 from datetime import datetime, date, timedelta
 import json
 import os
+import time
+
+from punch_calendar import RestDayCalendar, REST_REASONS, load_numpy
+
+# 範圍模擬以 numpy 向量化輸出 (未安裝時改用純 Python)
+np = load_numpy()
 
 # 直接將結果寫入文件
 output_file = open('weekend_test_result.txt', 'w', encoding='utf-8')
@@ -136,6 +142,128 @@ def test_date_range(start_date_str, end_date_str):
     
     return results
 
+# 新增：高速範圍模擬 (向量化計算，不逐日寫入日誌)
+SIMULATION_CHUNK_DAYS = 4096
+WEEKDAY_NAMES = ['星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']
+
+
+def _chunk_dates(first_ordinal, count):
+    """將一段連續日期轉為 YYYY-MM-DD 字串列表"""
+    if np is not None:
+        first = np.datetime64(date.fromordinal(first_ordinal), 'D')
+        return np.arange(first, first + count).astype(str).tolist()
+    return [date.fromordinal(first_ordinal + i).isoformat() for i in range(count)]
+
+
+def _digits(values):
+    """將 0~9 的小整數陣列轉為數字字串"""
+    if np is not None:
+        return (np.asarray(values, dtype=np.uint8) + ord('0')).tobytes().decode('ascii')
+    return bytes(v + 48 for v in values).decode('ascii')
+
+
+def _write_simulation_csv(f, calendar, first_index, total):
+    """分段串流寫出 CSV：日期, 星期 (0=星期一), 週末類型, 是否休息, 原因代碼"""
+    f.write("date,weekday,weekend_type,is_rest,reason\n")
+    base = calendar.first_date.toordinal()
+    for offset in range(0, total, SIMULATION_CHUNK_DAYS):
+        count = min(SIMULATION_CHUNK_DAYS, total - offset)
+        index = first_index + offset
+        dates = _chunk_dates(base + index, count)
+        big = calendar.big[index:index + count]
+        reasons = calendar.reasons[index:index + count]
+        lines = []
+        for i in range(count):
+            ordinal = base + index + i
+            reason = int(reasons[i])
+            lines.append(f"{dates[i]},{(ordinal - 1) % 7},{'big' if big[i] else 'small'},"
+                         f"{1 if reason else 0},{reason}\n")
+        f.write(''.join(lines))
+
+
+def _write_simulation_json(f, calendar, first_index, total, summary):
+    """分段串流寫出精簡 JSON：每日大周末旗標與休息原因代碼以數字字串表示"""
+    header = dict(summary)
+    header["reason_codes"] = {str(code): reason or "正常工作日" for code, reason in enumerate(REST_REASONS)}
+    f.write(json.dumps(header, ensure_ascii=False)[:-1])
+    for key, values in (("big", calendar.big), ("rest_reason", calendar.reasons)):
+        f.write(f', "{key}": "')
+        for offset in range(0, total, SIMULATION_CHUNK_DAYS):
+            index = first_index + offset
+            chunk = values[index:index + min(SIMULATION_CHUNK_DAYS, total - offset)]
+            f.write(_digits(chunk))
+        f.write('"')
+    f.write("}\n")
+
+
+def simulate_date_range(start_date_str, end_date_str, output_path=None, output_format="csv", verbose=False):
+    """高速模擬指定日期範圍的大小周與休息日
+
+    以向量化方式一次算出整段範圍，只輸出統計結果；
+    指定 output_path 時串流寫出精簡 CSV/JSON，verbose 時才逐日寫入測試日誌。
+    """
+    started = time.perf_counter()
+    start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+    end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+
+    calendar = RestDayCalendar(weekend_mode, weekend_start_date, start_date, end_date)
+    total_days = len(calendar)
+    rest_days = calendar.count_rest_days(start_date, end_date)
+    if np is not None:
+        big_weekend_days = int(np.count_nonzero(calendar.big))
+    else:
+        big_weekend_days = sum(calendar.big)
+    work_days = total_days - rest_days
+    small_weekend_days = total_days - big_weekend_days
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    summary = {
+        "start_date": start_date_str,
+        "end_date": end_date_str,
+        "weekend_mode": weekend_mode,
+        "weekend_start_date": weekend_start_date,
+        "total_days": total_days,
+        "work_days": work_days,
+        "rest_days": rest_days,
+        "big_weekend_days": big_weekend_days,
+        "small_weekend_days": small_weekend_days,
+    }
+
+    lines = [
+        f"===== 模擬日期範圍: {start_date_str} 至 {end_date_str} =====",
+        f"總天數: {total_days}",
+        f"工作日: {work_days} ({work_days/total_days*100:.1f}%)",
+        f"休息日: {rest_days} ({rest_days/total_days*100:.1f}%)",
+        f"大周末天數: {big_weekend_days} ({big_weekend_days/total_days*100:.1f}%)",
+        f"小周末天數: {small_weekend_days} ({small_weekend_days/total_days*100:.1f}%)",
+        f"計算耗時: {elapsed_ms:.2f} ms",
+    ]
+    for line in lines:
+        print(line)
+        write_log(line)
+    write_log("-" * 50)
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8', newline='') as f:
+            if output_format == "json":
+                _write_simulation_json(f, calendar, 0, total_days, summary)
+            else:
+                _write_simulation_csv(f, calendar, 0, total_days)
+        print(f"模擬結果已寫入 {output_path}")
+
+    # 逐日詳細記錄 (選用)
+    if verbose:
+        current = start_date
+        for i in range(total_days):
+            reason = REST_REASONS[calendar.reasons[i]]
+            write_log(f"日期: {current.strftime('%Y-%m-%d')} ({WEEKDAY_NAMES[current.weekday()]})")
+            write_log(f"週末類型: {'big' if calendar.big[i] else 'small'}")
+            write_log(f"是否休息: {'是' if reason else '否'} ({reason or '正常工作日'})")
+            write_log("-" * 50)
+            current += timedelta(days=1)
+
+    return summary
+
 # 預設測試日期列表
 default_test_dates = [
     date.today().strftime('%Y-%m-%d'),  # 今天
@@ -157,7 +285,8 @@ try:
     print("請選擇測試模式:")
     print("1. 測試預設日期列表")
     print("2. 測試指定日期範圍")
-    choice = input("請輸入選項 (1 或 2): ")
+    print("3. 高速模擬日期範圍 (僅輸出統計，可匯出 CSV/JSON)")
+    choice = input("請輸入選項 (1、2 或 3): ")
     
     if choice == "1":
         # 測試預設日期列表
@@ -168,6 +297,14 @@ try:
         start_date = input("請輸入開始日期 (YYYY-MM-DD): ")
         end_date = input("請輸入結束日期 (YYYY-MM-DD): ")
         test_date_range(start_date, end_date)
+    elif choice == "3":
+        # 高速範圍模擬
+        start_date = input("請輸入開始日期 (YYYY-MM-DD): ")
+        end_date = input("請輸入結束日期 (YYYY-MM-DD): ")
+        output_format = input("匯出格式 (csv/json，留空則不匯出): ").strip().lower()
+        verbose = input("是否寫入逐日詳細記錄? (y/N): ").strip().lower() == "y"
+        output_path = f"weekend_simulation.{output_format}" if output_format in ("csv", "json") else None
+        simulate_date_range(start_date, end_date, output_path, output_format, verbose)
     else:
         print("無效選項，使用預設日期列表測試")
         for test_date in default_test_dates: